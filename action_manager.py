@@ -1,10 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import tdl
+try:
+    import tdl
+except ImportError:
+    # Only needed to read keys from the window, headless feeds them directly
+    tdl = None
 
 from entities import Interactable
-from misc import Singleton, Vector
+from misc import Directions, Singleton
+from profiler import Profiler
 
 
 class ActionManager(metaclass=Singleton):
@@ -26,6 +31,24 @@ class ActionManager(metaclass=Singleton):
 
     player = dungeon = user_input = display_manager = None
 
+    # Key char -> direction of the movement keys, the arrow keys move vertically and horizontally too
+    MOVEMENT_KEYS = {
+        'k': Directions.UP,
+        'j': Directions.DOWN,
+        'h': Directions.LEFT,
+        'l': Directions.RIGHT,
+        'y': Directions.UP_LEFT,
+        'u': Directions.UP_RIGHT,
+        'b': Directions.DOWN_LEFT,
+        'n': Directions.DOWN_RIGHT,
+    }
+    ARROW_KEYS = {
+        'UP': Directions.UP,
+        'DOWN': Directions.DOWN,
+        'LEFT': Directions.LEFT,
+        'RIGHT': Directions.RIGHT,
+    }
+
     def __init__(cls, player, dungeon):
         cls.player = player
         cls.dungeon = dungeon
@@ -52,28 +75,7 @@ class ActionManager(metaclass=Singleton):
         if not cls.user_input:
             return False
 
-        key_char = cls.user_input.char
-
-        move_direction = None
-        # Vertical and horizontal movement
-        if cls.user_input.key == 'UP' or key_char == 'k':
-            move_direction = Vector(0, -1)
-        elif cls.user_input.key == 'DOWN' or key_char == 'j':
-            move_direction = Vector(0, 1)
-        elif cls.user_input.key == 'LEFT' or key_char == 'h':
-            move_direction = Vector(-1, 0)
-        elif cls.user_input.key == 'RIGHT' or key_char == 'l':
-            move_direction = Vector(1, 0)
-
-        # Diagonal movement
-        elif key_char == 'y':
-            move_direction = Vector(-1, -1)
-        elif key_char == 'u':
-            move_direction = Vector(1, -1)
-        elif key_char == 'b':
-            move_direction = Vector(-1, 1)
-        elif key_char == 'n':
-            move_direction = Vector(1, 1)
+        move_direction = cls.ARROW_KEYS.get(cls.user_input.key) or cls.MOVEMENT_KEYS.get(cls.user_input.char)
 
         # Check if the action is a movement action
         if move_direction is not None:
@@ -89,6 +91,13 @@ class ActionManager(metaclass=Singleton):
             # TODO: Find more elegant way to terminate the program
             exit()
 
+        elif cls.user_input.key == 'F12':
+            # Dump the timings of the game loop, if they're being taken
+            profiler = Profiler()
+            if profiler.enabled:
+                profiler.dump()
+            return False
+
         elif cls.user_input.char == 'g':
             return cls.pickup_action()
 
@@ -132,11 +141,12 @@ class ActionManager(metaclass=Singleton):
             True if the player picked something up, False otherwise.
         """
         # FIXME: For now, the player picks up the first item found. Make him able to choose.
-        loot = [e for e in cls.dungeon.current_level.entities if e.pos == cls.player.pos and e.type == 'item']
+        loot = [e for e in cls.dungeon.current_level.entities_at(cls.player.pos) if e.type == 'item']
 
         if loot:
             cls.player.backpack.add(loot[0].key)
-            cls.dungeon.current_level.entities.remove(loot[0])
+            cls.dungeon.current_level.remove_entity(loot[0])
+            loot[0].game_map = None
             return True
         return False
 
@@ -148,8 +158,8 @@ class ActionManager(metaclass=Singleton):
             True if the player interacts with an object, False if there was no interactable object to interact with.
         """
         # FIXME: For now, the player interacts with the first interactable found. Make him able to choose.
-        interactables = [e for e in cls.dungeon.current_level.entities if
-                         e.pos == cls.player.pos and isinstance(e, Interactable)]
+        interactables = [e for e in cls.dungeon.current_level.entities_at(cls.player.pos) if
+                         isinstance(e, Interactable)]
 
         if interactables:
             # Use on self
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Sleeping actors closer than this to the player wake up. It should be at least the FOV radius, so that actors never
+# sleep in plain sight
+WAKE_RADIUS = 15
+# Awake actors further away than this from the player, and out of the FOV, fall asleep. Being larger than the wake
+# radius keeps actors at the edge from waking up and falling asleep all the time
+SLEEP_RADIUS = 25
+# How far away the noise of a fight can be heard
+ATTACK_NOISE_RADIUS = 20
+
+
+class ActivityZones:
+    """
+    Tracks which actors of a level are awake, so that only the actors around the player take turns.
+
+    Awake actors are in the level's scheduler. When an awake actor's turn comes while it's far away from the player and
+    out of the FOV, it falls asleep instead: it's taken out of the scheduler and put in a bucket of a coarse grid of
+    cells as big as the wake radius. Sleepers are never polled. They are woken when the player comes close, by looking
+    only at the buckets around the player, or by noise, which looks only at the buckets around its source. The cost of
+    a turn thus depends on how crowded the player's surroundings are, not on the population of the level.
+
+    Args:
+        scheduler (Scheduler): Scheduler of the level.
+        wake_radius (int): Sleeping actors closer than this to the player wake up.
+        sleep_radius (int): Awake actors further away than this from the player, and out of the FOV, fall asleep.
+    """
+
+    def __init__(self, scheduler, wake_radius=WAKE_RADIUS, sleep_radius=SLEEP_RADIUS):
+        self.scheduler = scheduler
+        self.wake_radius = wake_radius
+        self.sleep_radius = sleep_radius
+        # Cell -> sleeping actors in that cell, as a dict used as an ordered set
+        self._cells = {}
+        # Sleeping actor -> cell it's in
+        self._cell_of = {}
+        # Position of the player and its FOV, as of the last update
+        self._center = None
+        self._fov = None
+
+    def __len__(self):
+        """Return the amount of sleeping actors."""
+        return len(self._cell_of)
+
+    def is_asleep(self, actor):
+        """Return whether the actor is sleeping."""
+        return actor in self._cell_of
+
+    def _cell(self, pos):
+        return pos.x // self.wake_radius, pos.y // self.wake_radius
+
+    def _bucket(self, actor):
+        cell = self._cell(actor.pos)
+        self._cells.setdefault(cell, {})[actor] = None
+        self._cell_of[actor] = cell
+
+    def forget(self, actor):
+        """
+        Stop tracking an actor, e.g. because it left the level. Nothing happens if it's awake.
+
+        Args:
+            actor (Actor): Actor to forget.
+        """
+        cell = self._cell_of.pop(actor, None)
+        if cell is None:
+            return
+        sleepers = self._cells[cell]
+        del sleepers[actor]
+        if not sleepers:
+            del self._cells[cell]
+
+    def sleep(self, actor):
+        """
+        Put an awake actor to sleep.
+
+        Args:
+            actor (Actor): Actor to put to sleep.
+        """
+        self.scheduler.remove(actor)
+        self._bucket(actor)
+
+    def wake(self, actor):
+        """
+        Wake a sleeping actor up, scheduling it to act right away.
+
+        Args:
+            actor (Actor): Actor to wake up.
+        """
+        self.forget(actor)
+        self.scheduler.add(actor)
+
+    def _sleepers_near(self, pos, radius):
+        """Get the sleepers in the cells that overlap the square of the given radius around a position."""
+        x1, y1 = (pos.x - radius) // self.wake_radius, (pos.y - radius) // self.wake_radius
+        x2, y2 = (pos.x + radius) // self.wake_radius, (pos.y + radius) // self.wake_radius
+        sleepers = []
+        for x in range(x1, x2 + 1):
+            for y in range(y1, y2 + 1):
+                sleepers.extend(self._cells.get((x, y), ()))
+        return sleepers
+
+    def noise(self, pos, radius):
+        """
+        Make a noise that wakes up the sleeping actors that can hear it.
+
+        Args:
+            pos (Vector): Source of the noise.
+            radius (int): How far away the noise can be heard.
+
+        Returns:
+            int: Amount of actors woken up.
+        """
+        woken = 0
+        for actor in self._sleepers_near(pos, radius):
+            if (actor.pos - pos).norm <= radius:
+                self.wake(actor)
+                woken += 1
+        return woken
+
+    def update(self, center, fov=None):
+        """
+        Wake up the sleeping actors near the player, or in its FOV, and remember where the player is.
+
+        Args:
+            center (Vector): Position of the player.
+            fov (numpy.ndarray): Boolean [x, y] map of the player's FOV.
+
+        Returns:
+            int: Amount of actors woken up.
+        """
+        self._center = center
+        self._fov = fov
+        woken = 0
+        for actor in self._sleepers_near(center, self.wake_radius):
+            if (actor.pos - center).norm <= self.wake_radius or (fov is not None and fov[actor.pos.x, actor.pos.y]):
+                self.wake(actor)
+                woken += 1
+        return woken
+
+    def keep_awake(self, actor):
+        """
+        Decide whether an actor whose turn came stays awake, putting it to sleep otherwise.
+
+        Meant to be passed to Scheduler.run, which takes the actors that fall asleep out of the schedule.
+
+        Args:
+            actor (Actor): Actor whose turn came.
+
+        Returns:
+            bool: True if the actor stays awake and takes its turn.
+        """
+        if self._center is None or (actor.pos - self._center).norm <= self.sleep_radius:
+            return True
+        if self._fov is not None and self._fov[actor.pos.x, actor.pos.y]:
+            return True
+        self._bucket(actor)
+        return False
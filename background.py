@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Coarse simulation of the levels the player is not on.
+
+Running the behaviors of every actor of every loaded level would make the turns of the player as slow as the whole
+dungeon is big, so the levels the player is not on are advanced at a much lower resolution instead: once every few
+turns, all their monsters wander a step, regenerate some hp and, now and then, a new monster shows up. Each of these is
+done as a few array operations over the level's entity store, see simulate_level.
+"""
+
+import numpy as np
+
+from misc import Directions, Vector
+
+# Hp regenerated per turn by the monsters of the levels the player is not on
+REGENERATION_PER_TURN = 0.1
+# Chance that a monster wanders a step on every tick
+WANDER_CHANCE = 0.5
+# Chance that a monster respawns on every tick, if fewer monsters are alive than the level had when it was populated
+RESPAWN_CHANCE = 0.05
+
+# Offsets of the wandering steps, as an (8, 2) array
+_STEPS = np.array(Directions.ALL)
+
+
+def _wander(level, rows, rng):
+    """Move every given actor a random step, if the tile is free and no other actor moves into it."""
+    store = level.store
+    rows = rows[rng.random_sample(len(rows)) < WANDER_CHANCE]
+    if not len(rows):
+        return 0
+    steps = _STEPS[rng.randint(len(_STEPS), size=len(rows))]
+    x = store.x[rows] + steps[:, 0]
+    y = store.y[rows] + steps[:, 1]
+    inside = (x >= 0) & (x < level.width) & (y >= 0) & (y < level.height)
+    rows, steps, x, y = rows[inside], steps[inside], x[inside], y[inside]
+    # Blocking entities make their tile non-walkable, so this also keeps actors off each other
+    free = level.walkable.array[x, y]
+    rows, steps, x, y = rows[free], steps[free], x[free], y[free]
+    # When several actors step into the same tile, the first one in row order gets it
+    _, first = np.unique(x * level.height + y, return_index=True)
+    for actor, step in zip(store.entities[rows[first]].tolist(), steps[first].tolist()):
+        actor.move(Vector(*step))
+        if level.activity.is_asleep(actor):
+            # Put it in the bucket of its new position
+            level.activity.forget(actor)
+            level.activity.sleep(actor)
+    return len(first)
+
+
+def _regenerate(level, rows, turns):
+    """Give back the hp regenerated over the given amount of turns to the given actors."""
+    store = level.store
+    hp = np.minimum(store.hp[rows] + REGENERATION_PER_TURN * turns, store.max_hp[rows])
+    changed = hp != store.hp[rows]
+    for actor, value in zip(store.entities[rows[changed]].tolist(), hp[changed].tolist()):
+        actor.hp = value
+
+
+def _respawn(level, alive, rng, registry):
+    """Spawn a monster in a random free tile of a random room, if the level lost some of its monsters."""
+    from registry import Actors
+
+    spawned = sum(1 for entity in level.spawned if entity.type == 'actor')
+    if alive >= spawned or not level.rooms or rng.random_sample() >= RESPAWN_CHANCE:
+        return None
+    room = level.rooms[rng.randint(len(level.rooms))]
+    inner = level.walkable.array[room.x1 + 1:room.x2, room.y1 + 1:room.y2].copy()
+    # Don't spawn on top of items or corpses either
+    store = level.store
+    occupied = store.used & (store.x > room.x1) & (store.x < room.x2) & (store.y > room.y1) & (store.y < room.y2)
+    inner[store.x[occupied] - room.x1 - 1, store.y[occupied] - room.y1 - 1] = False
+    free = np.argwhere(inner)
+    if not len(free):
+        return None
+    x, y = free[rng.randint(len(free))].tolist()
+    actor = registry.get_actor(Actors.ORC if rng.randint(2) == 0 else Actors.POOPY)
+    actor.place(level, Vector(room.x1 + 1 + x, room.y1 + 1 + y))
+    return actor
+
+
+def simulate_level(level, turns, rng, registry=None):
+    """
+    Advance a level the player is not on by the given amount of turns, at low resolution.
+
+    Living monsters with a behavior wander one random step, whatever the amount of turns, and all living monsters
+    regenerate REGENERATION_PER_TURN hp per turn. If fewer monsters are alive than were spawned when the level was
+    populated, one may respawn.
+
+    Respawned monsters are not part of the level's spawned entities, so they are not kept in the LevelDelta of the
+    level when it's dropped from memory.
+
+    Args:
+        level (Level): Level to simulate.
+        turns (int): Amount of turns to advance the level.
+        rng (numpy.random.RandomState): Source of randomness of the simulation.
+        registry (Registry): Registry to create the respawned monsters from, nothing respawns if not given.
+
+    Returns:
+        Actor: The monster that respawned, None if none did.
+    """
+    store = level.store
+    living = store.living_actors()
+    _wander(level, np.flatnonzero(living & (store.behavior >= 0)), rng)
+    rows = np.flatnonzero(living)
+    _regenerate(level, rows, turns)
+    if registry is None:
+        return None
+    return _respawn(level, len(rows), rng, registry)
@@ -6,16 +6,26 @@ Behaviors are functions which always have two arguments: the caller, which is th
 and the target, which is some other object that the caller uses for its logic. The target could also be None.
 
 A behavior could define, for example, the AI of an Actor, or other types of logic like the spreading of fire.
+
+Behaviors can also be written as plans, see intents.planned, which take the level to look at as a third argument and
+return what the caller wants to do instead of doing it.
 """
 
+from intents import Intent, planned
+
 
-def basic_monster(caller, target):
+@planned
+def basic_monster(caller, target, game_map):
     """
     Follow a target if visible and attack when in melee range.
 
     Args:
         caller (Actor): Actor that performs the action.
         target (Actor): Actor that the caller will follow and attack.
+        game_map (Level): Level of the caller.
+
+    Returns:
+        Intent: What the caller wants to do, None to stay put.
     """
     # Check if the monster can see the target
     # TODO: For now, we just check if the player can see the monster and
@@ -23,27 +33,28 @@ def basic_monster(caller, target):
     # visibility radius, this will have to change
     # TODO: Add patrol mode if the player is not visible
     assert caller.game_map is not None and caller.game_map == target.game_map
-    game_map = caller.game_map
     if game_map.fov[caller.pos]:
         if caller.distance_to(target.pos) >= 2:
-            # Target is too far to attack, try moving towards it
-            path = game_map.compute_path(caller.pos, target.pos)
-            if not path:
+            # Target is too far to attack, try moving towards it following the flow field shared by all the monsters
+            # chasing the same target
+            field = game_map.flow_field(target.pos)
+            if not field.reaches(caller.pos):
                 # Can't reach the target, don't do anything
-                return
+                return None
             # Only try to move closer to the target if the monster doesn't have to lose vision of the target to do
             # so. In this case, don't do anything
-            for tile in path:
-                if not game_map.fov[tile]:
-                    # Try to move closer taking one step in the direction of the target
-                    direction = (target.pos - caller.pos).snap_to_grid()
-                    if game_map.walkable[caller.pos + direction]:
-                        caller.move(direction)
-                        return
-            # The path is clear and the monster doesn't have to lose sight of the target, so follow the path
-            direction = path[0] - caller.pos
-            caller.move(direction)
+            if not field.in_view(caller.pos):
+                # Try to move closer taking one step in the direction of the target
+                direction = (target.pos - caller.pos).snap_to_grid()
+                if game_map.walkable[caller.pos + direction]:
+                    return Intent.move(caller.pos + direction)
+            # The path is clear and the monster doesn't have to lose sight of the target, so take the next step,
+            # going around other entities that might be in the way
+            next_tile = field.next_step(caller.pos, game_map.is_blocked)
+            if next_tile is not None:
+                return Intent.move(next_tile)
         else:
             # Attack the target
             if target.type == 'actor':
-                caller.attack(target)
+                return Intent.attack(target)
+    return None
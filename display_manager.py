@@ -1,12 +1,17 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import tdl
 import textwrap
 
-from entities import Stairs
+try:
+    import tdl
+except ImportError:
+    # Only needed to draw, the message log works without it
+    tdl = None
+
 from misc import Singleton, Vector, Colors, get_abs_path
 from dungeon import Dungeon
+from profiler import profiled
 
 
 class DisplayManager(metaclass=Singleton):
@@ -150,6 +155,7 @@ class DisplayManager(metaclass=Singleton):
         cls.add_bar(1, 3, cls.BAR_WIDTH, 'MP', cls.player.mp,
                     cls.player.max_mp, Colors.BLUE, (0, 0, 150))
 
+    @profiled('render_map')
     def _render_map(cls):
         """
         Renders the current game map if necessary.
@@ -176,9 +182,6 @@ class DisplayManager(metaclass=Singleton):
                             cls.console.draw_char(
                                 x, y, None, fg=None, bg=Colors.GROUND_VISIBLE
                             )
-                        # Tiles in FOV will be remembered after they get out
-                        # of sight, out of mind :^)
-                        cur_map.explored[pos] = True
 
                     # Position is not visible, but has been explored before
                     elif cur_map.explored[pos]:
@@ -195,17 +198,17 @@ class DisplayManager(metaclass=Singleton):
         """
         Render visible entities by render layer to the buffer console.
         """
-        entities_sorted = sorted(cls.dungeon.current_level.entities,
-                                 key=lambda x: x.render_priority.value)
-        for entity in entities_sorted:
-            # Draw visible entities
-            if cls.dungeon.current_level.fov[entity.pos]:
-                cls.console.draw_char(
-                    entity.pos.x, entity.pos.y, entity.char, entity.color,
-                    bg=None
-                )
-            # Remember stairs location
-            if isinstance(entity, Stairs) and cls.dungeon.current_level.explored[entity.pos]:
+        level = cls.dungeon.current_level
+        store = level.store
+        # Visible entities, selected and sorted by render layer with array operations over the entity store
+        for entity in store.select(store.on_tiles(level.fov.array), order=store.render_priority):
+            cls.console.draw_char(
+                entity.pos.x, entity.pos.y, entity.char, entity.color,
+                bg=None
+            )
+        # Remember stairs location
+        for entity in (level.up_stairs, level.down_stairs):
+            if entity.game_map is level and level.explored[entity.pos] and not level.fov[entity.pos]:
                 cls.console.draw_char(
                     entity.pos.x, entity.pos.y, entity.char, entity.color,
                     bg=None
@@ -1,8 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from level import Level
+from concurrent.futures import ThreadPoolExecutor, wait
+from random import Random
+
+import numpy as np
+
+from background import simulate_level
+from level import Level, LevelDelta
 from misc import Singleton
+from profiler import profiled
+from savefile import FULL, load_dungeon, save_dungeon
 
 
 class DungeonException(Exception):
@@ -13,9 +21,19 @@ class Dungeon(metaclass=Singleton):
     """
     The dungeon is the collection of levels in the game. Initially, the dungeon is empty, and new levels are generated
     as the player moves deeper into the dungeon.
+
+    Every level is generated from its own seed, which is drawn from the dungeon's seed. Only the levels close to the
+    player are kept in memory: the rest are dropped, keeping just a LevelDelta of what changed in them, and rebuilt
+    from their seed when the player comes back.
+
+    While the player is on a level, the next one is generated speculatively in a worker thread, so that taking the
+    stairs down doesn't have to wait for the level generation.
+
+    The other levels in memory don't stand still either: every BACKGROUND_INTERVAL turns of the player they are
+    advanced at low resolution, see background.simulate_level, in the same worker thread so that the player's turns
+    don't get slower.
     """
     # TODO: Put constants somewhere else
-    FOV_ALGORITHM = "BASIC"
     FOV_LIGHT_WALLS = True
     # TODO: These variables could be theme-dependant, and encapsulated into a context
     LEVEL_WIDTH = 80
@@ -25,8 +43,29 @@ class Dungeon(metaclass=Singleton):
     MAX_ROOM_SIZE = 10
     MAX_ENTITIES_PER_ROOM = 3
     FOV_RADIUS = 10
+    # Levels further away than this from the current one are dropped from memory
+    LOADED_LEVELS_RADIUS = 1
+    # Whether to generate the next level in the background
+    PREGENERATE_LEVELS = True
+    # Turns of the player between two ticks of the levels the player is not on, 0 to leave them frozen
+    BACKGROUND_INTERVAL = 10
+    # Whether to tick the levels the player is not on in the worker thread, instead of during the player's turn
+    BACKGROUND_THREAD = True
 
     levels = []
+    seed = None
+    _rng = None
+    # Seed of every level reached so far, and the changes made to the levels that are not in memory
+    _seeds = []
+    _deltas = {}
+    # Level index -> Future of a level being generated in the background
+    _pending = {}
+    # Level index -> SavedLevel of the levels of a loaded game that haven't been restored yet
+    _saved = {}
+    _executor = None
+    # Future of the tick of the levels the player is not on, and the turns taken by the player so far
+    _background = None
+    _turns = 0
     _cur_level = -1
     player = None
     registry = None
@@ -56,12 +95,15 @@ class Dungeon(metaclass=Singleton):
             raise DungeonException("Dungeon hasn't been initialized yet.")
         return cls._cur_level + 1
 
-    def initialize(cls, player, registry):
+    def initialize(cls, player, registry, seed=None):
         """
         Gets the reference to the player object and generates the first level of the dungeon.
 
         Args:
             player (Actor): Reference to the player object.
+            registry (Registry): Reference to the game's registry.
+            seed (int): Seed of the dungeon, the same seed always generates the same levels. A random one is used
+                if not given. It's taken modulo 2 ** 64, so that any int fits in save files and recordings.
 
         Raises:
             DungeonException: If the dungeon has already been initialized
@@ -71,33 +113,161 @@ class Dungeon(metaclass=Singleton):
             raise DungeonException("Dungeon has already been initialized.")
         cls.player = player
         cls.registry = registry
+        cls.seed = seed % 2 ** 64 if seed is not None else Random().getrandbits(32)
+        cls._rng = Random(cls.seed)
         cls.go_to_next_level()
 
     def clear(cls):
         """
         Removes all levels from the dungeon and the player reference. Useful when resetting the game after a death.
         """
+        cls._wait_background()
+        # Levels that are already being generated are waited for, so that they don't outlive the game they belong to
+        wait([future for future in cls._pending.values() if not future.cancel()])
+        cls._pending = {}
+        cls._turns = 0
         cls.levels = []
+        cls.seed = None
+        cls._rng = None
+        cls._seeds = []
+        cls._deltas = {}
+        cls._saved = {}
         cls._cur_level = -1
         cls.player = None
 
+    def _generate_level(cls, seed, blank=False):
+        """Generate a level from its seed."""
+        # TODO: Use context instead of constants, see Level
+        return Level(cls.LEVEL_WIDTH, cls.LEVEL_HEIGHT, cls.MAX_ROOMS, cls.MIN_ROOM_SIZE, cls.MAX_ROOM_SIZE,
+                     cls.MAX_ENTITIES_PER_ROOM, cls, cls.registry, seed, blank)
+
+    def _build_level(cls, seed, saved=None, delta=None):
+        """
+        Build a level, either restoring it from a loaded game or generating it from its seed and replaying its delta
+        on it, if any.
+
+        Everything the level is built from is passed in rather than read from the dungeon, since this runs in the worker
+        thread while the dungeon goes on, see _level_sources.
+        """
+        if saved is not None:
+            level = cls._generate_level(seed, blank=True)
+            saved.restore(level, cls.registry)
+            return level
+        level = cls._generate_level(seed)
+        if delta is not None:
+            level.apply_delta(delta)
+        return level
+
+    def _level_sources(cls, index):
+        """
+        Get what the level at the given index is built from, see _build_level. They are left in the dungeon until the
+        level is in memory, in case its generation is cancelled.
+        """
+        return cls._seeds[index], cls._saved.get(index), cls._deltas.get(index)
+
+    def _forget_sources(cls, index):
+        """Drop what the level at the given index was built from, once the level is in memory."""
+        cls._saved.pop(index, None)
+        cls._deltas.pop(index, None)
+
+    def _load_level(cls, index):
+        """
+        Make sure the level at the given index is in memory.
+
+        A level generated in the background is used if it's ready. If its generation hasn't started yet it's cancelled
+        and the level is generated right away, and if it's halfway through it's waited for, since that's faster than
+        starting over.
+        """
+        if cls.levels[index] is not None:
+            return
+        future = cls._pending.pop(index, None)
+        if future is not None and not future.cancel():
+            cls.levels[index] = future.result()
+        else:
+            cls.levels[index] = cls._build_level(*cls._level_sources(index))
+        cls._forget_sources(index)
+
+    def _submit(cls, fn, *args):
+        """Run a function in the worker thread."""
+        if cls._executor is None:
+            cls._executor = ThreadPoolExecutor(max_workers=1)
+        return cls._executor.submit(fn, *args)
+
+    def _pregenerate_next_level(cls):
+        """Start generating the level below the current one in a worker thread, if it's not in memory yet."""
+        index = cls._cur_level + 1
+        if not cls.PREGENERATE_LEVELS or index in cls._pending:
+            return
+        if index == len(cls.levels):
+            # The next level has never been visited, its seed has to be drawn now
+            cls._seeds.append(cls._rng.getrandbits(32))
+            cls.levels.append(None)
+        if cls.levels[index] is None:
+            cls._pending[index] = cls._submit(cls._build_level, *cls._level_sources(index))
+
+    def tick(cls):
+        """
+        Count a turn of the player, and advance the levels the player is not on if it's time to.
+
+        The levels are advanced in the worker thread if BACKGROUND_THREAD is set. The previous tick is waited for
+        before starting the next one, which it has had BACKGROUND_INTERVAL turns to finish, so that a session plays out
+        the same no matter how fast the machine is, see replay.
+        """
+        cls._turns += 1
+        if not cls.BACKGROUND_INTERVAL or cls._turns % cls.BACKGROUND_INTERVAL:
+            return
+        if not cls.BACKGROUND_THREAD:
+            cls._simulate_background(cls._turns)
+        else:
+            cls._wait_background()
+            cls._background = cls._submit(cls._simulate_background, cls._turns)
+
+    def _simulate_background(cls, turns):
+        """Advance every level in memory but the current one by BACKGROUND_INTERVAL turns."""
+        # Seeded from the turn so that the dungeon's generator, which draws the seeds of the levels, is left alone
+        rng = np.random.RandomState((cls.seed + turns) % 2 ** 32)
+        for index, level in enumerate(cls.levels):
+            if level is not None and index != cls._cur_level:
+                simulate_level(level, cls.BACKGROUND_INTERVAL, rng, cls.registry)
+
+    def _wait_background(cls):
+        """Wait for the tick of the levels the player is not on to finish, if one is running."""
+        if cls._background is not None:
+            background, cls._background = cls._background, None
+            background.result()
+
+    def _unload_distant_levels(cls):
+        """Drop the levels that are too far away from the current one, keeping a log of their changes."""
+        for index, level in enumerate(cls.levels):
+            if level is not None and abs(index - cls._cur_level) > cls.LOADED_LEVELS_RADIUS:
+                cls._deltas[index] = level.record_delta()
+                cls.levels[index] = None
+        for index, future in list(cls._pending.items()):
+            if abs(index - cls._cur_level) > cls.LOADED_LEVELS_RADIUS and (future.cancel() or future.done()):
+                del cls._pending[index]
+                if not future.cancelled():
+                    cls._forget_sources(index)
+                    cls._deltas[index] = future.result().record_delta()
+
     def go_to_next_level(cls):
         """
         Moves the player to the next level. If it's the first time the level is visited,
         it generates it and adds it to the level list.
         """
+        cls._wait_background()
         cls._cur_level += 1
 
         if len(cls.levels) < cls.current_level_number:
             # New depth reached, generate new level
-            # TODO: Use context instead of constants, see Level
-            level = Level(cls.LEVEL_WIDTH, cls.LEVEL_HEIGHT, cls.MAX_ROOMS, cls.MIN_ROOM_SIZE, cls.MAX_ROOM_SIZE,
-                          cls.MAX_ENTITIES_PER_ROOM, cls, cls.registry)
-            cls.levels.append(level)
+            cls._seeds.append(cls._rng.getrandbits(32))
+            cls.levels.append(None)
+        cls._load_level(cls._cur_level)
+        cls._unload_distant_levels()
         # Place the player at the stairs
         cls.player.place(cls.current_level, cls.current_level.up_stairs.pos)
         # Changing levels triggers a FOV recomputation
         cls.recompute_fov()
+        cls._pregenerate_next_level()
 
     def go_to_previous_level(cls):
         """
@@ -108,12 +278,91 @@ class Dungeon(metaclass=Singleton):
         """
         if cls._cur_level <= 0:
             raise DungeonException("Already at the top level.")
+        cls._wait_background()
         cls._cur_level -= 1
+        cls._load_level(cls._cur_level)
+        cls._unload_distant_levels()
         # Place the player at the stairs
         cls.player.place(cls.current_level, cls.current_level.down_stairs.pos)
         # Changing levels triggers a FOV recomputation
         cls.recompute_fov()
+        cls._pregenerate_next_level()
+
+    def save(cls, path):
+        """
+        Save the game to a file, see savefile for the format.
+
+        Args:
+            path (str): Path of the file to write.
+
+        Raises:
+            DungeonException: If the dungeon hasn't been initialized yet.
+        """
+        if not cls.levels:
+            raise DungeonException("Dungeon hasn't been initialized yet.")
+        cls._wait_background()
+        levels = []
+        for index, level in enumerate(cls.levels):
+            if level is None:
+                if index in cls._saved:
+                    level = cls._saved[index]
+                elif index in cls._deltas:
+                    level = cls._deltas[index]
+                elif index in cls._pending:
+                    # Level being generated in the background
+                    level = cls._pending[index].result()
+                else:
+                    # Level whose generation was cancelled before it was ever visited, so nothing changed in it
+                    explored = np.packbits(np.zeros(cls.LEVEL_WIDTH * cls.LEVEL_HEIGHT, dtype=bool))
+                    level = LevelDelta(explored, [], {}, {})
+            levels.append(level)
+        save_dungeon(path, cls.seed, cls._cur_level, cls.player, cls._seeds, levels)
+
+    def load(cls, path, player, registry):
+        """
+        Load a game saved with save.
+
+        Only the level the player is at is restored right away, the others are restored from the memory-mapped file
+        when the player reaches them.
+
+        Args:
+            path (str): Path of the save file.
+            player (Actor): Reference to the player object.
+            registry (Registry): Reference to the game's registry.
+
+        Raises:
+            DungeonException: If the dungeon has already been initialized.
+            SaveFileError: If the file is not a valid save file.
+        """
+        if cls.levels:
+            raise DungeonException("Dungeon has already been initialized.")
+        saved = load_dungeon(path)
+        cls.player = player
+        cls.registry = registry
+        cls.seed = saved['seed']
+        cls._rng = Random(cls.seed)
+        # Bring the generator to the state it was in, so that deeper levels get the same seeds as before saving
+        for _ in saved['seeds']:
+            cls._rng.getrandbits(32)
+        cls._seeds = list(saved['seeds'])
+        cls.levels = [None] * len(cls._seeds)
+        for index, saved_level in enumerate(saved['levels']):
+            if saved_level.kind == FULL:
+                cls._saved[index] = saved_level
+            else:
+                cls._deltas[index] = saved_level.delta()
+        cls._cur_level = saved['current']
+        cls._load_level(cls._cur_level)
+
+        stats = saved['player']
+        player.level = stats['level']
+        player.exp = stats['exp']
+        player.hp = stats['hp']
+        player.place(cls.current_level, stats['pos'])
+        cls.recompute_fov()
+        cls._pregenerate_next_level()
 
+    @profiled('recompute_fov')
     def recompute_fov(cls):
         """
         Triggers a recomputation of the FOV at the player's position for the current level.
@@ -125,7 +374,6 @@ class Dungeon(metaclass=Singleton):
             raise DungeonException("Dungeon hasn't been initialized yet.")
 
         cls.current_level.compute_fov(
-            cls.player.pos, cls.FOV_ALGORITHM, cls.FOV_RADIUS,
-            cls.FOV_LIGHT_WALLS
+            cls.player.pos, cls.FOV_RADIUS, cls.FOV_LIGHT_WALLS
         )
         cls.fov_recomputed = True
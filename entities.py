@@ -4,7 +4,9 @@
 from abc import ABC, abstractmethod
 from math import floor
 
+from activity import ATTACK_NOISE_RADIUS
 from misc import Colors, RenderPriority, message, Vector
+from scheduler import NORMAL_SPEED
 
 
 class Entity(ABC):
@@ -35,11 +37,20 @@ class Entity(ABC):
             rendered.
     """
 
-    pos = Vector(0, 0)
-    game_map = None
+    __slots__ = ('key', 'name', 'type', 'char', 'color', 'game_map', '_store', '_row', '_pos', '_blocks',
+                 '_render_priority', '_behavior')
+
+    # Columns of the fields kept in the entity's row of the level's EntityStore while it's in a level, and the slots
+    # they are kept in while it's not. The position is kept in the x and y columns, and in the _pos slot.
+    FIELDS = (('blocks', '_blocks'), ('render_priority', '_render_priority'), ('behavior', '_behavior'))
 
     @abstractmethod
     def __init__(self, key, name, type, char, color, blocks, render_priority):
+        self.game_map = None
+        # Store and row of the entity while it's in a level, see EntityStore
+        self._store = None
+        self._row = None
+        self._pos = Vector(0, 0)
         self.key = key
         self.name = name
         self.type = type
@@ -52,6 +63,56 @@ class Entity(ABC):
     def __repr__(self):
         return f"{self.key.name} '{self.name}' <{self.type}>@{self.pos}"
 
+    def _get(self, column, slot):
+        """Read a field from the entity's row in the entity store if it's in a level, from its slot otherwise."""
+        if self._store is None:
+            return getattr(self, slot)
+        return self._store.get(self._row, column)
+
+    def _set(self, column, slot, value):
+        """Write a field to the entity's row in the entity store if it's in a level, to its slot otherwise."""
+        if self._store is None:
+            setattr(self, slot, value)
+        else:
+            self._store.set(self._row, column, value)
+
+    @property
+    def pos(self):
+        if self._store is None:
+            return self._pos
+        return self._store.pos(self._row)
+
+    @pos.setter
+    def pos(self, val):
+        if self._store is None:
+            self._pos = val
+        else:
+            self._store.move(self._row, val)
+
+    @property
+    def blocks(self):
+        return self._get('blocks', '_blocks')
+
+    @blocks.setter
+    def blocks(self, val):
+        self._set('blocks', '_blocks', val)
+
+    @property
+    def render_priority(self):
+        return self._get('render_priority', '_render_priority')
+
+    @render_priority.setter
+    def render_priority(self, val):
+        self._set('render_priority', '_render_priority', val)
+
+    @property
+    def behavior(self):
+        return self._get('behavior', '_behavior')
+
+    @behavior.setter
+    def behavior(self, val):
+        self._set('behavior', '_behavior', val)
+
     def move(self, direction):
         """
         Move this entity in the specified direction in the given map.
@@ -62,6 +123,7 @@ class Entity(ABC):
 
         old_pos = self.pos
         self.pos += direction
+        self.game_map.index.move(self, old_pos)
         if self.blocks:
             # Update blocked tile in the map
             self.game_map.walkable[old_pos] = True
@@ -108,11 +170,12 @@ class Entity(ABC):
         """
         # If the entity was on another map, first remove it from there
         if self.game_map:
-            self.game_map.entities.remove(self)
-            self.game_map.walkable[self.pos] = True
+            self.game_map.remove_entity(self)
+            if self.blocks:
+                self.game_map.walkable[self.pos] = True
         self.game_map = game_map
         self.pos = position
-        game_map.entities.append(self)
+        game_map.add_entity(self)
         if self.blocks:
             game_map.walkable[position] = False
 
@@ -123,15 +186,20 @@ class Entity(ABC):
 
         Args:
              target (Entity): Target entity used by the behavior logic.
+
+        Returns:
+            The energy cost of the action taken, as returned by the behavior. None stands for a standard action, see
+            Scheduler.
         """
         if self.behavior is not None:
-            self.behavior(self, target)
+            return self.behavior(self, target)
 
 
 class Interactable(ABC):
     """
     Abstract class for things that entities can interact with. Can be implemented even by other entities.
     """
+    __slots__ = ()
 
     @abstractmethod
     def use(self, user):
@@ -158,6 +226,7 @@ class Item(Entity, Interactable):
         effect: A function executed on item use, defaults to None for items with no effect.
         weight (float): Weight of the item, defaults to 1.0
     """
+    __slots__ = ('effect', 'weight')
 
     def __init__(self, key, name, char, color, blocks=False, effect=None, weight=1.0):
         super().__init__(key, name, 'item', char, color, blocks, RenderPriority.ITEM)
@@ -179,7 +248,8 @@ class Item(Entity, Interactable):
             self.effect(target)
             # If the item was used from an interaction in the map, remove it from the map
             if self.game_map is not None:
-                self.game_map.entities.remove(self)
+                self.game_map.remove_entity(self)
+                self.game_map = None
             return True
         else:
             message("Nothing happened...")
@@ -194,11 +264,18 @@ class Actor(Entity):
         behavior: A function defining the actor's logic/AI, which consist of all the actions performed when it takes a
             turn. Can be None, meaning the actor has no behavior and thus does nothing.
         registry (Registry): A reference to the game's registry. Only needed to instantiate the backpack.
+        speed (int): How fast the actor acts, actors with twice the speed take twice as many turns. See Scheduler.
     """
+    __slots__ = ('speed', 'registry', 'backpack', '_strength', '_constitution', '_intelligence', '_dexterity', '_luck',
+                 '_level', '_exp', '_max_exp', '_gold', '_stats_dirty', '_max_hp', '_cur_hp', '_max_mp', '_cur_mp',
+                 '_physical_dmg', '_magical_dmg', '_ranged_dmg', '_crit_rate', '_dodge_rate')
 
-    def __init__(self, key, name, char, color, behavior, registry=None):
+    FIELDS = Entity.FIELDS + (('hp', '_cur_hp'), ('max_hp', '_max_hp'))
+
+    def __init__(self, key, name, char, color, behavior, registry=None, speed=NORMAL_SPEED):
         super().__init__(key, name, 'actor', char, color, blocks=True, render_priority=RenderPriority.ACTOR)
         self.behavior = behavior
+        self.speed = speed
         # base stats
         self._strength = 5
         self._constitution = 5
@@ -215,8 +292,9 @@ class Actor(Entity):
         # Only the player gets a reference to the backpack
         if registry is not None:
             self.backpack = registry.backpack
-        # computed stats
-        self._recompute_stats()
+        # computed stats, computed the first time one of them is read
+        self._stats_dirty = True
+        self._max_hp = self._cur_hp = None
 
     def _generic_setter(self, attr, val, _min=0, _max=float('inf')):
         if _min <= val <= _max:
@@ -228,15 +306,48 @@ class Actor(Entity):
 
     def recompute_stats(func):
         """
-        Decorator that triggers a stat recomputation after the function call.
+        Decorator that marks the computed stats as outdated after the function call, so that they are recomputed the
+        next time one of them is read.
         """
 
         def wrapper(self, *args, **kwargs):
             func(self, *args, **kwargs)
-            self._recompute_stats()
+            self._invalidate_stats()
 
         return wrapper
 
+    # Stats the computed stats depend on, see update_stats
+    BASE_STATS = ('level', 'strength', 'constitution', 'intelligence', 'dexterity', 'luck')
+
+    def update_stats(self, **stats):
+        """
+        Change several base stats at once, e.g. update_stats(strength=7, luck=2).
+
+        Args:
+            **stats: New value of every stat to change, by name. Only the stats in BASE_STATS can be changed.
+
+        Raises:
+            ValueError: If one of the stats is not a base stat.
+        """
+        for name in stats:
+            if name not in self.BASE_STATS:
+                raise ValueError(f"'{name}' is not a base stat.")
+        for name, val in stats.items():
+            self._generic_setter('_' + name, val, 1)
+        self._invalidate_stats()
+
+    def _invalidate_stats(self):
+        """Mark the computed stats as outdated."""
+        self._stats_dirty = True
+        # The hp in the entity store is outdated until the stats are recomputed, see EntityStore.sync
+        if self._store is not None:
+            self._store.stale[self._row] = True
+
+    def _ensure_stats(self):
+        """Recompute the computed stats if they are outdated."""
+        if self._stats_dirty:
+            self._recompute_stats()
+
     def attack(self, other):
         """
         Attack another actor using this actor's physical damage.
@@ -247,6 +358,9 @@ class Actor(Entity):
 
         # TODO: Work out differents types of damage
         other.hp -= self.physical_dmg
+        # Fights wake up whoever is sleeping nearby
+        if self.game_map is not None:
+            self.game_map.make_noise(self.pos, ATTACK_NOISE_RADIUS)
 
     def _die(self):
         """Become a corpse."""
@@ -259,69 +373,84 @@ class Actor(Entity):
         # If the actor didn't die in oblivion, corpse becomes walkable
         if self.game_map is not None:
             self.game_map.walkable[self.pos] = True
+            self.game_map.index.update_blocking(self)
 
     # Stat properties
     @property
     def physical_dmg(self):
+        self._ensure_stats()
         return self._physical_dmg
 
     @physical_dmg.setter
     def physical_dmg(self, val):
+        self._ensure_stats()
         self._generic_setter('_physical_dmg', val)
 
     @property
     def magical_dmg(self):
+        self._ensure_stats()
         return self._magical_dmg
 
     @magical_dmg.setter
     def magical_dmg(self, val):
+        self._ensure_stats()
         self._generic_setter('_magical_dmg', val)
 
     @property
     def ranged_dmg(self):
+        self._ensure_stats()
         return self._ranged_dmg
 
     @ranged_dmg.setter
     def ranged_dmg(self, val):
+        self._ensure_stats()
         self._generic_setter('_ranged_dmg', val)
 
     @property
     def crit_rate(self):
+        self._ensure_stats()
         return self._crit_rate
 
     @crit_rate.setter
     def crit_rate(self, val):
+        self._ensure_stats()
         self._generic_setter('_crit_rate', val)
 
     @property
     def dodge_rate(self):
+        self._ensure_stats()
         return self._dodge_rate
 
     @dodge_rate.setter
     def dodge_rate(self, val):
+        self._ensure_stats()
         self._generic_setter('_dodge_rate', val)
 
     @property
     def max_hp(self):
-        return self._max_hp
+        self._ensure_stats()
+        return self._get('max_hp', '_max_hp')
 
     @max_hp.setter
     def max_hp(self, val):
-        self._generic_setter('_max_hp', val)
+        self._ensure_stats()
+        self._set('max_hp', '_max_hp', max(val, 0))
 
     @property
     def hp(self):
-        return self._cur_hp
+        self._ensure_stats()
+        return self._get('hp', '_cur_hp')
 
     @hp.setter
     def hp(self, val):
-        self._generic_setter('_cur_hp', val, 0, self.max_hp)
+        self._set('hp', '_cur_hp', min(max(val, 0), self.max_hp))
         # Check if the actor died
         if self.dead:
             self._die()
 
     @property
     def max_mp(self):
+        self._ensure_stats()
         return self._max_mp
 
     @max_mp.setter
@@ -330,10 +459,12 @@ class Actor(Entity):
 
     @property
     def mp(self):
+        self._ensure_stats()
         return self._cur_mp
 
     @mp.setter
     def mp(self, val):
+        self._ensure_stats()
         self._generic_setter('_cur_mp', val)
 
     @property
@@ -453,24 +584,32 @@ class Actor(Entity):
 
     def _recompute_stats(self):
         """Recompute all stats that depend on other variables."""
-        self._max_hp = self._compute_max_hp()
+        max_hp = self._compute_max_hp()
+        self._set('max_hp', '_max_hp', max_hp)
+        self._set('hp', '_cur_hp', max_hp)
         self._max_mp = self._compute_max_mp()
-        self._cur_hp = self._max_hp
         self._cur_mp = self._max_mp
         self._physical_dmg = self._compute_physical_damage()
         self._ranged_dmg = self._compute_ranged_damage()
         self._magical_dmg = self._compute_magical_damage()
         self._crit_rate = self._compute_crit_rate()
         self._dodge_rate = self._compute_dodge_rate()
+        self._stats_dirty = False
+        if self._store is not None:
+            self._store.stale[self._row] = False
 
 
 class Stairs(Entity, Interactable, ABC):
+    __slots__ = ('dungeon',)
+
     def __init__(self, name, char, dungeon):
         super().__init__(None, name, 'stairs', char, Colors.WHITE, False, RenderPriority.ACTOR)
         self.dungeon = dungeon
 
 
 class StairsUp(Stairs):
+    __slots__ = ()
+
     def __init__(self, dungeon):
         super().__init__("Stairs up", '<', dungeon)
 
@@ -486,6 +625,8 @@ class StairsUp(Stairs):
 
 
 class StairsDown(Stairs):
+    __slots__ = ()
+
     def __init__(self, dungeon):
         super().__init__("Stairs down", '>', dungeon)
 
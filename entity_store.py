@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Structure-of-arrays storage for the entities of a level.
+
+Level-wide logic often asks questions about many entities at once: which actors are alive and in the FOV, what is
+within some radius of an explosion, which tiles are blocked. Answering them by walking a list of Python objects gets
+slow as levels grow, so the fields those questions need are kept in numpy columns, one row per entity, and the
+questions become array operations. The entities themselves don't keep these fields while they are in a level, their
+properties read and write their row instead, which keeps them small enough for levels with many thousands of them.
+"""
+
+import numpy as np
+
+from misc import RenderPriority, Vector
+
+
+class EntityStore:
+    """
+    A structure-of-arrays store of the entities of a level.
+
+    Every entity in the level owns a row, in which its position, whether it blocks, its render priority, its hp and max
+    hp, its behavior and the order in which it was added are kept. While it's in the level, the entity's properties are
+    views over its row, see Entity.FIELDS: the store is where these fields live. They are copied from the entity when
+    it's added, and back to it when it's removed, at which point the row is freed to be reused.
+
+    Entities that are not actors have a NaN hp and max hp, and entities without a behavior have a behavior id of -1.
+    The hp and max hp of actors whose computed stats are outdated, see Actor._invalidate_stats, are not known until the
+    stats are recomputed, so their rows are marked as stale instead, and the queries that look at hp bring them up to
+    date first, see sync.
+    Behavior ids are given by the store the first time a behavior is seen, see behavior_id.
+
+    Masks taken and returned by the query methods are boolean arrays with one element per row.
+
+    Args:
+        capacity (int): Amount of rows allocated up front, the store grows as needed.
+    """
+
+    # Name, dtype and value of unused rows of every column
+    COLUMNS = (
+        ('x', np.int32, 0),
+        ('y', np.int32, 0),
+        ('blocks', bool, False),
+        ('render_priority', np.int8, 0),
+        ('hp', np.float64, np.nan),
+        ('max_hp', np.float64, np.nan),
+        ('behavior', np.int16, -1),
+        ('stale', bool, False),
+        ('used', bool, False),
+        ('added', np.int64, 0),
+    )
+
+    def __init__(self, capacity=64):
+        for name, dtype, default in self.COLUMNS:
+            setattr(self, name, np.full(capacity, default, dtype=dtype))
+        # Row -> entity
+        self.entities = np.empty(capacity, dtype=object)
+        # Free rows, the lowest one last so that rows are handed out in order
+        self._free = list(range(capacity - 1, -1, -1))
+        # Rows are reused, so the order in which entities were added is kept in the added column
+        self._added = 0
+        self.behaviors = []
+        self._behavior_ids = {}
+
+    def __len__(self):
+        return len(self.entities) - len(self._free)
+
+    @property
+    def capacity(self):
+        return len(self.entities)
+
+    def _grow(self):
+        """Double the amount of rows."""
+        capacity = self.capacity
+        for name, dtype, default in self.COLUMNS:
+            setattr(self, name, np.concatenate((getattr(self, name), np.full(capacity, default, dtype=dtype))))
+        self.entities = np.concatenate((self.entities, np.empty(capacity, dtype=object)))
+        self._free = list(range(2 * capacity - 1, capacity - 1, -1)) + self._free
+
+    def _clear_row(self, row):
+        for name, _, default in self.COLUMNS:
+            getattr(self, name)[row] = default
+        self.entities[row] = None
+
+    def behavior_id(self, behavior):
+        """
+        Get the id of a behavior, giving it a new one if it's the first time it's seen.
+
+        Args:
+            behavior: The behavior function, or None.
+
+        Returns:
+            int: The id of the behavior, -1 for None.
+        """
+        if behavior is None:
+            return -1
+        behavior_id = self._behavior_ids.get(behavior)
+        if behavior_id is None:
+            behavior_id = len(self.behaviors)
+            self.behaviors.append(behavior)
+            self._behavior_ids[behavior] = behavior_id
+        return behavior_id
+
+    def add(self, entity):
+        """
+        Give a row to an entity and move the entity's fields into it.
+
+        Args:
+            entity (Entity): Entity to be added.
+        """
+        if not self._free:
+            self._grow()
+        row = self._free.pop()
+        self.entities[row] = entity
+        self.used[row] = True
+        self._added += 1
+        self.added[row] = self._added
+        self.move(row, entity._pos)
+        entity._pos = None
+        for column, slot in entity.FIELDS:
+            self.set(row, column, getattr(entity, slot))
+            setattr(entity, slot, None)
+        # Don't recompute the stats just to fill the row, whoever needs the hp syncs it
+        self.stale[row] = getattr(entity, '_stats_dirty', False)
+        entity._store = self
+        entity._row = row
+
+    def remove(self, entity):
+        """
+        Move the fields of an entity back into it and free its row.
+
+        Args:
+            entity (Entity): Entity to be removed.
+        """
+        row = entity._row
+        entity._pos = self.pos(row)
+        for column, slot in entity.FIELDS:
+            setattr(entity, slot, self.get(row, column))
+        self._clear_row(row)
+        self._free.append(row)
+        entity._store = None
+        entity._row = None
+
+    def pos(self, row):
+        """Get the position of a row."""
+        return Vector(self.x.item(row), self.y.item(row))
+
+    def move(self, row, pos):
+        """Update the position of a row."""
+        self.x[row] = pos.x
+        self.y[row] = pos.y
+
+    def get(self, row, column):
+        """Get a column of a row."""
+        value = getattr(self, column).item(row)
+        if column == 'behavior':
+            return None if value == -1 else self.behaviors[value]
+        if column == 'render_priority':
+            return RenderPriority(value)
+        return value
+
+    def set(self, row, column, value):
+        """Update a column of a row."""
+        if column == 'behavior':
+            value = self.behavior_id(value)
+        elif column == 'render_priority':
+            value = value.value
+        getattr(self, column)[row] = value
+
+    def sync(self):
+        """Recompute the stats of the actors with a stale row, which brings their hp and max hp up to date."""
+        for actor in self.entities[np.flatnonzero(self.stale)].tolist():
+            actor._ensure_stats()
+
+    # Queries
+    def living_actors(self):
+        """Get the mask of the actors that are alive."""
+        self.sync()
+        return self.used & (self.hp > 0)
+
+    def blocking(self):
+        """Get the mask of the entities that block."""
+        return self.used & self.blocks
+
+    def on_tiles(self, tiles):
+        """
+        Get the mask of the entities standing on the given tiles.
+
+        Args:
+            tiles (numpy.ndarray): Boolean [x, y] map of the tiles, e.g. a FOV.
+        """
+        # Unused rows are at (0, 0), which is always within the map
+        return self.used & tiles[self.x, self.y]
+
+    def within_radius(self, center, radius):
+        """
+        Get the mask of the entities within a radius of a position.
+
+        Args:
+            center (Vector): Center of the circle.
+            radius (float): Radius of the circle.
+        """
+        return self.used & ((self.x - center.x) ** 2 + (self.y - center.y) ** 2 <= radius ** 2)
+
+    def with_behavior(self, behavior):
+        """Get the mask of the entities with the given behavior."""
+        return self.used & (self.behavior == self.behavior_id(behavior))
+
+    def select(self, mask, order=None):
+        """
+        Get the entities of a mask, in the order they were added.
+
+        Args:
+            mask (numpy.ndarray): Boolean mask of the rows to select.
+            order (numpy.ndarray): Optional column to sort the entities by. Entities with the same value stay in the
+                order they were added.
+
+        Returns:
+            list(Entity): The selected entities.
+        """
+        rows = np.flatnonzero(mask)
+        # Rows are reused, so row order is not the order the entities were added in
+        if order is None:
+            rows = rows[np.argsort(self.added[rows])]
+        else:
+            rows = rows[np.lexsort((self.added[rows], order[rows]))]
+        return self.entities[rows].tolist()
+
+    def positions(self, mask):
+        """Get the (N, 2) coordinates of the entities of a mask."""
+        return np.stack((self.x[mask], self.y[mask]), axis=1)
+
+    def damage(self, mask, amount):
+        """
+        Lower the hp of every actor in a mask.
+
+        The new hp are computed for all of them at once, and only then assigned to the actors, which is needed for
+        those that die to become corpses.
+
+        Args:
+            mask (numpy.ndarray): Boolean mask of the entities to damage, entities that are not actors are ignored.
+            amount (float): Amount of hp to take from every actor.
+
+        Returns:
+            list(Actor): The damaged actors.
+        """
+        self.sync()
+        rows = np.flatnonzero(mask & ~np.isnan(self.hp))
+        new_hp = np.maximum(self.hp[rows] - amount, 0)
+        actors = self.entities[rows].tolist()
+        for actor, hp in zip(actors, new_hp.tolist()):
+            actor.hp = hp
+        return actors
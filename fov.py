@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Field of view computations over a transparency map.
+
+The FOV is computed by casting rays from the viewer to every tile in the perimeter of the square that encloses the
+radius, like tdl's BASIC algorithm does: tiles along a ray are visible up to the first non-transparent tile. Rays only
+depend on the radius, so they are precomputed once as a table of offsets and then applied to any amount of viewers at
+once with numpy, which makes computing the FOV of many viewers almost as cheap as computing the FOV of one.
+
+All the maps are numpy arrays indexed as [x, y], and don't depend on tdl.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+
+def trace_rays(targets, length):
+    """
+    Trace straight lines from the origin towards the given target offsets.
+
+    Lines are traced with a DDA, rounding to the nearest tile, so they match Bresenham lines.
+
+    Args:
+        targets (numpy.ndarray): (M, 2) offsets of the targets.
+        length (int): Amount of tiles to trace per line, beyond the origin.
+
+    Returns:
+        numpy.ndarray: (M, length, 2) offsets of the tiles crossed by each line, origin excluded. Lines to targets
+            closer than length tiles keep going past the target.
+    """
+    targets = np.asarray(targets, dtype=int).reshape(-1, 2)
+    distance = np.maximum(np.abs(targets).max(axis=1), 1)
+    steps = np.arange(1, length + 1)
+    t = steps[None, :] / distance[:, None]
+    return np.floor(t[:, :, None] * targets[:, None, :] + 0.5).astype(int)
+
+
+@lru_cache(maxsize=16)
+def ray_table(radius):
+    """
+    Get the rays cast from the origin for a given radius.
+
+    Args:
+        radius (int): How far away the rays go.
+
+    Returns:
+        tuple: A (M, radius, 2) array with the offsets of the tiles crossed by each of the M rays, and a (M, radius)
+            boolean array telling which of them are within the radius.
+    """
+    span = np.arange(-radius, radius + 1)
+    perimeter = [(x, y) for x in span for y in span if max(abs(x), abs(y)) == radius]
+    rays = trace_rays(perimeter, radius)
+    in_radius = (rays ** 2).sum(axis=2) <= radius ** 2
+    rays.setflags(write=False)
+    in_radius.setflags(write=False)
+    return rays, in_radius
+
+
+@lru_cache(maxsize=4096)
+def line(dx, dy):
+    """
+    Get the tiles of the Bresenham line from the origin to the given offset.
+
+    Lines are cached, so looking up the same offset again costs nothing.
+
+    Args:
+        dx (int): x offset of the target.
+        dy (int): y offset of the target.
+
+    Returns:
+        numpy.ndarray: A read-only (max(|dx|, |dy|), 2) array with the offsets of the tiles of the line, origin excluded
+            and target included.
+    """
+    tiles = trace_rays([(dx, dy)], max(abs(dx), abs(dy)))[0]
+    tiles.setflags(write=False)
+    return tiles
+
+
+def line_of_sight(transparent, origin, target):
+    """
+    Check whether the target can be seen from the origin, i.e. whether every tile between them is transparent.
+
+    Unlike a FOV, this doesn't depend on a radius, and the origin and target tiles don't need to be transparent.
+
+    Args:
+        transparent (numpy.ndarray): Boolean [x, y] map of the tiles that can be seen through.
+        origin (Vector): Position of the viewer.
+        target (Vector): Position of the tile to look at.
+
+    Returns:
+        bool: True if there's a line of sight between origin and target.
+    """
+    tiles = line(target.x - origin.x, target.y - origin.y)[:-1]
+    # The line stays within the box spanned by the origin and the target, so it never leaves the map
+    return bool(transparent[tiles[:, 0] + origin.x, tiles[:, 1] + origin.y].all())
+
+
+def line_of_sight_batch(transparent, origins, targets):
+    """
+    Check the line of sight between many pairs of tiles in a single pass.
+
+    Args:
+        transparent (numpy.ndarray): Boolean [x, y] map of the tiles that can be seen through.
+        origins (array-like): (N, 2) positions of the viewers.
+        targets (array-like): (N, 2) positions of the tiles to look at.
+
+    Returns:
+        numpy.ndarray: A boolean array of N elements telling whether each target can be seen from its origin.
+    """
+    origins = np.asarray(origins, dtype=int).reshape(-1, 2)
+    offsets = np.asarray(targets, dtype=int).reshape(-1, 2) - origins
+    distances = np.abs(offsets).max(axis=1)
+    length = int(distances.max()) if len(distances) else 0
+    rays = trace_rays(offsets, length)
+    # Only the tiles strictly between origin and target matter, the rest of the ray may even leave the map
+    between = np.arange(1, length + 1)[None, :] < distances[:, None]
+    xs = np.clip(origins[:, None, 0] + rays[:, :, 0], 0, transparent.shape[0] - 1)
+    ys = np.clip(origins[:, None, 1] + rays[:, :, 1], 0, transparent.shape[1] - 1)
+    return ~(~transparent[xs, ys] & between).any(axis=1)
+
+
+def compute_fov_batch(transparent, origins, radius, light_walls=True):
+    """
+    Compute the FOV of several viewers in a single pass.
+
+    Viewers can't see further than the radius, so every viewer only looks at the (2 * radius + 1)² window around it,
+    and the cost and memory of the pass depend on the radius rather than on the size of the map.
+
+    Args:
+        transparent (numpy.ndarray): Boolean [x, y] map of the tiles that can be seen through.
+        origins (array-like): (N, 2) positions of the viewers.
+        radius (int): How far away can the viewers see, 0 or less means there's no limit.
+        light_walls (bool): Whether the non-transparent tiles that bound the FOV are visible or not.
+
+    Returns:
+        numpy.ndarray: A (N, width, height) boolean array with the FOV of every viewer.
+    """
+    width, height = transparent.shape
+    if radius <= 0:
+        radius = max(width, height)
+    origins = np.asarray(origins, dtype=int).reshape(-1, 2)
+    rays, in_radius = ray_table(radius)
+
+    # Pad the map with opaque tiles so that windows can leave it without bounds checks
+    padded = np.zeros((width + 2 * radius, height + 2 * radius), dtype=bool)
+    padded[radius:radius + width, radius:radius + height] = transparent
+    # (N, 2 * radius + 1, 2 * radius + 1) windows around the viewers, which stand at (radius, radius) of their window
+    span = np.arange(2 * radius + 1)
+    windows = padded[origins[:, 0, None, None] + span[None, :, None], origins[:, 1, None, None] + span[None, None, :]]
+
+    # (N, M, L) tiles crossed by the rays of every viewer, in window coordinates
+    ray_x = rays[:, :, 0] + radius
+    ray_y = rays[:, :, 1] + radius
+    opaque = ~windows[:, ray_x, ray_y]
+    # A tile is visible if there's no opaque tile before it in the ray
+    visible = (np.cumsum(opaque, axis=2) - opaque == 0) & in_radius[None]
+    if not light_walls:
+        visible &= ~opaque
+
+    seen = np.zeros(windows.shape, dtype=bool)
+    viewer = np.broadcast_to(np.arange(len(origins))[:, None, None], visible.shape)
+    seen[viewer[visible], np.broadcast_to(ray_x, visible.shape)[visible],
+         np.broadcast_to(ray_y, visible.shape)[visible]] = True
+    # Viewers can always see their own tile
+    seen[:, radius, radius] = True
+    if light_walls:
+        _light_walls(seen, windows, radius)
+
+    # Put the windows in place, leaving out what's past the edges of the map
+    viewer, x, y = np.nonzero(seen)
+    x += origins[viewer, 0] - radius
+    y += origins[viewer, 1] - radius
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    fov = np.zeros((len(origins), width, height), dtype=bool)
+    fov[viewer[inside], x[inside], y[inside]] = True
+    return fov
+
+
+def _light_walls(seen, windows, radius):
+    """
+    Light the walls next to visible floor that rays missed, so that rooms don't show gaps in their walls.
+
+    A wall within the radius is lit if the floor tile next to it in the direction of the viewer is visible. Works on the
+    windows around the viewers, see compute_fov_batch.
+    """
+    offsets = np.arange(-radius, radius + 1)
+    dx = offsets[:, None]
+    dy = offsets[None, :]
+    x = dx + radius
+    y = dy + radius
+    # Neighbours one step closer to the viewer
+    near_x = x - np.sign(dx)
+    near_y = y - np.sign(dy)
+    floor = seen & windows
+    lit = floor[:, near_x, y] | floor[:, x, near_y] | floor[:, near_x, near_y]
+    seen |= lit & ~windows & (dx ** 2 + dy ** 2 <= radius ** 2)
+
+
+def compute_fov(transparent, origin, radius, light_walls=True):
+    """
+    Compute the FOV of a single viewer.
+
+    Args:
+        transparent (numpy.ndarray): Boolean [x, y] map of the tiles that can be seen through.
+        origin (Vector): Position of the viewer.
+        radius (int): How far away can the viewer see, 0 or less means there's no limit.
+        light_walls (bool): Whether the non-transparent tiles that bound the FOV are visible or not.
+
+    Returns:
+        numpy.ndarray: A (width, height) boolean array with the FOV of the viewer.
+    """
+    return compute_fov_batch(transparent, [(origin.x, origin.y)], radius, light_walls)[0]
+
+
+class FovCache:
+    """
+    A LRU cache of FOV fields.
+
+    Fields are keyed by the viewer's position, the radius, whether walls are lit, and the version of the transparent
+    tilemap they were computed from, so a change in the terrain makes every cached field stale.
+
+    Args:
+        maxsize (int): Max amount of fields to keep.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._fields = OrderedDict()
+
+    def __len__(self):
+        return len(self._fields)
+
+    def get(self, transparent, origin, radius, light_walls=True):
+        """
+        Get the FOV of a viewer, computing it only if it's not cached.
+
+        Args:
+            transparent (Tilemap): Tilemap of the tiles that can be seen through.
+            origin (Vector): Position of the viewer.
+            radius (int): How far away can the viewer see, 0 or less means there's no limit.
+            light_walls (bool): Whether the non-transparent tiles that bound the FOV are visible or not.
+
+        Returns:
+            numpy.ndarray: A read-only (width, height) boolean array with the FOV of the viewer.
+        """
+        key = (origin.x, origin.y, radius, light_walls, transparent.version)
+        field = self._fields.get(key)
+        if field is not None:
+            self.hits += 1
+            self._fields.move_to_end(key)
+            return field
+        self.misses += 1
+        field = compute_fov(transparent.array, origin, radius, light_walls).copy()
+        field.setflags(write=False)
+        self._fields[key] = field
+        if len(self._fields) > self.maxsize:
+            self._fields.popitem(last=False)
+        return field
+
+    def clear(self):
+        """Remove every cached field."""
+        self._fields.clear()
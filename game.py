@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""The parts of the game loop that don't depend on the display, shared by main, headless and replay."""
+
+from action_manager import ActionManager
+from dungeon import Dungeon
+from entities import Actor
+from misc import Colors
+from profiler import Profiler
+from registry import Actors, Registry
+from scheduler import ACTION_COST
+
+
+class KeyEvent:
+    """
+    A key press, with the attributes of tdl's KEYDOWN events that ActionManager looks at.
+
+    Args:
+        key (str): Name of the key, e.g. 'UP' or 'ENTER', 'CHAR' for keys that type a character.
+        char (str): Character typed by the key, '' if none.
+        alt (bool): Whether alt was held down.
+    """
+    __slots__ = ('key', 'char', 'alt')
+    type = 'KEYDOWN'
+
+    def __init__(self, key='CHAR', char='', alt=False):
+        self.key = key
+        self.char = char
+        self.alt = alt
+
+    def __repr__(self):
+        return f"KeyEvent({self.key!r}, {self.char!r}, alt={self.alt})"
+
+    def __eq__(self, other):
+        return isinstance(other, KeyEvent) and (self.key, self.char, self.alt) == (other.key, other.char, other.alt)
+
+    @classmethod
+    def char_key(cls, char):
+        """Create the event of a key that types the given character."""
+        return cls('CHAR', char)
+
+
+def new_game(seed=None):
+    """
+    Start a new game with a fresh dungeon.
+
+    Args:
+        seed (int): Seed of the dungeon, a random one is used if not given.
+
+    Returns:
+        tuple: The player, the dungeon and the action manager.
+    """
+    registry = Registry()
+    player = Actor(Actors.HERO, "Player", '@', Colors.WHITE, behavior=None, registry=registry)
+    # XXX: Give player level boost for testing purposes
+    player.level = 10
+    dungeon = Dungeon()
+    dungeon.clear()
+    dungeon.initialize(player, registry, seed)
+    # The action manager is a Singleton, so it might have been created for an earlier game already
+    action_manager = ActionManager(player, dungeon)
+    action_manager.player = player
+    action_manager.dungeon = dungeon
+    return player, dungeon, action_manager
+
+
+def play_turn(player, dungeon, action_manager, key):
+    """
+    Press a key and, if the player's action took a turn, let everything else in the dungeon take theirs.
+
+    The player's action, the enemy turn and the tick of the other levels are timed as phases, see Profiler. Frames
+    without a key are not timed, so that the idle frames of the polling game loop don't crowd the turns out.
+
+    Args:
+        player (Actor): The player.
+        dungeon (Dungeon): The dungeon.
+        action_manager (ActionManager): The action manager.
+        key (KeyEvent): The key pressed, None if no key was pressed.
+
+    Returns:
+        bool: True if the player's action took a turn.
+    """
+    action_manager.user_input = key
+    if key is None:
+        return False
+    profiler = Profiler()
+    with profiler.phase('action'):
+        if action_manager.handle_key_input() is False:
+            return False
+    with profiler.phase('enemies'):
+        dungeon.current_level.run_turns(ACTION_COST / player.speed, player)
+    with profiler.phase('background'):
+        dungeon.tick()
+    return True
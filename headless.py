@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Run the game without a display, with a bot playing instead of a person.
+
+The game logic runs exactly as in main: the bot's policy presses keys, which go through ActionManager, and the
+monsters and the rest of the dungeon take their turns after every action of the player. Nothing is rendered, so this
+can run on servers with no display, and it reports how many turns per second the game logic alone can take.
+
+A policy is a function that takes the player, the dungeon and a random.Random, and returns the KeyEvent of the key to
+press next. See random_walk, go_to_stairs and fight.
+
+Usage:
+    python headless.py --policy fight --turns 10000 --seed 1234
+"""
+
+import argparse
+import time
+from random import Random
+
+from action_manager import ActionManager
+from game import KeyEvent, new_game, play_turn
+from profiler import Profiler
+
+# Char of the key to press to move in every direction
+DIRECTION_KEYS = {direction: char for char, direction in ActionManager.MOVEMENT_KEYS.items()}
+
+
+def _step_towards(player, level, goal, rng):
+    """Get the key that takes the player one step closer to the goal, a random step if the goal can't be reached."""
+    path = level.compute_path(player.pos, goal)
+    if not path:
+        return random_walk(player, None, rng)
+    return KeyEvent.char_key(DIRECTION_KEYS[path[0] - player.pos])
+
+
+def random_walk(player, dungeon, rng):
+    """Move in a random direction, attacking whatever is in the way."""
+    return KeyEvent.char_key(rng.choice(list(DIRECTION_KEYS.values())))
+
+
+def go_to_stairs(player, dungeon, rng):
+    """Head for the stairs down and take them."""
+    level = dungeon.current_level
+    if player.pos == level.down_stairs.pos:
+        return KeyEvent.char_key('e')
+    return _step_towards(player, level, level.down_stairs.pos, rng)
+
+
+def fight(player, dungeon, rng):
+    """Attack the closest monster in sight, and head for the stairs down when there's none left."""
+    level = dungeon.current_level
+    monsters = [actor for actor in level.actors_in_fov() if actor is not player]
+    if not monsters:
+        return go_to_stairs(player, dungeon, rng)
+    closest = min(monsters, key=lambda monster: player.distance_to(monster.pos))
+    return _step_towards(player, level, closest.pos, rng)
+
+
+POLICIES = {
+    'random': random_walk,
+    'stairs': go_to_stairs,
+    'fight': fight,
+}
+
+
+class RunStats:
+    """
+    What happened in a headless run.
+
+    Args:
+        turns (int): Turns taken by the player.
+        seconds (float): Wall time of the run.
+        depth (int): Level the player ended at, starting from 1.
+        died (bool): Whether the player died.
+    """
+
+    def __init__(self, turns, seconds, depth, died):
+        self.turns = turns
+        self.seconds = seconds
+        self.depth = depth
+        self.died = died
+
+    @property
+    def turns_per_second(self):
+        return self.turns / self.seconds if self.seconds else float('inf')
+
+    def __str__(self):
+        outcome = "died" if self.died else "alive"
+        return (f"{self.turns} turns in {self.seconds:.2f}s ({self.turns_per_second:.1f} turns/s), "
+                f"depth {self.depth}, {outcome}")
+
+
+def run(policy, turns, seed=None, max_idle=100):
+    """
+    Let a policy play a new game for the given amount of turns, or until the player dies.
+
+    Args:
+        policy (callable): The policy playing the game.
+        turns (int): Turns to play.
+        seed (int): Seed of the dungeon and of the policy, a random one is used if not given.
+        max_idle (int): The run stops if the policy presses this many keys in a row that don't take a turn.
+
+    Returns:
+        RunStats: What happened in the run.
+    """
+    seed = seed if seed is not None else Random().getrandbits(32)
+    player, dungeon, action_manager = new_game(seed)
+    rng = Random(seed)
+    taken = idle = 0
+    start = time.perf_counter()
+    while taken < turns and not player.dead and idle < max_idle:
+        if play_turn(player, dungeon, action_manager, policy(player, dungeon, rng)):
+            taken += 1
+            idle = 0
+        else:
+            idle += 1
+    stats = RunStats(taken, time.perf_counter() - start, dungeon.current_level_number, player.dead)
+    dungeon.clear()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the game without a display, with a bot playing it.")
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='fight', help="How the bot plays.")
+    parser.add_argument('--turns', type=int, default=1000, help="Turns to play.")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the dungeon and of the bot.")
+    parser.add_argument('--profile', default=None, help="Path of a file to write the timings of the game loop to.")
+    args = parser.parse_args()
+    if args.profile:
+        Profiler().enable(args.profile)
+    print(run(POLICIES[args.policy], args.turns, args.seed))
+    if args.profile:
+        Profiler().dump()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Intents of the monsters.
+
+A planned behavior is split in two: a plan, which looks at the level and decides what the caller wants to do, and the
+action itself, which carries the decision out. Keeping the decision apart from the action lets the plans be written and
+tested without changing the level.
+
+The monsters act one after another, in turn order, each planning against the level as the monsters before it
+left it. Planning them at the same time in a thread pool was tried and dropped: plans are pure Python, which holds the
+GIL, so the threads made the enemy turns slower, and planning against a snapshot taken at the start of the turn
+played out differently from acting one after another.
+"""
+
+from enum import Enum
+from functools import wraps
+
+
+class IntentKind(Enum):
+    """The kinds of things a monster can decide to do in its turn."""
+    MOVE = 0
+    ATTACK = 1
+
+
+class Intent:
+    """
+    What a monster decided to do in its turn.
+
+    Args:
+        kind (IntentKind): What the monster wants to do.
+        tile (Vector): Tile to move to, next to the monster, for MOVE intents.
+        target (Actor): Actor to attack, for ATTACK intents.
+    """
+    __slots__ = ('kind', 'tile', 'target')
+
+    def __init__(self, kind, tile=None, target=None):
+        self.kind = kind
+        self.tile = tile
+        self.target = target
+
+    def __repr__(self):
+        return f"Intent({self.kind.name}, tile={self.tile}, target={self.target})"
+
+    @classmethod
+    def move(cls, tile):
+        return cls(IntentKind.MOVE, tile=tile)
+
+    @classmethod
+    def attack(cls, target):
+        return cls(IntentKind.ATTACK, target=target)
+
+    def perform(self, caller):
+        """
+        Carry the intent out.
+
+        Args:
+            caller (Actor): Actor that made the intent.
+        """
+        if self.kind is IntentKind.MOVE:
+            caller.move(self.tile - caller.pos)
+        else:
+            caller.attack(self.target)
+
+
+def planned(plan):
+    """
+    Decorator that makes a behavior out of a plan.
+
+    The plan takes the caller, the target and the level to look at, and returns the Intent of the caller, or None to do
+    nothing. The behavior plans on the caller's level and carries the intent out right away, and keeps the plan in its
+    plan attribute.
+
+    Args:
+        plan (callable): The plan.
+
+    Returns:
+        callable: The behavior.
+    """
+    @wraps(plan)
+    def behavior(caller, target):
+        intent = plan(caller, target, caller.game_map)
+        if intent is not None:
+            intent.perform(caller)
+
+    behavior.plan = plan
+    return behavior
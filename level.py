@@ -2,12 +2,29 @@
 # -*- coding: utf-8 -*-
 
 
-from random import randint, choice
+import heapq
+import random
+from random import Random
 
-from tdl.map import Map
+import numpy as np
 
-from entities import StairsUp, StairsDown
+import fov
+from activity import ActivityZones
+from entities import Actor, StairsUp, StairsDown
+from entity_store import EntityStore
 from misc import Vector
+from pathfinding import FlowField, PathCache, RoomGraph, find_paths
+from profiler import profiled
+from scheduler import Scheduler
+from spatial import FreeCells, SpatialIndex
+
+# Monsters only chase a target they can see, so flow fields are flooded this far from their target: twice the FOV radius
+# of the dungeon, which leaves room to go around obstacles
+FLOW_FIELD_MAX_DISTANCE = 20
+
+
+class LevelException(Exception):
+    pass
 
 
 class Room:
@@ -38,6 +55,16 @@ class Room:
         center_y = int((self.y1 + self.y2) / 2)
         return Vector(center_x, center_y)
 
+    @property
+    def inner(self):
+        """
+        Get the walkable interior of the room as a pair of slices, ready to index an [x, y] array.
+
+        Returns:
+            tuple(slice, slice): Slices covering the x and y ranges inside the walls of the room.
+        """
+        return slice(self.x1 + 1, self.x2), slice(self.y1 + 1, self.y2)
+
     def intersect(self, other):
         """
         Get whether or not this room intersects with another room.
@@ -52,37 +79,188 @@ class Room:
                 self.y1 <= other.y2 and self.y2 >= other.y1)
 
 
+def split_space(width, height, count, min_size, rng=random):
+    """
+    Split a rectangular area into the given amount of leaves using binary space partitioning.
+
+    The biggest leaf is always split first, so the leaves end up having similar sizes, and each split is done along the
+    longest side of the leaf at a random point. Every leaf is at least min_size wide and high.
+
+    Args:
+        width (int): Width of the area to split.
+        height (int): Height of the area to split.
+        count (int): Amount of leaves to produce.
+        min_size (int): Min width and height of a leaf.
+        rng (Random): Random number generator used to pick the split points, defaults to the random module itself.
+
+    Returns:
+        list(tuple): (x, y, width, height) of every leaf, in tree order, so that consecutive leaves are next to each
+            other.
+
+    Raises:
+        LevelException: If the area is too small to be split into that many leaves.
+    """
+    # A node is [x, y, width, height, children]
+    root = [0, 0, width, height, None]
+    # Max-heap on the area, the counter breaks ties without comparing nodes
+    heap = [(-width * height, 0, root)]
+    leaves = 1
+    pushed = 1
+    while leaves < count:
+        if not heap:
+            raise LevelException(f"Can't fit {count} rooms of size {min_size} in a {width}x{height} level.")
+        _, _, node = heapq.heappop(heap)
+        x, y, w, h, _ = node
+        can_split_x = w >= 2 * min_size
+        can_split_y = h >= 2 * min_size
+        if not (can_split_x or can_split_y):
+            # Too small to be split, it stays as a leaf
+            continue
+        if can_split_x and (w >= h or not can_split_y):
+            cut = rng.randint(min_size, w - min_size)
+            children = ([x, y, cut, h, None], [x + cut, y, w - cut, h, None])
+        else:
+            cut = rng.randint(min_size, h - min_size)
+            children = ([x, y, w, cut, None], [x, y + cut, w, h - cut, None])
+        node[4] = children
+        leaves += 1
+        for child in children:
+            heapq.heappush(heap, (-child[2] * child[3], pushed, child))
+            pushed += 1
+
+    # Collect the leaves in tree order
+    result = []
+    stack = [root]
+    while stack:
+        x, y, w, h, children = stack.pop()
+        if children is None:
+            result.append((x, y, w, h))
+        else:
+            stack.extend(reversed(children))
+    return result
+
+
+class LevelDelta:
+    """
+    A compact log of what changed in a level since it was generated.
+
+    Together with the seed the level was generated from, it's enough to rebuild the level as the player left it, so
+    levels don't have to be kept in memory while the player is somewhere else. Spawned entities are referred to by the
+    order in which they were spawned.
+
+    Args:
+        explored (numpy.ndarray): The explored tiles, bit-packed with numpy.packbits.
+        removed (list(int)): Spawned entities that are no longer in the level, e.g. picked-up or used items.
+        killed (dict): Spawned actors that died, mapped to the (x, y) tile where they died.
+        actors (dict): Spawned actors that are alive but moved or were hurt, mapped to their (x, y, hp).
+    """
+
+    def __init__(self, explored, removed, killed, actors):
+        self.explored = explored
+        self.removed = removed
+        self.killed = killed
+        self.actors = actors
+
+
+def as_coordinates(tiles):
+    """
+    Turn a group of tiles into an array of coordinates.
+
+    Args:
+        tiles: The tiles, as a (N, 2) array of coordinates, a list of Vectors (e.g. a path) or a Room, in which case its
+            interior is used.
+
+    Returns:
+        numpy.ndarray: A (N, 2) int array with the coordinates of the tiles.
+    """
+    if isinstance(tiles, Room):
+        xs, ys = np.mgrid[tiles.inner]
+        return np.stack((xs.ravel(), ys.ravel()), axis=1)
+    if isinstance(tiles, list):
+        return np.array([(pos.x, pos.y) for pos in tiles], dtype=int).reshape(-1, 2)
+    return np.asarray(tiles, dtype=int).reshape(-1, 2)
+
+
+def query_tiles(array, tiles):
+    """
+    Look up many tiles of a [x, y] map at once.
+
+    Args:
+        array (numpy.ndarray): The map.
+        tiles: The tiles to look up, see as_coordinates.
+
+    Returns:
+        numpy.ndarray: The value of every tile, tiles out of the map being False.
+    """
+    coordinates = as_coordinates(tiles)
+    inside = ((coordinates >= 0).all(axis=1) & (coordinates[:, 0] < array.shape[0]) &
+              (coordinates[:, 1] < array.shape[1]))
+    result = np.zeros(len(coordinates), dtype=bool)
+    result[inside] = array[coordinates[inside, 0], coordinates[inside, 1]]
+    return result
+
+
 class Tilemap:
     """
     A wrapper to access numpy array elements using vectors.
 
+    Writes should go through the tilemap rather than through the underlying array, so that its version gets bumped.
+
+    Besides single positions, a tilemap can be indexed with whole regions so that carving rooms, tunnels or resetting
+    the map are done as single array operations:
+
+        * Vector: a single tile.
+        * Room: the walkable interior of the room.
+        * tuple: anything numpy understands, e.g. (x, y), (slice, slice) or (xs, ys) coordinate arrays.
+        * numpy array: either a boolean mask with the same shape as the map, or an (N, 2) array of (x, y) coordinates.
+        * list of Vectors: the given tiles.
+
     Args:
-        array (list): This can actually be either a native matrix or
-            a numpy matrix, depending on which one is passed-in the logic will
-            be different, but the result will be the same.
+        array (numpy.ndarray): Matrix indexed as [x, y]. A nested list is also accepted, in which case it is converted
+            to a numpy array.
     """
 
     def __init__(self, array):
-        # Check if it's a numpy matrix or a normal matrix
         if isinstance(array, list):
-            self.is_numpy_array = False
-        else:
-            # Assume if it's not a list then it's a numpy array so that we don't
-            # have to import numpy and check the type explicitly
-            self.is_numpy_array = True
+            array = np.array(array)
         self._array = array
-
-    def __getitem__(self, pos):
-        if self.is_numpy_array:
-            return self._array[pos.x, pos.y]
-        else:
-            return self._array[pos.x][pos.y]
-
-    def __setitem__(self, pos, val):
-        if self.is_numpy_array:
-            self._array[pos.x, pos.y] = val
-        else:
-            self._array[pos.x][pos.y] = val
+        # Bumped on every write, so that results computed from the map can tell when they are stale
+        self.version = 0
+
+    @property
+    def array(self):
+        """Return the underlying numpy array."""
+        return self._array
+
+    @property
+    def shape(self):
+        return self._array.shape
+
+    @staticmethod
+    def _index(key):
+        """Translate a tilemap key into a numpy index."""
+        if isinstance(key, Vector):
+            return key.x, key.y
+        if isinstance(key, Room):
+            return key.inner
+        if isinstance(key, np.ndarray) and key.dtype != bool:
+            # (N, 2) array of coordinates
+            return key[:, 0], key[:, 1]
+        if isinstance(key, list):
+            return [pos.x for pos in key], [pos.y for pos in key]
+        return key
+
+    def __getitem__(self, key):
+        return self._array[self._index(key)]
+
+    def __setitem__(self, key, val):
+        self._array[self._index(key)] = val
+        self.version += 1
+
+    def fill(self, val):
+        """Set every tile in the map to the given value."""
+        self._array.fill(val)
+        self.version += 1
 
 
 class Level:
@@ -100,28 +278,51 @@ class Level:
     Args:
         width (int): Max width of the level to be generated.
         height (int): Max height of the level to be generated.
-        room_max_count (int): Max amount of rooms to be generated for this
+        room_max_count (int): Amount of rooms to be generated for this
                 particular level.
         room_min_size (int): Min amount of tiles per room.
         room_max_size (int): Max amount of tiles per room.
         max_entities_per_room (int): Max amount of entities to be spawned
             per room.
         registry (Registry): Reference to the game's registry.
+        seed (int): Seed for the level's random number generator. The same seed always generates the same level.
+        blank (bool): If True, the level is neither generated nor populated, so that it can be filled in by other
+            means, e.g. when loading a saved game.
     """
 
     def __init__(self, width, height, room_max_count, room_min_size, room_max_size, max_entities_per_room, dungeon,
-                 registry):
+                 registry, seed=None, blank=False):
         # TODO: Instead of using so many variables, use a context which contains them all and depends on the theme
-        self._map = Map(width, height)
+        self.seed = seed
+        self.random = Random(seed)
         self.width = width
         self.height = height
-        self.explored = Tilemap([[False for y in range(height)] for x in range(width)])
+        self.explored = Tilemap(np.zeros((width, height), dtype=bool))
         self.rooms = []
-        self.entities = []
-        # Add tilemaps for some Map arrays
-        self.walkable = Tilemap(self._map.walkable)
-        self.transparent = Tilemap(self._map.transparent)
-        self.fov = Tilemap(self._map.fov)
+        # Entities are kept in a dict used as an ordered set, so that they can be removed in constant time
+        self.entities = {}
+        self.index = SpatialIndex()
+        # Columns of the fields of the entities, for queries over many entities at once
+        self.store = EntityStore()
+        # Turn order of the awake actors with a behavior, and the actors that sleep
+        self.scheduler = Scheduler()
+        self.activity = ActivityZones(self.scheduler)
+        # Room -> FreeCells of the room, built the first time something is spawned in the room
+        self._free_cells = {}
+        # Entities spawned while populating the level and where they were spawned, in spawn order
+        self.spawned = []
+        self.spawn_positions = []
+        self.walkable = Tilemap(np.zeros((width, height), dtype=bool))
+        self.transparent = Tilemap(np.zeros((width, height), dtype=bool))
+        self.fov = Tilemap(np.zeros((width, height), dtype=bool))
+        self.fov_cache = fov.FovCache()
+        self.path_cache = PathCache(self._search_path)
+        # Last flow field computed, shared by every entity that follows the same target
+        self._flow_field = None
+        self._flow_field_key = None
+        # Graph of the rooms used to plan long paths, and the terrain version it was built for
+        self._room_graph = None
+        self._room_graph_version = None
 
         # Up and down stairs. These get updated when the level is generated.
         self.up_stairs = StairsUp(dungeon)
@@ -133,87 +334,90 @@ class Level:
         self.room_max_size = room_max_size
         self.max_entities_per_room = max_entities_per_room
 
+        if blank:
+            return
         # Generate the level
         self.generate()
         # Throw some monsters and items in it
         # TODO: Instead of passing the registry, use a context/theme
         self.populate(registry)
 
+    def _carve(self, region):
+        """Make the tiles in the given region walkable and transparent."""
+        self.walkable[region] = True
+        self.transparent[region] = True
+
     def _init_room(self, room):
         """Make the tiles in the map that correspond to the room walkable."""
-        for x in range(room.x1 + 1, room.x2):
-            for y in range(room.y1 + 1, room.y2):
-                pos = Vector(x, y)
-                self.walkable[pos] = True
-                self.transparent[pos] = True
+        self._carve(room)
 
     def _create_h_tunnel(self, x1, x2, y):
         """Create an horizontal tunnel from x1 to x2 at a fixed y."""
-        for x in range(min(x1, x2), max(x1, x2) + 1):
-            pos = Vector(x, y)
-            self.walkable[pos] = True
-            self.transparent[pos] = True
+        self._carve((slice(min(x1, x2), max(x1, x2) + 1), y))
 
     def _create_v_tunnel(self, y1, y2, x):
         """Create a vertical tunnel from y1 to y2 at a fixed x."""
-        for y in range(min(y1, y2), max(y1, y2) + 1):
-            pos = Vector(x, y)
-            self.walkable[pos] = True
-            self.transparent[pos] = True
+        self._carve((x, slice(min(y1, y2), max(y1, y2) + 1)))
+
+    def _place_rooms(self):
+        """
+        Lay out exactly room_max_count non-overlapping rooms.
+
+        The level is split into one leaf per room with split_space, and a room of random size is placed inside each
+        leaf. Leaves keep one tile of margin on their right and bottom sides, so rooms in different leaves never share
+        walls.
+
+        Returns:
+            list(Room): The rooms, ordered so that consecutive rooms are close to each other.
+
+        Raises:
+            LevelException: If the level is too small to hold that many rooms.
+        """
+        rooms = []
+        for x, y, w, h in split_space(self.width, self.height, self.room_max_count, self.room_min_size + 1,
+                                      self.random):
+            room_w = self.random.randint(self.room_min_size, min(self.room_max_size, w - 1))
+            room_h = self.random.randint(self.room_min_size, min(self.room_max_size, h - 1))
+            room_x = self.random.randint(x, x + w - 1 - room_w)
+            room_y = self.random.randint(y, y + h - 1 - room_h)
+            rooms.append(Room(room_x, room_y, room_w, room_h))
+        return rooms
 
     def generate(self):
         """
         Generate the level's layout.
         """
         # Initialize map
-        for x in range(self.width):
-            for y in range(self.height):
-                pos = Vector(x, y)
-                self.walkable[pos] = False
-                self.transparent[pos] = False
-
-        for r in range(self.room_max_count):
-            # Random width and height
-            w = randint(self.room_min_size, self.room_max_size)
-            h = randint(self.room_min_size, self.room_max_size)
-            # Random position without going out of the boundaries of the map
-            x = randint(0, self.width - w - 1)
-            y = randint(0, self.height - h - 1)
-
-            new_room = Room(x, y, w, h)
-
-            # If it intersects with an existent room, start over
-            for room in self.rooms:
-                if new_room.intersect(room):
-                    break
-            else:
-                # Room is valid
-                self._init_room(new_room)
+        self.walkable.fill(False)
+        self.transparent.fill(False)
 
-                center = new_room.center()
+        for new_room in self._place_rooms():
+            self._init_room(new_room)
 
-                if not self.rooms:
-                    # First room, place up stairs
-                    self.up_stairs.place(self, center)
+            center = new_room.center()
 
-                else:
-                    # Connect room to previous room
-                    previous = self.rooms[-1].center()
+            if not self.rooms:
+                # First room, place up stairs
+                self.up_stairs.place(self, center)
 
-                    # Flip a coin
-                    if randint(0, 1) == 1:
-                        # First move horizontally, then vertically
-                        self._create_h_tunnel(previous.x, center.x, previous.y)
-                        self._create_v_tunnel(previous.y, center.y, center.x)
-                    else:
-                        # First move vertically, then horizontally
-                        self._create_v_tunnel(previous.y, center.y, previous.x)
-                        self._create_h_tunnel(previous.x, center.x, center.y)
+            else:
+                # Connect room to previous room
+                previous = self.rooms[-1].center()
+
+                # Flip a coin
+                if self.random.randint(0, 1) == 1:
+                    # First move horizontally, then vertically
+                    self._create_h_tunnel(previous.x, center.x, previous.y)
+                    self._create_v_tunnel(previous.y, center.y, center.x)
+                else:
+                    # First move vertically, then horizontally
+                    self._create_v_tunnel(previous.y, center.y, previous.x)
+                    self._create_h_tunnel(previous.x, center.x, center.y)
 
-                self.rooms.append(new_room)
+            self.rooms.append(new_room)
 
         # Place down stairs
-        random_room = choice(self.rooms)
+        random_room = self.random.choice(self.rooms)
         self.place_entity_randomly(self.down_stairs, random_room)
 
     def populate(self, registry):
@@ -223,28 +427,215 @@ class Level:
         for room in self.rooms:
             self._place_entities(room, registry)
 
-    def compute_fov(self, pos, fov, radius, light_walls):
+    def record_delta(self):
+        """
+        Log what changed in the level since it was generated.
+
+        Returns:
+            LevelDelta: The changes made to the level, see apply_delta to replay them.
+        """
+        removed = []
+        killed = {}
+        actors = {}
+        for i, (entity, spawn_pos) in enumerate(zip(self.spawned, self.spawn_positions)):
+            if entity.game_map is not self:
+                removed.append(i)
+            elif isinstance(entity, Actor):
+                if entity.dead:
+                    killed[i] = (entity.pos.x, entity.pos.y)
+                elif entity.pos != spawn_pos or entity.hp != entity.max_hp:
+                    actors[i] = (entity.pos.x, entity.pos.y, entity.hp)
+        return LevelDelta(np.packbits(self.explored.array), removed, killed, actors)
+
+    def apply_delta(self, delta):
+        """
+        Replay the changes logged by record_delta on a freshly generated level.
+
+        Args:
+            delta (LevelDelta): Changes to be applied.
+        """
+        explored = np.unpackbits(delta.explored)[:self.width * self.height]
+        self.explored[:] = explored.reshape(self.width, self.height).astype(bool)
+        for i in delta.removed:
+            entity = self.spawned[i]
+            self.remove_entity(entity)
+            if entity.blocks:
+                self.walkable[entity.pos] = True
+            entity.game_map = None
+        # Actors may have swapped tiles, so lift all of them from the map before putting them back
+        changes = [(i, x, y, 0) for i, (x, y) in delta.killed.items()]
+        changes += [(i, x, y, hp) for i, (x, y, hp) in delta.actors.items()]
+        for i, _, _, _ in changes:
+            actor = self.spawned[i]
+            self.remove_entity(actor)
+            self.walkable[actor.pos] = True
+        for i, x, y, hp in changes:
+            actor = self.spawned[i]
+            actor.pos = Vector(x, y)
+            self.add_entity(actor)
+            self.walkable[actor.pos] = False
+            actor.hp = hp
+
+    @profiled('compute_fov')
+    def compute_fov(self, pos, radius, light_walls):
         """
         Compute a FOV field from the passed-in position.
 
         The FOV field represents how many tiles ahead can a certain actor see,
         this can affect behavior such as following, attacking, etc.
 
+        FOV fields are cached until the transparent map changes, so coming
+        back to an already visited position is cheap. Tiles in the FOV are
+        marked as explored, whether or not the level is ever rendered.
+
         Args:
             pos (Vector): The position vector from which the FOV should be
                 calculated, usually this position is occuppied by an Actor.
-            fov (str): Type of FOV algorithm to be used, usually supplied by
-                tdl itself.
             radius (int): How far away should the actor be able to see.
             light_walls (bool): Whether or not walls within the FOV of the
                 actor should be lit up or not.
         """
-        self._map.compute_fov(pos.x, pos.y, fov=fov, radius=radius, light_walls=light_walls)
+        self.fov[:] = self.fov_cache.get(self.transparent, pos, radius, light_walls)
+        # Tiles in FOV will be remembered after they get out of sight, out of mind :^)
+        self.explored[self.fov.array] = True
+
+    def compute_fovs(self, positions, radius, light_walls):
+        """
+        Compute the FOV fields of several positions at once, without modifying the level's FOV.
+
+        Args:
+            positions (list(Vector)): The positions from which the FOV should be calculated.
+            radius (int): How far away should the actors be able to see.
+            light_walls (bool): Whether or not walls within the FOV of the
+                actors should be lit up or not.
+
+        Returns:
+            numpy.ndarray: A (len(positions), width, height) boolean array with one FOV field per position.
+        """
+        origins = [(pos.x, pos.y) for pos in positions]
+        return fov.compute_fov_batch(self.transparent.array, origins, radius, light_walls)
+
+    def tiles_visible(self, tiles):
+        """
+        Check which of the given tiles are in the current FOV, in a single vectorized lookup.
+
+        Args:
+            tiles: The tiles to check, as a (N, 2) array of coordinates, a list of Vectors or a Room, see
+                as_coordinates.
+
+        Returns:
+            numpy.ndarray: A boolean array with one element per tile.
+        """
+        return query_tiles(self.fov.array, tiles)
+
+    def tiles_walkable(self, tiles):
+        """
+        Check which of the given tiles are walkable, in a single vectorized lookup.
+
+        Args:
+            tiles: The tiles to check, as a (N, 2) array of coordinates, a list of Vectors or a Room, see
+                as_coordinates.
+
+        Returns:
+            numpy.ndarray: A boolean array with one element per tile.
+        """
+        return query_tiles(self.walkable.array, tiles)
+
+    def can_see(self, pos1, pos2):
+        """
+        Check whether there's a line of sight between two positions, regardless of the distance between them.
+
+        Lines are looked up in a cache, so repeated checks between entities are cheap.
+
+        Args:
+            pos1 (Vector): Position of the viewer.
+            pos2 (Vector): Position of the tile to look at.
+
+        Returns:
+            bool: True if every tile between the two positions is transparent.
+        """
+        return fov.line_of_sight(self.transparent.array, pos1, pos2)
+
+    def can_see_many(self, origins, targets):
+        """
+        Check the line of sight between many pairs of positions in a single pass.
 
+        Args:
+            origins: Positions of the viewers, in any of the forms accepted by as_coordinates.
+            targets: Positions of the tiles to look at, as many as origins.
+
+        Returns:
+            numpy.ndarray: A boolean array telling whether each target can be seen from its origin.
+        """
+        return fov.line_of_sight_batch(self.transparent.array, as_coordinates(origins), as_coordinates(targets))
+
+    @property
+    def terrain_version(self):
+        """
+        Version of the layout of the level, which changes when tiles are carved or restored but not when entities
+        move. Every write to the layout touches both the walkable and the transparent maps, so the version of the
+        latter is used, since it's not affected by entities.
+        """
+        return self.transparent.version
+
+    def terrain_walkable(self):
+        """
+        Get the walkable tiles of the level ignoring blocking entities, which move around too often to be taken into
+        account by long-lived computations.
+
+        Returns:
+            numpy.ndarray: A boolean [x, y] array of the tiles that would be walkable if there were no entities.
+        """
+        walkable = self.walkable.array.copy()
+        blocking = self.store.blocking()
+        walkable[self.store.x[blocking], self.store.y[blocking]] = True
+        return walkable
+
+    def flow_field(self, target):
+        """
+        Get a flow field towards the target tile, that entities chasing it can follow.
+
+        Blocking entities are ignored by the field, so that it stays valid while they move. The field is computed once
+        and reused by every caller until the target moves, the FOV changes or the layout of the level changes, which in
+        practice means once per turn for all the monsters chasing the player. It only reaches FLOW_FIELD_MAX_DISTANCE
+        moves away from the target, and tells which tiles have a path to the target that stays in the FOV, see
+        FlowField.in_view.
+
+        Args:
+            target (Vector): Tile the field flows to.
+
+        Returns:
+            FlowField: The flow field towards the target.
+        """
+        key = (target.x, target.y, self.terrain_version, self.fov.version)
+        if key != self._flow_field_key:
+            self._flow_field = FlowField(self.terrain_walkable(), target, FLOW_FIELD_MAX_DISTANCE, self.fov.array)
+            self._flow_field_key = key
+        return self._flow_field
+
+    def room_graph(self):
+        """
+        Get the graph of the rooms and their entrances, used to plan long paths at room level.
+
+        The graph is built the first time it's needed and rebuilt only when the layout of the level changes.
+
+        Returns:
+            RoomGraph: The room graph of the level.
+        """
+        if self._room_graph_version != self.terrain_version:
+            self._room_graph = RoomGraph(self.terrain_walkable(), self.rooms)
+            self._room_graph_version = self.terrain_version
+        return self._room_graph
+
+    @profiled('compute_path')
     def compute_path(self, pos1, pos2):
         """
         Calculate a path between pos1 and pos2 in the game map.
 
+        Paths are cached, and reused or repaired while the tiles along them stay walkable. Walkability changes are
+        tracked through the version of the walkable tilemap, which is bumped whenever entities move, are placed or
+        die, see PathCache.
+
         Args:
             pos1 (Vector): Vector representing the starting point.
             pos2 (Vector): Vector representing the destination.
@@ -253,19 +644,31 @@ class Level:
             list(Vector): A list of vectors, where each vector represents the position of the next tile in the path.
                 The list goes up to the pos2.
         """
-        # Get current walkable state
-        pos1_walkable = self.walkable[pos1]
-        pos2_walkable = self.walkable[pos2]
-        # Set origin and destination to walkable for the actual computation to work
-        self.walkable[pos1] = self.walkable[pos2] = True
-        # Compute path
-        path = self._map.compute_path(pos1.x, pos1.y, pos2.x, pos2.y)
-        # Convert path to vectors
-        path = [Vector(x, y) for x, y in [tile for tile in path]]
-        # Revert origin and destination walkable state to its original state
-        self.walkable[pos1] = pos1_walkable
-        self.walkable[pos2] = pos2_walkable
-        return path
+        return self.path_cache.get(self.walkable, pos1, pos2)
+
+    def _search_path(self, pos1, pos2):
+        """
+        Search for a path between pos1 and pos2 in the game map, bypassing the path cache. Long paths are planned
+        through the room graph first.
+        """
+        return self.room_graph().find_path(self.walkable.array, pos1, pos2, version=self.walkable.version)
+
+    def find_paths(self, pairs, cost=None, blocked=None):
+        """
+        Search for the paths between many pairs of positions at once.
+
+        Unlike compute_path, this doesn't use the path cache and doesn't touch the level at all: the searches run on
+        a snapshot of the walkable map, so they can run in another thread while the game goes on.
+
+        Args:
+            pairs (list(tuple)): (start, goal) Vectors of every path to search.
+            cost (numpy.ndarray): Optional [x, y] map with the cost of entering each tile, see pathfinding.find_path.
+            blocked (numpy.ndarray): Optional boolean [x, y] map of tiles that can't be entered.
+
+        Returns:
+            list(list(Vector)): The path of every pair, in the same order as the pairs.
+        """
+        return find_paths(self.walkable.array.copy(), pairs, cost, blocked)
 
     def _place_entities(self, room, registry):
         """
@@ -277,10 +680,10 @@ class Level:
         """
         from registry import Actors, Items
 
-        entity_number = randint(0, self.max_entities_per_room)
+        entity_number = self.random.randint(0, self.max_entities_per_room)
 
         for _ in range(entity_number):
-            dice = randint(0, 2)
+            dice = self.random.randint(0, 2)
             if dice == 0:
                 ent = registry.get_actor(Actors.ORC)
             elif dice == 1:
@@ -289,6 +692,95 @@ class Level:
                 ent = registry.get_item(Items.CANDY)
 
             self.place_entity_randomly(ent, room)
+            self.spawned.append(ent)
+            self.spawn_positions.append(ent.pos)
+
+    def add_entity(self, entity):
+        """
+        Add an entity to the level at its current position.
+
+        Args:
+            entity (Entity): Entity to be added.
+        """
+        self.entities[entity] = None
+        self.index.add(entity)
+        self.store.add(entity)
+        if isinstance(entity, Actor):
+            self.scheduler.add(entity)
+
+    def remove_entity(self, entity):
+        """
+        Remove an entity from the level.
+
+        Args:
+            entity (Entity): Entity to be removed.
+        """
+        del self.entities[entity]
+        self.index.remove(entity)
+        self.store.remove(entity)
+        self.scheduler.remove(entity)
+        self.activity.forget(entity)
+
+    def run_turns(self, duration, target):
+        """
+        Let the awake actors whose turn comes within the given time take it.
+
+        Sleeping actors near the target or in the FOV are woken up first, and awake actors that are far away from the
+        target fall asleep when their turn comes, see ActivityZones.
+
+        Args:
+            duration (float): Time to advance the clock of the level, usually the time the player's action took.
+            target (Entity): The player, target of the behaviors of the actors.
+
+        Returns:
+            int: Amount of turns taken.
+        """
+        self.activity.update(target.pos, self.fov.array)
+        return self.scheduler.run(duration, target, self.activity.keep_awake)
+
+    def make_noise(self, pos, radius):
+        """
+        Make a noise that wakes up the sleeping actors within the radius.
+
+        Args:
+            pos (Vector): Source of the noise.
+            radius (int): How far away the noise can be heard.
+        """
+        self.activity.noise(pos, radius)
+
+    def actors_in_fov(self):
+        """
+        Get the living actors in the current FOV.
+
+        Returns:
+            list(Actor): The actors, in the order they were added to the level.
+        """
+        return self.store.select(self.store.living_actors() & self.store.on_tiles(self.fov.array))
+
+    def actors_in_radius(self, center, radius):
+        """
+        Get the living actors within a radius of a position, e.g. to damage everything caught in an explosion.
+
+        Args:
+            center (Vector): Center of the circle.
+            radius (float): Radius of the circle.
+
+        Returns:
+            list(Actor): The actors, in the order they were added to the level.
+        """
+        return self.store.select(self.store.living_actors() & self.store.within_radius(center, radius))
+
+    def entities_at(self, pos):
+        """
+        Get all the entities at the specified location.
+
+        Args:
+            pos (Vector): Vector of the position to check.
+
+        Returns:
+            list(Entity): The entities at the given position, might be empty.
+        """
+        return self.index.at(pos)
 
     def get_blocking_entity_at_location(self, pos):
         """
@@ -304,26 +796,67 @@ class Level:
         Returns:
             Entity: The blocking entity if any, None otherwise.
         """
-        for entity in self.entities:
-            if entity.pos == pos and entity.blocks:
-                return entity
-        return None
+        return self.index.blocking_at(pos)
+
+    def is_blocked(self, pos):
+        """
+        Check if a tile can't be entered, either because it's a wall or because a blocking entity is on it.
+
+        Args:
+            pos (Vector): Vector of the position to check.
+
+        Returns:
+            bool: True if the tile is blocked, False otherwise.
+        """
+        return not self.walkable[pos] or self.index.is_blocked(pos)
+
+    def free_cells(self, room):
+        """
+        Get the bag of free tiles of a room that spawned entities are drawn from.
+
+        The bag is built from the tiles that are unoccupied the first time it's requested, and tiles are only ever
+        taken out of it, since it's meant to be used while spawning entities.
+
+        Args:
+            room (Room): Room whose free tiles to get.
+
+        Returns:
+            FreeCells: The free tiles of the room.
+        """
+        cells = self._free_cells.get(room)
+        if cells is None:
+            free = [(x, y)
+                    for x in range(room.x1 + 1, room.x2)
+                    for y in range(room.y1 + 1, room.y2)
+                    if not self.index.is_occupied(Vector(x, y))]
+            cells = FreeCells(free, self.random)
+            self._free_cells[room] = cells
+        return cells
 
     def place_entity_randomly(self, entity, room, allow_overlap=False):
         """
         Places the given entity randomly in a given room.
-        """
-        # For now, naively assume that there's a free spot
-        while True:
-            # Get a random position inside the room
-            x = randint(room.x1 + 1, room.x2 - 1)
-            y = randint(room.y1 + 1, room.y2 - 1)
-            position = Vector(x, y)
 
-            # Check if there's already an entity in this spot
-            if not allow_overlap and [entity for entity in self.entities if entity.pos == position]:
-                continue
+        Args:
+            entity (Entity): Entity to be placed.
+            room (Room): Room in which to place the entity.
+            allow_overlap (bool): Whether the entity can share its tile with other entities.
 
-            # We found a valid spot, place the entity
+        Raises:
+            LevelException: If overlapping is not allowed and there are no free tiles left in the room.
+        """
+        if allow_overlap:
+            # Any tile inside the room will do
+            position = Vector(self.random.randint(room.x1 + 1, room.x2 - 1),
+                              self.random.randint(room.y1 + 1, room.y2 - 1))
             entity.place(self, position)
             return
+
+        cells = self.free_cells(room)
+        while cells:
+            position = cells.pop()
+            # Something could have been placed on the tile without going through the bag, skip it then
+            if not self.index.is_occupied(position):
+                entity.place(self, position)
+                return
+        raise LevelException(f"There's no free space left to place '{entity.name}'.")
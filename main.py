@@ -1,58 +1,83 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import argparse
+import time
+
 import tdl
 
-from action_manager import ActionManager
 from display_manager import DisplayManager
-from dungeon import Dungeon
-from entities import Actor
+from game import new_game, play_turn
 from misc import Colors, message
-from registry import Registry, Actors
-
+from profiler import Profiler
+from replay import Recorder
 
-def main():
-    # First of all, load the registry
-    registry = Registry()
 
-    # Initialize player, display_manager
-    player = Actor(Actors.HERO, "Player", '@', Colors.WHITE, behavior=None, registry=registry)
-    # XXX: Give player level boost for testing purposes
-    player.level = 10
+def main(seed=None, record=None, profile=None):
+    """
+    Run the game.
 
-    # Initialize Dungeon
-    dungeon = Dungeon()
-    dungeon.initialize(player, registry)
+    Args:
+        seed (int): Seed of the dungeon, a random one is used if not given.
+        record (str): Path of a file to record the session to, see replay.
+        profile (str): Path of a file to write the timings of the game loop to on exit and when F12 is pressed, see
+            profiler. Nothing is timed if not given.
+    """
+    profiler = Profiler()
+    if profile:
+        profiler.enable(profile)
+    # Initialize the registry, the player, the dungeon and the action manager
+    player, dungeon, action_manager = new_game(seed)
 
     # Initialize Display Manager
     display_manager = DisplayManager(player, dungeon)
     message("Hello world!", Colors.RED)
 
-    # Initialize Action Manager
-    action_manager = ActionManager(player, dungeon)
-
-    # Game loop
-    while not tdl.event.is_window_closed():
-        display_manager.refresh()
-        # TODO: Add player and enemy turn states and cycle between both
-        # Player turn
-        # TODO: Use game states to handle turns
-
-        action_manager.get_user_input()
-        if action_manager.handle_key_input() is False:
-            continue
+    recorder = Recorder(dungeon.seed) if record else None
+    # Input is polled, so most frames are idle: only the frames that draw a new turn and that read a key are timed,
+    # otherwise the idle ones would crowd the turns out of the profiler
+    took_turn = True
+    try:
+        # Game loop
+        while not tdl.event.is_window_closed():
+            start = time.perf_counter()
+            display_manager.refresh()
+            if took_turn and profiler.enabled:
+                profiler.record('render', time.perf_counter() - start)
+            # TODO: Add player and enemy turn states and cycle between both
+            # Player turn
+            # TODO: Use game states to handle turns
 
-        # Enemy turn
-        for entity in dungeon.current_level.entities:
-            entity.take_turn(player)
+            start = time.perf_counter()
+            action_manager.get_user_input()
+            key = action_manager.user_input
+            if key is not None and profiler.enabled:
+                profiler.record('input', time.perf_counter() - start)
+            # Enemy turn: the awake actors whose turn comes before the player's next one take it, and the other levels
+            # in memory are advanced now and then, at low resolution
+            took_turn = play_turn(player, dungeon, action_manager, key)
+            if not took_turn:
+                continue
+            if recorder is not None:
+                recorder.record(key)
 
-        # Check for player death
-        # TODO: Handle player death as a game state
-        if player.dead:
-            # TODO: Show death screen
-            print("You died!")
-            return 0
+            # Check for player death
+            # TODO: Handle player death as a game state
+            if player.dead:
+                # TODO: Show death screen
+                print("You died!")
+                return 0
+    finally:
+        if recorder is not None:
+            recorder.save(record)
+        if profile:
+            profiler.dump()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Tonzo Studios Roguelike")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the dungeon.")
+    parser.add_argument('--record', default=None, help="Path of a file to record the session to, see replay.py.")
+    parser.add_argument('--profile', default=None, help="Path of a file to write the timings of the game loop to.")
+    args = parser.parse_args()
+    main(args.seed, args.record, args.profile)
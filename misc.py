@@ -5,6 +5,7 @@ import os
 
 from enum import Enum
 from math import sqrt, atan2, pi
+from operator import itemgetter
 
 
 # Classes
@@ -28,69 +29,101 @@ class Singleton(type):
         return cls._instances[cls]
 
 
-class Vector:
+class Vector(tuple):
     """
     Represents a vector in a 2D Euclidean space.
 
     Can be used to represent position, distance, direction, etc.
     Overrides the addition and subtraction operators to perform element-wise operations.
 
+    Vectors are immutable (x, y) tuples without a per-instance __dict__, so they are compact and hashable and can be
+    used as dict keys and set members. They compare and hash like the plain (x, y) tuple, so they can also look up
+    dicts keyed by tuples.
+
     Args:
         x (int): x coordinate of this Vector object.
         y (int): y coordinate of this Vector object.
     """
 
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
+    __slots__ = ()
+
+    def __new__(cls, x, y):
+        return tuple.__new__(cls, (x, y))
+
+    def __getnewargs__(self):
+        """Allow vectors to be copied and pickled."""
+        return tuple(self)
+
+    x = property(itemgetter(0), doc="x coordinate of the vector.")
+    y = property(itemgetter(1), doc="y coordinate of the vector.")
 
     def __add__(self, other):
         """Perform element-wise addition."""
-        return Vector(self.x + other.x, self.y + other.y)
+        return Vector(self[0] + other[0], self[1] + other[1])
 
     def __sub__(self, other):
         """Perform element-wise subtraction."""
-        return Vector(self.x - other.x, self.y - other.y)
+        return Vector(self[0] - other[0], self[1] - other[1])
+
+    def __mul__(self, other):
+        # Don't inherit the repetition of tuples
+        return NotImplemented
+
+    __rmul__ = __mul__
 
     def __repr__(self):
         """Represent the vector as a tuple."""
-        return f"({self.x}, {self.y})"
-
-    def __eq__(self, other):
-        """Two vectors are equal if they have the same components."""
-        return self.x == other.x and self.y == other.y
+        return f"({self[0]}, {self[1]})"
 
     @property
     def norm(self):
         """Return the norm of the vector."""
-        return sqrt(self.x ** 2 + self.y ** 2)
+        return sqrt(self[0] ** 2 + self[1] ** 2)
 
     def normalized(self):
         """Return a unitary vector with the same direction."""
         norm = self.norm
-        return Vector(self.x / norm, self.y / norm)
+        return Vector(self[0] / norm, self[1] / norm)
 
     def snap_to_grid(self):
         """
         Returns a unitary vector after snapping the vector's direction to the closest tile in the grid using the
         8 possible directions: N, W, S, E, NW, SW, NE, SE.
+
+        The returned vector is one of the shared constants in Directions, so no new vector is created.
         """
-        angle = atan2(self.y, self.x)
-        # Map octant index to unit vector, starting from E (0) and going counter-clockwise
-        octant_to_direction = {
-            0: Vector(1, 0),  # E
-            1: Vector(1, 1),  # NE
-            2: Vector(0, 1),  # N
-            3: Vector(-1, 1),  # NW
-            4: Vector(-1, 0),  # W
-            5: Vector(-1, -1),  # SW
-            6: Vector(0, -1),  # S
-            7: Vector(1, -1)  # SE
-        }
+        angle = atan2(self[1], self[0])
         # Find out which octant we're in
         octant = round(8 * angle / (2 * pi) + 8) % 8
-        # Get direction using the octant to direction map
-        return octant_to_direction[octant]
+        return Directions.BY_OCTANT[octant]
+
+
+class Directions:
+    """
+    This class is an interface to the 8 unit directions in the grid, as shared Vectors.
+
+    Directions are named as seen on screen, where y grows downwards, so UP is (0, -1).
+
+    Note:
+        Use these constants instead of creating new unit vectors, they are built only once.
+    """
+
+    def __init__(self):
+        raise NotImplementedError("Directions is a static class, it cannot be instantiated")
+
+    UP = Vector(0, -1)
+    DOWN = Vector(0, 1)
+    LEFT = Vector(-1, 0)
+    RIGHT = Vector(1, 0)
+    UP_LEFT = Vector(-1, -1)
+    UP_RIGHT = Vector(1, -1)
+    DOWN_LEFT = Vector(-1, 1)
+    DOWN_RIGHT = Vector(1, 1)
+
+    # Every direction, straight ones first
+    ALL = (RIGHT, LEFT, DOWN, UP, DOWN_RIGHT, DOWN_LEFT, UP_RIGHT, UP_LEFT)
+    # Indexed by the octant of the angle of a vector, starting from +x and going towards +y
+    BY_OCTANT = (RIGHT, DOWN_RIGHT, DOWN, DOWN_LEFT, LEFT, UP_LEFT, UP, UP_RIGHT)
 
 
 class Colors:
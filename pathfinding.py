@@ -0,0 +1,699 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Pathfinding over walkability maps.
+
+Entities move one tile per turn in any of the 8 directions, so flow fields measure distances in moves: diagonal moves
+cost the same as straight ones. Single paths are searched with A*, where diagonal moves are slightly more expensive so
+that straight paths are preferred.
+
+All the maps are numpy arrays indexed as [x, y]. None of the functions modify the maps they are given, so they can be
+called from several threads at once. RoomGraph and PathCache are not thread-safe though: they keep state between
+queries, so each of them must only be used from one thread at a time.
+"""
+
+import heapq
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from misc import Directions, Vector
+
+# Distance of the tiles that can't be reached
+UNREACHABLE = np.iinfo(np.int32).max
+
+# Paths between tiles closer than this are searched tile by tile, without planning them at room level first
+ROOM_GRAPH_MIN_DISTANCE = 20
+
+# The 8 directions an entity can move in, straight ones first so that they are preferred on ties
+DIRECTIONS = Directions.ALL
+
+
+def _window(shape, sources, max_distance):
+    """
+    Get the slices of the part of a map within max_distance moves of the sources, the whole map if max_distance is
+    None.
+    """
+    width, height = shape
+    if max_distance is None or not sources:
+        return slice(0, width), slice(0, height)
+    xs = [pos.x for pos in sources]
+    ys = [pos.y for pos in sources]
+    return (slice(max(min(xs) - max_distance, 0), min(max(xs) + max_distance + 1, width)),
+            slice(max(min(ys) - max_distance, 0), min(max(ys) + max_distance + 1, height)))
+
+
+def distance_map(walkable, sources, max_distance=None):
+    """
+    Compute the distance in moves from the closest source to every tile, with a breadth-first flood fill.
+
+    The whole frontier of the flood is expanded at once with array operations, so the cost is one pass over the map
+    per unit of distance. When max_distance is given, the passes only cover the tiles within that many moves of the
+    sources.
+
+    Args:
+        walkable (numpy.ndarray): Boolean [x, y] map of the tiles that can be walked on.
+        sources (list(Vector)): Tiles the distances are measured from. They don't need to be walkable.
+        max_distance (int): Stop the flood at this distance, tiles further away are left unreachable.
+
+    Returns:
+        numpy.ndarray: An int32 [x, y] array of distances, UNREACHABLE for the tiles that can't be reached.
+    """
+    window_x, window_y = _window(walkable.shape, sources, max_distance)
+    result = np.full(walkable.shape, UNREACHABLE, dtype=np.int32)
+    walkable = walkable[window_x, window_y]
+    width, height = walkable.shape
+    # Pad with an unwalkable border so that shifted views never leave the map
+    open_tiles = np.zeros((width + 2, height + 2), dtype=bool)
+    open_tiles[1:-1, 1:-1] = walkable
+    distances = np.full((width + 2, height + 2), UNREACHABLE, dtype=np.int32)
+    frontier = np.zeros_like(open_tiles)
+    for pos in sources:
+        frontier[pos.x - window_x.start + 1, pos.y - window_y.start + 1] = True
+    distances[frontier] = 0
+    unvisited = open_tiles & ~frontier
+
+    distance = 0
+    while frontier.any() and (max_distance is None or distance < max_distance):
+        distance += 1
+        reached = np.zeros_like(frontier)
+        for direction in DIRECTIONS:
+            # Shift the frontier one step in the direction
+            reached[1:-1, 1:-1] |= frontier[1 - direction.x:width + 1 - direction.x,
+                                            1 - direction.y:height + 1 - direction.y]
+        frontier = reached & unvisited
+        distances[frontier] = distance
+        unvisited &= ~frontier
+    result[window_x, window_y] = distances[1:-1, 1:-1]
+    return result
+
+
+def _octile(dx, dy, diagonal_cost):
+    dx, dy = abs(dx), abs(dy)
+    return abs(dx - dy) + diagonal_cost * min(dx, dy)
+
+
+def find_path(walkable, start, goal, cost=None, blocked=None, diagonal_cost=1.41):
+    """
+    Search for the shortest path between two tiles with A*.
+
+    The start and goal tiles are always considered walkable, so paths can be searched from and to tiles occupied by
+    entities without modifying the map.
+
+    Args:
+        walkable (numpy.ndarray): Boolean [x, y] map of the tiles that can be walked on.
+        start (Vector): Starting point.
+        goal (Vector): Destination.
+        cost (numpy.ndarray): Optional [x, y] map with the cost of entering each tile. Tiles with a cost of 0 or less
+            can't be entered.
+        blocked (numpy.ndarray): Optional boolean [x, y] map of tiles that can't be entered on top of the unwalkable
+            ones, e.g. the tiles occupied by entities.
+        diagonal_cost (float): Cost of a diagonal move relative to a straight one.
+
+    Returns:
+        list(Vector): The tiles of the path, start excluded and goal included. Empty if there's no path.
+    """
+    return _search(*_prepare(walkable, cost, blocked), start, goal, diagonal_cost)
+
+
+def _prepare(walkable, cost=None, blocked=None):
+    """Turn the maps given to find_path into nested lists, which are much faster to index from Python."""
+    passable = walkable if blocked is None else walkable & ~blocked
+    min_cost = 1
+    if cost is not None:
+        passable = passable & (cost > 0)
+        if passable.any():
+            min_cost = float(cost[passable].min())
+        cost = cost.tolist()
+    return passable.tolist(), cost, min_cost
+
+
+def _search(passable, cost, min_cost, start, goal, diagonal_cost=1.41):
+    """A* search over the maps returned by _prepare, see find_path."""
+    width, height = len(passable), len(passable[0])
+    goal_tile = (goal.x, goal.y)
+    start_tile = (start.x, start.y)
+    if start_tile == goal_tile:
+        return []
+
+    costs = {start_tile: 0}
+    came_from = {}
+    heap = [(_octile(goal.x - start.x, goal.y - start.y, diagonal_cost) * min_cost, 0, start_tile)]
+    while heap:
+        _, current_cost, tile = heapq.heappop(heap)
+        if tile == goal_tile:
+            path = []
+            while tile != start_tile:
+                path.append(Vector(*tile))
+                tile = came_from[tile]
+            path.reverse()
+            return path
+        if current_cost > costs[tile]:
+            # Outdated entry
+            continue
+        x, y = tile
+        for direction in DIRECTIONS:
+            nx, ny = x + direction.x, y + direction.y
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+            neighbour = (nx, ny)
+            if not passable[nx][ny] and neighbour != goal_tile:
+                continue
+            step = diagonal_cost if direction.x and direction.y else 1
+            if cost is not None:
+                step *= max(cost[nx][ny], min_cost)
+            new_cost = current_cost + step
+            if new_cost < costs.get(neighbour, float('inf')):
+                costs[neighbour] = new_cost
+                came_from[neighbour] = tile
+                estimate = new_cost + _octile(goal.x - nx, goal.y - ny, diagonal_cost) * min_cost
+                heapq.heappush(heap, (estimate, new_cost, neighbour))
+    return []
+
+
+def find_paths(walkable, pairs, cost=None, blocked=None, diagonal_cost=1.41):
+    """
+    Search for the paths between many pairs of tiles.
+
+    The maps are prepared for the search once for the whole batch, rather than once per pair as find_path would. The
+    searches are not run in threads, since A* is pure Python and holds the GIL.
+
+    Args:
+        walkable (numpy.ndarray): Boolean [x, y] map of the tiles that can be walked on.
+        pairs (list(tuple)): (start, goal) Vectors of every path to search.
+        cost (numpy.ndarray): Optional cost map, see find_path.
+        blocked (numpy.ndarray): Optional blocked map, see find_path.
+        diagonal_cost (float): Cost of a diagonal move relative to a straight one.
+
+    Returns:
+        list(list(Vector)): The path of every pair, in the same order as the pairs.
+    """
+    prepared = _prepare(walkable, cost, blocked)
+    return [_search(*prepared, start, goal, diagonal_cost) for start, goal in pairs]
+
+
+def _chebyshev(a, b):
+    return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+
+
+def _flood(start, allowed, stop=()):
+    """
+    Breadth-first flood from a tile, returning the distance in moves to every tile reached.
+
+    Args:
+        start (tuple): (x, y) tile to start from. It doesn't need to be allowed.
+        allowed (callable): Function that takes x and y and returns whether the flood can enter the tile.
+        stop (container): Tiles that are reached but not expanded.
+
+    Returns:
+        dict: (x, y) -> distance from the start.
+    """
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        tile = queue.popleft()
+        if tile in stop and tile != start:
+            continue
+        x, y = tile
+        distance = distances[tile] + 1
+        for direction in DIRECTIONS:
+            neighbour = (x + direction.x, y + direction.y)
+            if neighbour not in distances and allowed(*neighbour):
+                distances[neighbour] = distance
+                queue.append(neighbour)
+    return distances
+
+
+class RoomGraph:
+    """
+    An abstract graph of the rooms of a level and the entrances between them, used to plan long paths at room level
+    before searching them tile by tile.
+
+    The nodes of the graph are the entrances of the rooms, i.e. the runs of walkable tiles in their walls. Entrances of
+    the same room are joined by their distance across the room, which is precomputed, and entrances joined by a
+    corridor by their distance along it. Long paths are planned over this small graph and then refined with A* between
+    consecutive entrances, so the tile by tile searches stay local no matter how big the level is. Paths planned this
+    way are not always the shortest, but are close to it.
+
+    The graph only depends on the layout of the level, so it has to be rebuilt when the layout changes. The map given
+    to find_path is kept between queries, so the graph can't be searched from several threads at once.
+
+    Args:
+        walkable (numpy.ndarray): Boolean [x, y] map of the walkable tiles, ignoring entities.
+        rooms (list(Room)): Rooms of the level.
+    """
+
+    def __init__(self, walkable, rooms):
+        self.width, self.height = walkable.shape
+        # Index of the room whose interior covers each tile, -1 outside of the rooms
+        room_of = np.full(walkable.shape, -1, dtype=np.int32)
+        for i, room in enumerate(rooms):
+            room_of[room.inner] = i
+        self._room_of = room_of.tolist()
+        self._walkable = walkable.tolist()
+        # The map given to find_path, as nested lists for _search, its version and a copy of it to tell what changed
+        self._passable = None
+        self._passable_version = None
+        self._passable_array = None
+
+        # Group the walkable tiles in the walls of every room into entrances
+        self.entrances = []
+        self._room_entrances = [[] for _ in rooms]
+        self._entrance_of = {}
+        for i, room in enumerate(rooms):
+            doors = {(x, y) for x in range(room.x1, room.x2 + 1) for y in range(room.y1, room.y2 + 1)
+                     if (x in (room.x1, room.x2) or y in (room.y1, room.y2))
+                     and self._in_bounds(x, y) and self._walkable[x][y]}
+            while doors:
+                tiles = list(_flood(doors.pop(), lambda x, y: (x, y) in doors))
+                doors.difference_update(tiles)
+                center = (sum(x for x, _ in tiles) / len(tiles), sum(y for _, y in tiles) / len(tiles))
+                self._add_entrance(i, tiles, min(tiles, key=lambda tile: _chebyshev(tile, center)))
+
+        # entrance -> {entrance: distance}
+        self.edges = [{} for _ in self.entrances]
+        for room, entrances in enumerate(self._room_entrances):
+            for entrance in entrances:
+                flood = self._room_flood(room, self.entrances[entrance].tile)
+                self._join(entrance, self._room_distances(room, flood))
+        for entrance in range(len(self.entrances)):
+            tile = self.entrances[entrance].tile
+            self._join(entrance, self._corridor_distances(self._corridor_flood(tile, entrance), entrance))
+
+    def _in_bounds(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def _add_entrance(self, room, tiles, tile):
+        entrance = len(self.entrances)
+        self.entrances.append(_Entrance(room, tile))
+        self._room_entrances[room].append(entrance)
+        for door in tiles:
+            self._entrance_of[door] = entrance
+
+    def _join(self, entrance, distances):
+        edges = self.edges[entrance]
+        for other, distance in distances.items():
+            if other != entrance and distance < edges.get(other, UNREACHABLE):
+                edges[other] = distance
+                self.edges[other][entrance] = distance
+
+    def _room_flood(self, room, tile):
+        """Flood a room from a tile in it or in its walls, without leaving the room."""
+        def allowed(x, y):
+            return self._in_bounds(x, y) and (self._room_of[x][y] == room or
+                                              self._entrance_of.get((x, y), -1) in entrances)
+
+        entrances = self._room_entrances[room]
+        return _flood(tile, allowed)
+
+    def _room_distances(self, room, flood):
+        """Get the distance to every entrance of a room reached by a flood of the room, see _room_flood."""
+        return {entrance: flood[self.entrances[entrance].tile] for entrance in self._room_entrances[room]
+                if self.entrances[entrance].tile in flood}
+
+    def _corridor_flood(self, tile, own=None):
+        """Flood the corridors from a tile outside of the rooms, stopping at the entrances other than own."""
+        def allowed(x, y):
+            return self._in_bounds(x, y) and self._walkable[x][y] and self._room_of[x][y] == -1
+
+        stop = {door for door, entrance in self._entrance_of.items() if entrance != own}
+        return _flood(tile, allowed, stop)
+
+    def _corridor_distances(self, flood, own=None):
+        """
+        Get the distance to the entrances reached by a corridor flood.
+
+        Only the closest entrances in every direction are reached, since the flood stops at them.
+        """
+        distances = {}
+        for reached, distance in flood.items():
+            entrance = self._entrance_of.get(reached)
+            if entrance is None or entrance == own:
+                continue
+            # Account for the walk along the entrance to the tile that stands for it
+            distance += _chebyshev(reached, self.entrances[entrance].tile)
+            distances[entrance] = min(distance, distances.get(entrance, UNREACHABLE))
+        return distances
+
+    def _attach(self, pos):
+        """
+        Get the entrances a tile can reach without going through other entrances, and the distance to each of them.
+
+        Returns:
+            tuple: entrance -> distance dict, and the tiles that can be reached from the tile without going through an
+                entrance. (None, None) if the tile is neither in a room nor in a corridor.
+        """
+        x, y = pos.x, pos.y
+        if not self._in_bounds(x, y):
+            return None, None
+        room = self._room_of[x][y]
+        if room != -1:
+            flood = self._room_flood(room, (x, y))
+            return self._room_distances(room, flood), flood
+        if not self._walkable[x][y]:
+            return None, None
+        own = self._entrance_of.get((x, y))
+        flood = self._corridor_flood((x, y), own)
+        distances = self._corridor_distances(flood, own)
+        if own is not None:
+            distances[own] = _chebyshev((x, y), self.entrances[own].tile)
+        return distances, flood
+
+    def plan(self, start, goal):
+        """
+        Plan a path at room level.
+
+        Args:
+            start (Vector): Starting point.
+            goal (Vector): Destination.
+
+        Returns:
+            list(Vector): The tiles of the entrances the path goes through, in order, empty if goal can be reached
+                without going through any entrance. None if the path can't be planned at room level, either because
+                there's no path or because start or goal are not in a room or corridor.
+        """
+        start_edges, reached = self._attach(start)
+        if reached is not None and (goal.x, goal.y) in reached:
+            return []
+        goal_edges, _ = self._attach(goal)
+        if not start_edges or not goal_edges:
+            return None
+        # Dijkstra over the entrances, with the goal as an extra node
+        goal_node = len(self.entrances)
+        distances = {}
+        came_from = {}
+        heap = [(distance, entrance, -1) for entrance, distance in start_edges.items()]
+        heapq.heapify(heap)
+        while heap:
+            distance, node, previous = heapq.heappop(heap)
+            if node in distances:
+                continue
+            distances[node] = distance
+            came_from[node] = previous
+            if node == goal_node:
+                break
+            edges = list(self.edges[node].items())
+            if node in goal_edges:
+                edges.append((goal_node, goal_edges[node]))
+            for other, cost in edges:
+                if other not in distances:
+                    heapq.heappush(heap, (distance + cost, other, node))
+        if goal_node not in distances:
+            return None
+        waypoints = []
+        node = came_from[goal_node]
+        while node != -1:
+            waypoints.append(Vector(*self.entrances[node].tile))
+            node = came_from[node]
+        waypoints.reverse()
+        return waypoints
+
+    def _prepare(self, walkable, version):
+        """
+        Get the maps for _search from the map given to find_path.
+
+        Turning the whole map into nested lists costs as much as the map is big, so the lists are kept between calls.
+        They are reused as they are while the version of the map stays the same, and otherwise only the tiles that
+        changed since the previous call are updated.
+        """
+        if self._passable is None or self._passable_array.shape != walkable.shape:
+            self._passable = walkable.tolist()
+            self._passable_array = walkable.copy()
+        elif version is None or version != self._passable_version:
+            for x, y in np.argwhere(walkable != self._passable_array).tolist():
+                self._passable[x][y] = bool(walkable[x, y])
+            self._passable_array[:] = walkable
+        self._passable_version = version
+        return self._passable, None, 1
+
+    def find_path(self, walkable, start, goal, min_distance=ROOM_GRAPH_MIN_DISTANCE, version=None):
+        """
+        Search for a path, planning it at room level first if start and goal are far away from each other.
+
+        Args:
+            walkable (numpy.ndarray): Boolean [x, y] map of the tiles that can be walked on, entities included.
+            start (Vector): Starting point.
+            goal (Vector): Destination.
+            min_distance (int): Paths between tiles closer than this are searched directly with find_path.
+            version (int): Version of the walkable map, e.g. Tilemap.version. If it's the same as in the previous call,
+                the map is assumed not to have changed.
+
+        Returns:
+            list(Vector): The tiles of the path, start excluded and goal included. Empty if there's no path.
+        """
+        maps = self._prepare(walkable, version)
+        if max(abs(start.x - goal.x), abs(start.y - goal.y)) < min_distance:
+            return _search(*maps, start, goal)
+        waypoints = self.plan(start, goal)
+        # Entrances taken by entities can't be walked through, so fall back to a full search
+        if waypoints is None or not all(walkable[tile.x, tile.y] for tile in waypoints):
+            return _search(*maps, start, goal)
+        path = []
+        tile = start
+        for waypoint in waypoints + [goal]:
+            if waypoint == tile:
+                continue
+            segment = _search(*maps, tile, waypoint)
+            if not segment:
+                return _search(*maps, start, goal)
+            path += segment
+            tile = waypoint
+        return path
+
+
+class _Entrance:
+    """An entrance of a room: the room it belongs to and the tile that stands for it in the room graph."""
+
+    __slots__ = ('room', 'tile')
+
+    def __init__(self, room, tile):
+        self.room = room
+        self.tile = tile
+
+
+class FlowField:
+    """
+    A distance map towards a target, which any amount of entities can follow to reach it.
+
+    The step to take from every tile is picked once for the whole field, with array operations, so following the field
+    costs a lookup per step no matter how many entities follow it.
+
+    When the visible tiles are given, the field also tells from which tiles the target can be reached along a shortest
+    path that never leaves them, see in_view, and the steps prefer to stay on such paths.
+
+    Args:
+        walkable (numpy.ndarray): Boolean [x, y] map of the tiles that can be walked on.
+        target (Vector): Tile the field flows to.
+        max_distance (int): Tiles further away than this from the target can't follow the field.
+        visible (numpy.ndarray): Optional boolean [x, y] map of the visible tiles.
+    """
+
+    def __init__(self, walkable, target, max_distance=None, visible=None):
+        self.target = target
+        self.distances = distance_map(walkable, [target], max_distance)
+        if visible is None:
+            self._in_view = None
+        else:
+            # A shortest path stays in view if the target is as close when only the visible tiles can be walked on
+            view_distances = distance_map(walkable & visible, [target], max_distance)
+            self._in_view = (view_distances == self.distances) & (self.distances != UNREACHABLE)
+        self._steps = self._pick_steps(_window(walkable.shape, [target], max_distance))
+
+    def _pick_steps(self, window):
+        """
+        Pick the best step of every tile of the window, see next_step.
+
+        Returns:
+            numpy.ndarray: An int8 [x, y] array with the index in DIRECTIONS of the step to take from every tile, -1 for
+                the tiles with no neighbour closer to the target.
+        """
+        window_x, window_y = window
+        width, height = self.distances.shape
+        steps = np.full((width, height), -1, dtype=np.int8)
+        xs = np.arange(window_x.start, window_x.stop)[:, np.newaxis]
+        ys = np.arange(window_y.start, window_y.stop)[np.newaxis, :]
+        current = self.distances[window_x, window_y].astype(np.float64)
+        padded = np.full((width + 2, height + 2), UNREACHABLE, dtype=np.float64)
+        padded[1:-1, 1:-1] = self.distances
+        # Steps are picked by their distance to the target, then by whether they leave the view, then by their
+        # straight-line distance to the target
+        hidden = np.zeros((width + 2, height + 2), dtype=bool)
+        if self._in_view is not None:
+            hidden[1:-1, 1:-1] = ~self._in_view
+        # Straight-line distances are below this, so that they only break the ties of the other keys
+        norm_scale = 2 * np.hypot(width + 2, height + 2)
+        best = np.full(current.shape, np.inf)
+        for i, direction in enumerate(DIRECTIONS):
+            neighbours = (slice(window_x.start + 1 + direction.x, window_x.stop + 1 + direction.x),
+                          slice(window_y.start + 1 + direction.y, window_y.stop + 1 + direction.y))
+            distance = padded[neighbours]
+            key = (2 * distance + hidden[neighbours] +
+                   np.hypot(self.target.x - xs - direction.x, self.target.y - ys - direction.y) / norm_scale)
+            # Ties go to the first direction, like in next_step
+            better = (distance < current) & (distance != UNREACHABLE) & (key < best)
+            best[better] = key[better]
+            steps[window_x, window_y][better] = i
+        return steps
+
+    def _inside(self, pos):
+        return 0 <= pos.x < self.distances.shape[0] and 0 <= pos.y < self.distances.shape[1]
+
+    def distance(self, pos):
+        """Return the distance in moves from the given tile to the target, UNREACHABLE if there's no way."""
+        if not self._inside(pos):
+            return UNREACHABLE
+        return int(self.distances[pos.x, pos.y])
+
+    def reaches(self, pos):
+        """Return whether the target can be reached from the given tile, which is not the target itself."""
+        return self._inside(pos) and self._steps[pos.x, pos.y] >= 0
+
+    def in_view(self, pos):
+        """
+        Return whether the target can be reached from the given tile along a shortest path that stays on the visible
+        tiles. Every reachable tile is in view if no visible tiles were given to the field.
+        """
+        if self._in_view is None:
+            return self.reaches(pos)
+        return self._inside(pos) and bool(self._in_view[pos.x, pos.y])
+
+    def next_step(self, pos, blocked=None):
+        """
+        Get the tile to move to from the given position to get closer to the target.
+
+        Among the neighbours closer to the target, the closest one is picked. Ties are broken in favour of the
+        neighbours that are in view, see in_view, and then by the straight-line distance to the target.
+
+        Args:
+            pos (Vector): Current position.
+            blocked (callable): Optional function that takes a position and returns whether it's temporarily blocked,
+                e.g. by another entity. Blocked tiles are skipped.
+
+        Returns:
+            Vector: The next tile, or None if there's no neighbour closer to the target.
+        """
+        if not self.reaches(pos):
+            return None
+        tile = pos + DIRECTIONS[self._steps[pos.x, pos.y]]
+        if blocked is None or tile == self.target or not blocked(tile):
+            return tile
+        # The best step is taken, look for the next best one
+        current = self.distance(pos)
+        best = None
+        best_key = None
+        for direction in DIRECTIONS:
+            tile = pos + direction
+            distance = self.distance(tile)
+            if distance >= current or distance == UNREACHABLE:
+                continue
+            if tile != self.target and blocked(tile):
+                continue
+            key = (distance, self._in_view is not None and not self._in_view[tile.x, tile.y],
+                   (self.target - tile).norm)
+            if best_key is None or key < best_key:
+                best, best_key = tile, key
+        return best
+
+    def path_from(self, pos):
+        """
+        Follow the field from the given position to the target.
+
+        Args:
+            pos (Vector): Starting position.
+
+        Returns:
+            list(Vector): The tiles of the path, starting position excluded and target included. Empty if the target
+                can't be reached.
+        """
+        path = []
+        tile = self.next_step(pos)
+        while tile is not None:
+            path.append(tile)
+            if tile == self.target:
+                break
+            tile = self.next_step(tile)
+        return path
+
+
+class PathCache:
+    """
+    A LRU cache of paths keyed by their start and goal.
+
+    Every path is stored along with the version of the walkable tilemap it was computed on. When the version changed,
+    the path is checked against the current map instead of being thrown away: if every tile on it is still walkable
+    it's reused as is, and if it's blocked somewhere, only the part after the last walkable tile before the obstacle
+    is searched again. After a path is handed out, the path starting at its first tile is cached too, so an entity that
+    takes a step along it finds its next path in the cache.
+
+    Args:
+        search (callable): Function that takes a start and a goal and returns the path between them as a list of
+            Vectors, start excluded and goal included, or an empty list if there's no path.
+        maxsize (int): Max amount of paths to keep.
+    """
+
+    def __init__(self, search, maxsize=256):
+        self.search = search
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.repairs = 0
+        self._paths = OrderedDict()
+
+    def __len__(self):
+        return len(self._paths)
+
+    def _store(self, start, goal, path, version):
+        key = (start.x, start.y, goal.x, goal.y)
+        self._paths[key] = (path, version)
+        self._paths.move_to_end(key)
+        if len(self._paths) > self.maxsize:
+            self._paths.popitem(last=False)
+
+    @staticmethod
+    def _first_blocked(walkable, path):
+        """Return the index of the first unwalkable tile in the path, goal excluded, or None if there's none."""
+        if len(path) < 2:
+            return None
+        blocked = ~walkable.array[[tile.x for tile in path[:-1]], [tile.y for tile in path[:-1]]]
+        if not blocked.any():
+            return None
+        return int(blocked.argmax())
+
+    def get(self, walkable, start, goal):
+        """
+        Get a path from start to goal, searching for it only when there's no valid cached path.
+
+        Args:
+            walkable (Tilemap): Tilemap of the walkable tiles, whose version tells whether cached paths are stale.
+            start (Vector): Starting point.
+            goal (Vector): Destination.
+
+        Returns:
+            list(Vector): The tiles of the path, start excluded and goal included. Empty if there's no path.
+        """
+        cached = self._paths.get((start.x, start.y, goal.x, goal.y))
+        if cached is not None and not cached[0] and cached[1] != walkable.version:
+            # There was no path, but there might be one now
+            cached = None
+        if cached is None:
+            self.misses += 1
+            path = self.search(start, goal)
+        else:
+            path, version = cached
+            blocked = None if version == walkable.version else self._first_blocked(walkable, path)
+            if blocked is None:
+                self.hits += 1
+            else:
+                # Keep the part of the path before the obstacle and search again from there
+                self.repairs += 1
+                resume = path[blocked - 1] if blocked > 0 else start
+                detour = self.search(resume, goal)
+                path = path[:blocked] + detour if detour else self.search(start, goal)
+
+        self._store(start, goal, path, walkable.version)
+        if len(path) > 1:
+            self._store(path[0], goal, path[1:], walkable.version)
+        return list(path)
+
+    def clear(self):
+        """Remove every cached path."""
+        self._paths.clear()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Timings of the phases of the game loop and of the hot calls of the game.
+
+Every timed phase or call keeps its last Profiler.CAPACITY timings in a ring buffer, from which p50/p95/p99 summaries
+are computed on demand. The profiler is off by default, in which case timing a phase or a call costs a single flag
+check, see Profiler.phase and profiled.
+
+Usage:
+    python main.py --profile profile.txt
+
+writes the summary to profile.txt on exit, and whenever F12 is pressed.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+from misc import Singleton
+
+
+class _Untimed:
+    """Context manager that does nothing, returned by Profiler.phase while the profiler is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_UNTIMED = _Untimed()
+
+
+class RingBuffer:
+    """
+    A fixed-size buffer of numbers, where new numbers overwrite the oldest ones once it's full.
+
+    Args:
+        capacity (int): Amount of numbers kept.
+    """
+
+    def __init__(self, capacity):
+        self._values = np.zeros(capacity)
+        self._next = 0
+        # Numbers added so far, including the overwritten ones
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, len(self._values))
+
+    def add(self, value):
+        self._values[self._next] = value
+        self._next = (self._next + 1) % len(self._values)
+        self.total += 1
+
+    def values(self):
+        """Get the numbers kept, oldest first."""
+        if self.total <= len(self._values):
+            return self._values[:self.total].copy()
+        return np.roll(self._values, -self._next)
+
+
+class Profiler(metaclass=Singleton):
+    """
+    Keeps the timings of the phases of the game loop and of the hot calls.
+
+    This class is a Singleton, enable it with enable, time phases with phase and calls with the profiled decorator.
+    """
+    # Timings kept per phase or call
+    CAPACITY = 1024
+    # Percentiles of the summaries
+    PERCENTILES = (50, 95, 99)
+
+    enabled = False
+    # Where dump writes to by default
+    path = None
+
+    def __init__(cls):
+        cls.buffers = {}
+
+    def enable(cls, path=None):
+        """
+        Start timing.
+
+        Args:
+            path (str): Default path of the dumps.
+        """
+        cls.enabled = True
+        cls.path = path
+
+    def disable(cls):
+        """Stop timing, the timings taken so far are kept."""
+        cls.enabled = False
+
+    def clear(cls):
+        """Forget all the timings."""
+        cls.buffers = {}
+
+    def record(cls, name, seconds):
+        """
+        Add a timing of a phase or call.
+
+        Args:
+            name (str): Name of the phase or call.
+            seconds (float): Time it took.
+        """
+        buffer = cls.buffers.get(name)
+        if buffer is None:
+            buffer = cls.buffers[name] = RingBuffer(cls.CAPACITY)
+        buffer.add(seconds)
+
+    def phase(cls, name):
+        """
+        Time a phase of the game loop, if enabled.
+
+        Args:
+            name (str): Name of the phase.
+
+        Returns:
+            A context manager that times the code run within it.
+
+        Examples:
+            with Profiler().phase('enemies'):
+                level.run_turns(...)
+        """
+        if not cls.enabled:
+            return _UNTIMED
+        return cls._timed(name)
+
+    @contextmanager
+    def _timed(cls, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.record(name, time.perf_counter() - start)
+
+    def summary(cls):
+        """
+        Summarize the timings kept of every phase and call.
+
+        Returns:
+            dict: Name -> dict with the amount of timings taken ('count'), and the mean ('mean'), percentiles ('p50',
+                'p95', 'p99') and max ('max') of the ones kept, in seconds.
+        """
+        summary = {}
+        for name, buffer in sorted(cls.buffers.items()):
+            values = buffer.values()
+            stats = {'count': buffer.total, 'mean': values.mean(), 'max': values.max()}
+            for percentile, value in zip(cls.PERCENTILES, np.percentile(values, cls.PERCENTILES)):
+                stats[f'p{percentile}'] = value
+            summary[name] = stats
+        return summary
+
+    def dump(cls, path=None):
+        """
+        Write the summary of the timings to a text file, as a table in milliseconds.
+
+        Args:
+            path (str): Path of the file to write, the one given to enable if None.
+        """
+        columns = ['mean'] + [f'p{percentile}' for percentile in cls.PERCENTILES] + ['max']
+        lines = ['{:<20}{:>10}'.format('phase', 'count') + ''.join(f'{column:>10}' for column in columns)]
+        for name, stats in cls.summary().items():
+            lines.append(f"{name:<20}{stats['count']:>10}" +
+                         ''.join(f'{stats[column] * 1000:>10.3f}' for column in columns))
+        with open(path or cls.path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def profiled(name):
+    """
+    Decorator that times every call of a function while the profiler is enabled.
+
+    Args:
+        name (str): Name the timings are kept under.
+    """
+    profiler = Profiler()
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
@@ -1,7 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import hashlib
 import inspect
+import io
+import os
+import pickle
 import sys
 from ast import literal_eval
 from csv import DictReader
@@ -12,7 +16,7 @@ import effects
 import behavior
 from backpack import Backpack
 from entities import Actor, Item
-from misc import Singleton
+from misc import Singleton, get_abs_path
 
 
 @unique
@@ -65,17 +69,103 @@ class ItemNotFoundError(RegistryError):
         super().__init__(f"The item '{item}' was not found in the registry.")
 
 
+# Bump when the layout of the compiled tables changes, so that caches written by older versions are rebuilt
+CACHE_VERSION = 1
+
+
+def _parse_actors(text):
+    """Parse the actors table, returning key -> row, with the behavior given by name."""
+    actors = {}
+    for actor in DictReader(io.StringIO(text), delimiter=';'):
+        actor['key'] = int(actor['key'])
+        actor['color'] = literal_eval(actor['color'])
+        # If no behavior is specified, default to null behavior
+        actor['behavior'] = actor.get('behavior') or None
+        actors[actor['key']] = actor
+    return actors
+
+
+def _parse_items(text):
+    """Parse the items table, returning key -> row, with the effect given by name along with its args."""
+    items = {}
+    for item in DictReader(io.StringIO(text), delimiter=';'):
+        item['key'] = int(item['key'])
+        for arg in ('color', 'blocks', 'weight'):
+            item[arg] = literal_eval(item[arg])
+        effect_args = item.pop('effect_args')
+        item['effect'] = (item['effect'], tuple(literal_eval(effect_args))) if item['effect'] else None
+        items[item['key']] = item
+    return items
+
+
+def compile_tables(actors_path, items_path, cache_path):
+    """
+    Get the parsed actors and items tables, from the cache if it was compiled from the current tables.
+
+    The cache holds the parsed rows along with a hash of the contents of the tables, and is read in one go. When the
+    tables change, they are parsed again and the cache is rewritten. If the cache can't be written, e.g. because the
+    game is installed in a read-only location, the tables are simply parsed every time.
+
+    Args:
+        actors_path (str): Path of the actors table.
+        items_path (str): Path of the items table.
+        cache_path (str): Path of the cache.
+
+    Returns:
+        tuple(dict, dict): The actors and the items, as key -> row dicts.
+    """
+    sources = []
+    for path in (actors_path, items_path):
+        with open(path, 'rb') as f:
+            sources.append(f.read())
+    digest = hashlib.sha256(str(CACHE_VERSION).encode())
+    for source in sources:
+        digest.update(hashlib.sha256(source).digest())
+    digest = digest.digest()
+    try:
+        with open(cache_path, 'rb') as f:
+            cache = pickle.loads(f.read())
+        if cache['digest'] == digest:
+            return cache['actors'], cache['items']
+    except (OSError, EOFError, KeyError, TypeError, ValueError, AttributeError, ImportError, pickle.UnpicklingError):
+        # Missing or unreadable cache, e.g. written by a newer Python or against renamed classes, build it again
+        pass
+    actors = _parse_actors(sources[0].decode('utf-8'))
+    items = _parse_items(sources[1].decode('utf-8'))
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(pickle.dumps({'digest': digest, 'actors': actors, 'items': items}, pickle.DEFAULT_PROTOCOL))
+        # Replace the cache at once, so that a concurrent launch never reads half of it
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass
+    return actors, items
+
+
 class Registry(metaclass=Singleton):
     """
     The registry contains info about most classes in the game, serving as a factory for things like actors and items.
 
-    The registry is a singleton, and loads all the needed information from json files upon creation. All data remains
-    loaded in the registry until the game is closed.
+    The registry is a singleton, and loads all the needed information from the csv tables upon creation. All data
+    remains loaded in the registry until the game is closed.
+
+    The tables are compiled into a cache the first time they are loaded, see compile_tables, and the factories of the
+    actors and items are only made the first time one of them is requested, so loading the registry costs about the
+    same no matter how big the tables are.
     """
+    # Tables and compiled cache, relative to the game root directory
+    ACTORS_PATH = get_abs_path('actors.csv')
+    ITEMS_PATH = get_abs_path('items.csv')
+    CACHE_PATH = get_abs_path('registry.cache')
+
     behaviors = {}
     effect = {}
     actors = {}
     items = {}
+    # ID value -> row of the table, of every actor and item
+    _actor_rows = {}
+    _item_rows = {}
     loaded = False
 
     def __init__(cls):
@@ -92,60 +182,43 @@ class Registry(metaclass=Singleton):
         def predicate(obj):
             return (inspect.isclass(obj) or inspect.isfunction(obj)) and obj.__module__ == module_name
 
-        return inspect.getmembers(sys.modules[module_name], predicate)
+        return {name: obj for name, obj in vars(sys.modules[module_name]).items() if predicate(obj)}
 
     def _load_behaviors(cls):
-        cls.behaviors = dict(cls._load_module('behavior'))
+        cls.behaviors = cls._load_module('behavior')
 
     def _load_effects(cls):
-        cls.effect = dict(cls._load_module('effects'))
-
-    def _load_actors(cls):
-        with open('actors.csv', 'r') as f:
-            reader = DictReader(f, delimiter=';')
-
-            for actor in reader:
-                str_behavior = actor.get('behavior')
-                # If no behavior is specified, default to null behavior
-                real_behavior = None
-                if str_behavior != '':
-                    real_behavior = cls.behaviors.get(str_behavior)
-
-                # Convert datatypes to the right ones
-                actor['key'] = Actors(int(actor.get('key')))
-                actor['behavior'] = real_behavior
-                to_literal = ['color']
-                for arg in to_literal:
-                    actor[arg] = literal_eval(actor.get(arg))
-
-                cls.actors[actor['key']] = partial(Actor, **actor)
-
-    def _load_items(cls):
-        with open('items.csv', 'r') as f:
-            reader = DictReader(f, delimiter=';')
-
-            for item in reader:
-                str_effect = item.get('effect')
-                real_effect = None
-                effect_args = item.pop('effect_args')
-                if str_effect != '':
-                    # Create the effect passing the required args
-                    real_effect = partial(cls.effect.get(str_effect), *literal_eval(effect_args))
-
-                # Convert datatypes to the right ones
-                item['key'] = Items(int(item.get('key')))
-                item['effect'] = real_effect
-                to_literal = ['color', 'blocks', 'weight']
-                for arg in to_literal:
-                    item[arg] = literal_eval(item.get(arg))
-
-                cls.items[item['key']] = partial(Item, **item)
+        cls.effect = cls._load_module('effects')
+
+    def _actor_factory(cls, key):
+        """Make the factory of the actor with the given ID from its row of the table, None if there's no such actor."""
+        actor = cls._actor_rows.get(key.value)
+        if actor is None:
+            return None
+        actor = dict(actor, key=key)
+        if actor['behavior'] is not None:
+            actor['behavior'] = cls.behaviors.get(actor['behavior'])
+        return partial(Actor, **actor)
+
+    def _item_factory(cls, key):
+        """Make the factory of the item with the given ID from its row of the table, None if there's no such item."""
+        item = cls._item_rows.get(key.value)
+        if item is None:
+            return None
+        item = dict(item, key=key)
+        if item['effect'] is not None:
+            # Create the effect passing the required args
+            name, args = item['effect']
+            item['effect'] = partial(cls.effect.get(name), *args)
+        return partial(Item, **item)
 
     def load(cls):
         cls._load_behaviors()
         cls._load_effects()
-        cls._load_actors()
-        cls._load_items()
+        cls._actor_rows, cls._item_rows = compile_tables(cls.ACTORS_PATH, cls.ITEMS_PATH, cls.CACHE_PATH)
+        # Factories are made on demand, see get_actor and get_item
+        cls.actors = {}
+        cls.items = {}
 
     def _get_behavior(cls, key):
         """
@@ -204,7 +277,10 @@ class Registry(metaclass=Singleton):
             raise RegistryNotInitializedError
         actor = cls.actors.get(key)
         if actor is None:
-            raise ActorNotFoundError(key)
+            actor = cls._actor_factory(key)
+            if actor is None:
+                raise ActorNotFoundError(key)
+            cls.actors[key] = actor
         return actor()
 
     def get_item(cls, key):
@@ -224,5 +300,8 @@ class Registry(metaclass=Singleton):
             raise RegistryNotInitializedError
         item = cls.items.get(key)
         if item is None:
-            raise ItemNotFoundError(key)
+            item = cls._item_factory(key)
+            if item is None:
+                raise ItemNotFoundError(key)
+            cls.items[key] = item
         return item()
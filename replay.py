@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Recording of game sessions and replay at full speed.
+
+Everything random in the game is drawn from the dungeon's seed, so a session is fully determined by the seed and the
+keys the player pressed. A Recorder keeps both, and replay feeds the keys back through ActionManager with no display
+and no waiting, timing every turn, so that a slow session can be reproduced exactly and its turns compared across
+versions of the game.
+
+Only the keys that took a turn are recorded: the others don't change the game, and leaving them out keeps the window
+keys, like Escape or Alt+Enter, out of the recording.
+
+A recording file is laid out as follows, all numbers being little-endian:
+
+    * Header: magic, format version, dungeon seed, amount of key names, amount of keys, and the settings of the
+      dungeon that change how the game plays out: Dungeon.BACKGROUND_INTERVAL and BACKGROUND_THREAD.
+    * Key names: the names of the keys pressed, e.g. 'CHAR' or 'UP', separated by NUL bytes.
+    * Keys: one (key name index, char, alt) triple per key, the char being stored as its 4-byte code point and the
+      others as a byte each.
+
+Usage:
+    python main.py --record session.rec
+    python replay.py session.rec
+"""
+
+import argparse
+import struct
+import time
+
+import numpy as np
+
+from dungeon import Dungeon
+from game import KeyEvent, new_game, play_turn
+from profiler import Profiler
+
+RECORDING_MAGIC = b'RGRC'
+RECORDING_VERSION = 4
+
+_HEADER = struct.Struct('<4sHQHIH?')
+_KEY = np.dtype([('key', 'u1'), ('char', '<u4'), ('alt', 'u1')])
+
+
+class RecordingError(Exception):
+    pass
+
+
+def dungeon_settings():
+    """
+    Get the settings of the dungeon that a session depends on, besides its seed.
+
+    Returns:
+        tuple: Dungeon.BACKGROUND_INTERVAL and BACKGROUND_THREAD.
+    """
+    return Dungeon.BACKGROUND_INTERVAL, Dungeon.BACKGROUND_THREAD
+
+
+class Recorder:
+    """
+    Records the keys of a session, to replay it later.
+
+    Args:
+        seed (int): Seed of the dungeon of the session.
+        settings (tuple): Settings of the dungeon of the session, see dungeon_settings. The current ones if not given.
+    """
+
+    def __init__(self, seed, settings=None):
+        self.seed = seed
+        self.settings = settings if settings is not None else dungeon_settings()
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def record(self, event):
+        """
+        Record a key that took a turn.
+
+        Args:
+            event: The key event, either a tdl KEYDOWN event or a KeyEvent.
+        """
+        self.keys.append(KeyEvent(event.key, event.char, bool(event.alt)))
+
+    def save(self, path):
+        """
+        Write the recording to a file.
+
+        Args:
+            path (str): Path of the file to write.
+        """
+        names = sorted({key.key for key in self.keys})
+        index = {name: i for i, name in enumerate(names)}
+        keys = np.array([(index[key.key], ord(key.char) if key.char else 0, key.alt) for key in self.keys],
+                        dtype=_KEY)
+        interval, thread = self.settings
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, self.seed, len(names), len(keys), interval,
+                                 thread))
+            f.write('\0'.join(names).encode('ascii'))
+            f.write(keys.tobytes())
+
+
+def load_recording(path):
+    """
+    Read a recording written by Recorder.save.
+
+    Args:
+        path (str): Path of the file to read.
+
+    Returns:
+        Recorder: The recording.
+
+    Raises:
+        RecordingError: If the file is not a valid recording.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != RECORDING_MAGIC or len(data) < 6:
+        raise RecordingError(f"'{path}' is not a recording.")
+    version, = struct.unpack_from('<H', data, 4)
+    if version != RECORDING_VERSION:
+        raise RecordingError(f"Unsupported recording version {version}, expected {RECORDING_VERSION}.")
+    if len(data) < _HEADER.size:
+        raise RecordingError(f"'{path}' is truncated or corrupt.")
+    _, _, seed, name_count, key_count, interval, thread = _HEADER.unpack_from(data)
+    keys_size = key_count * _KEY.itemsize
+    names_data = data[_HEADER.size:len(data) - keys_size]
+    names = names_data.decode('ascii').split('\0') if name_count else []
+    if len(names) != name_count:
+        raise RecordingError(f"'{path}' is truncated or corrupt.")
+    keys = np.frombuffer(data, dtype=_KEY, count=key_count, offset=len(data) - keys_size)
+    recording = Recorder(seed, (interval, thread))
+    recording.keys = [KeyEvent(names[key], chr(char) if char else '', bool(alt)) for key, char, alt in keys.tolist()]
+    return recording
+
+
+class ReplayStats:
+    """
+    What happened in a replay.
+
+    Args:
+        timings (numpy.ndarray): Seconds taken by every turn.
+        depth (int): Level the player ended at, starting from 1.
+        died (bool): Whether the player died.
+    """
+
+    def __init__(self, timings, depth, died):
+        self.timings = timings
+        self.depth = depth
+        self.died = died
+
+    @property
+    def turns(self):
+        return len(self.timings)
+
+    def __str__(self):
+        if not self.turns:
+            return "No turns replayed."
+        p50, p95, p99 = np.percentile(self.timings, (50, 95, 99)) * 1000
+        outcome = "died" if self.died else "alive"
+        return (f"{self.turns} turns in {self.timings.sum():.2f}s, per turn p50 {p50:.2f}ms, p95 {p95:.2f}ms, "
+                f"p99 {p99:.2f}ms, max {self.timings.max() * 1000:.2f}ms, depth {self.depth}, {outcome}")
+
+
+def replay(recording):
+    """
+    Replay a recording as fast as possible, without a display.
+
+    The game is left as it is at the end of the replay, so that it can be looked into through the Dungeon.
+
+    Args:
+        recording (Recorder): The recording, see load_recording.
+
+    Returns:
+        ReplayStats: What happened in the replay, along with the time every turn took.
+
+    Raises:
+        RecordingError: If the dungeon settings are not the ones the session was recorded with, or if a recorded key
+            doesn't take a turn anymore, i.e. the game didn't play out as recorded.
+    """
+    if recording.settings != dungeon_settings():
+        raise RecordingError(f"The session was recorded with the dungeon settings {recording.settings}, but they are "
+                             f"{dungeon_settings()} now, see dungeon_settings.")
+    player, dungeon, action_manager = new_game(recording.seed)
+    timings = np.zeros(len(recording.keys))
+    for turn, key in enumerate(recording.keys):
+        start = time.perf_counter()
+        took_turn = play_turn(player, dungeon, action_manager, key)
+        timings[turn] = time.perf_counter() - start
+        if not took_turn:
+            raise RecordingError(f"Key {key} of turn {turn} didn't take a turn, the replay went out of sync.")
+    return ReplayStats(timings, dungeon.current_level_number, player.dead)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded game session as fast as possible.")
+    parser.add_argument('recording', help="Path of the recording, see main.py --record.")
+    parser.add_argument('--timings', help="Path of a file to write the seconds taken by every turn to, one per line.")
+    parser.add_argument('--profile', default=None, help="Path of a file to write the timings of the game loop to.")
+    args = parser.parse_args()
+    if args.profile:
+        Profiler().enable(args.profile)
+    stats = replay(load_recording(args.recording))
+    print(stats)
+    if args.timings:
+        np.savetxt(args.timings, stats.timings)
+    if args.profile:
+        Profiler().dump()
+
+
+if __name__ == "__main__":
+    main()
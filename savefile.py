@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Binary save files for the dungeon.
+
+A save file is laid out as follows, all numbers being little-endian:
+
+    * Header: magic, format version, level count, index of the current level, dungeon seed.
+    * Player: level, experience, hp and position.
+    * Level directory: one (kind, seed, offset) entry per level.
+    * Level records, at the offsets given by the directory.
+
+Levels that are in memory are stored as FULL records: the walkable, transparent and explored layers bit-packed with
+numpy.packbits, a room table and a columnar entity table. Levels that were dropped from memory are stored as DELTA
+records, i.e. their LevelDelta, since their seed is enough to regenerate the rest.
+
+Loading memory-maps the file and only reads the header and the directory. The records themselves are read straight
+from the mapped file when the level is needed, so loading a deep dungeon costs the same as loading a shallow one.
+"""
+
+import os
+import struct
+
+import numpy as np
+
+from entities import Actor, Item
+from level import Level, LevelDelta, Room
+from misc import Vector
+
+SAVE_MAGIC = b'RGSV'
+SAVE_VERSION = 1
+
+# Kinds of level records
+FULL = 0
+DELTA = 1
+
+# Kinds of entities in the entity table
+ACTOR = 0
+ITEM = 1
+
+# Entity flags
+IN_LEVEL = 1
+DEAD = 2
+
+_HEADER = struct.Struct('<4sHIiQ')
+_PLAYER = struct.Struct('<iddii')
+_DIRECTORY_ENTRY = struct.Struct('<BQQ')
+_FULL_LEVEL = struct.Struct('<HHHHHHII')
+_DELTA_LEVEL = struct.Struct('<IIII')
+
+# Columns of the entity table, in the order they are stored
+_ENTITY_COLUMNS = (
+    ('spawn_id', np.int32),
+    ('kind', np.uint8),
+    ('key', np.uint16),
+    ('flags', np.uint8),
+    ('x', np.uint16),
+    ('y', np.uint16),
+    ('spawn_x', np.uint16),
+    ('spawn_y', np.uint16),
+    ('hp', np.float64),
+)
+
+
+class SaveFileError(Exception):
+    pass
+
+
+def _pack_layer(tilemap):
+    return np.packbits(tilemap.array).tobytes()
+
+
+def _unpack_layer(buffer, offset, width, height):
+    """Read a bit-packed layer from the buffer, returning it and the offset right after it."""
+    size = (width * height + 7) // 8
+    bits = np.unpackbits(np.frombuffer(buffer, np.uint8, size, offset))[:width * height]
+    return bits.reshape(width, height).astype(bool), offset + size
+
+
+def _read_array(buffer, offset, dtype, count):
+    """Read an array from the buffer without copying it, returning it and the offset right after it."""
+    array = np.frombuffer(buffer, dtype, count, offset)
+    return array, offset + array.nbytes
+
+
+def _entity_table(level, player):
+    """Build the columns of the entity table of a level."""
+    rows = []
+    spawn_ids = {entity: i for i, entity in enumerate(level.spawned)}
+    # Spawned entities that are gone are still stored, so that the spawn order is kept
+    entities = list(level.spawned) + [e for e in level.entities if e not in spawn_ids and isinstance(e, (Actor, Item))
+                                      and e is not player]
+    for entity in entities:
+        spawn_id = spawn_ids.get(entity, -1)
+        spawn_pos = level.spawn_positions[spawn_id] if spawn_id != -1 else entity.pos
+        actor = isinstance(entity, Actor)
+        flags = IN_LEVEL if entity.game_map is level else 0
+        if actor and entity.dead:
+            flags |= DEAD
+        rows.append((spawn_id, ACTOR if actor else ITEM, entity.key.value, flags, entity.pos.x, entity.pos.y,
+                     spawn_pos.x, spawn_pos.y, entity.hp if actor else 0))
+    columns = list(zip(*rows)) if rows else [()] * len(_ENTITY_COLUMNS)
+    return [np.array(column, dtype) for column, (_, dtype) in zip(columns, _ENTITY_COLUMNS)], len(rows)
+
+
+def _full_record(level, player):
+    entity_columns, entity_count = _entity_table(level, player)
+    rooms = np.array([(room.x1, room.y1, room.x2, room.y2) for room in level.rooms], np.int16).reshape(-1, 4)
+    parts = [
+        _FULL_LEVEL.pack(level.width, level.height, level.up_stairs.pos.x, level.up_stairs.pos.y,
+                         level.down_stairs.pos.x, level.down_stairs.pos.y, len(level.rooms), entity_count),
+        _pack_layer(level.walkable),
+        _pack_layer(level.transparent),
+        _pack_layer(level.explored),
+        rooms.tobytes(),
+    ]
+    parts += [column.tobytes() for column in entity_columns]
+    return b''.join(parts)
+
+
+def _delta_record(delta):
+    explored = np.asarray(delta.explored, np.uint8)
+    killed = np.array([(i, x, y) for i, (x, y) in delta.killed.items()], np.int32).reshape(-1, 3)
+    actors = np.array([(i, x, y) for i, (x, y, _) in delta.actors.items()], np.int32).reshape(-1, 3)
+    hps = np.array([hp for _, _, hp in delta.actors.values()], np.float64)
+    return b''.join([
+        _DELTA_LEVEL.pack(len(explored), len(delta.removed), len(killed), len(actors)),
+        explored.tobytes(),
+        np.array(delta.removed, np.int32).tobytes(),
+        killed.tobytes(),
+        actors.tobytes(),
+        hps.tobytes(),
+    ])
+
+
+def save_dungeon(path, seed, current, player, seeds, levels):
+    """
+    Write a save file.
+
+    Note:
+        Only the player's level, experience, hp and position are saved, the backpack is not.
+
+    Args:
+        path (str): Path of the file to write.
+        seed (int): Seed of the dungeon.
+        current (int): Index of the level the player is at.
+        player (Actor): Reference to the player object.
+        seeds (list(int)): Seed of every level.
+        levels (list): Every level, either as a Level if it's in memory, as a LevelDelta if it was dropped or as a
+            SavedLevel if it hasn't been restored since the game was loaded.
+    """
+    records = []
+    for level in levels:
+        if isinstance(level, Level):
+            records.append((FULL, _full_record(level, player)))
+        elif isinstance(level, LevelDelta):
+            records.append((DELTA, _delta_record(level)))
+        else:
+            # Copy the record as is
+            records.append((level.kind, level.record()))
+
+    header = _HEADER.pack(SAVE_MAGIC, SAVE_VERSION, len(records), current, seed)
+    header += _PLAYER.pack(player.level, player.exp, player.hp, player.pos.x, player.pos.y)
+    offset = len(header) + _DIRECTORY_ENTRY.size * len(records)
+    directory = []
+    for (kind, record), level_seed in zip(records, seeds):
+        directory.append(_DIRECTORY_ENTRY.pack(kind, level_seed, offset))
+        offset += len(record)
+
+    # Write a new file and move it over the old one, which may still be memory-mapped by the SavedLevels of a loaded
+    # game: rewriting it in place would change the records under them
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            f.write(b''.join(directory))
+            f.write(b''.join(record for _, record in records))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class SavedLevel:
+    """
+    A level record in a memory-mapped save file, which is only read when the level is restored.
+
+    Args:
+        buffer (numpy.memmap): The memory-mapped save file.
+        kind (int): Kind of the record, FULL or DELTA.
+        offset (int): Offset of the record in the file.
+        end (int): Offset right after the end of the record.
+    """
+
+    def __init__(self, buffer, kind, offset, end):
+        self._buffer = buffer
+        self.kind = kind
+        self._offset = offset
+        self._end = end
+
+    def record(self):
+        """Return the raw bytes of the record."""
+        return self._buffer[self._offset:self._end].tobytes()
+
+    def delta(self):
+        """
+        Read a DELTA record.
+
+        Returns:
+            LevelDelta: The changes made to the level.
+        """
+        buffer = self._buffer
+        explored_size, removed_count, killed_count, actor_count = _DELTA_LEVEL.unpack_from(buffer, self._offset)
+        offset = self._offset + _DELTA_LEVEL.size
+        explored, offset = _read_array(buffer, offset, np.uint8, explored_size)
+        removed, offset = _read_array(buffer, offset, np.int32, removed_count)
+        killed, offset = _read_array(buffer, offset, np.int32, killed_count * 3)
+        actors, offset = _read_array(buffer, offset, np.int32, actor_count * 3)
+        hps, offset = _read_array(buffer, offset, np.float64, actor_count)
+        return LevelDelta(
+            explored.copy(),
+            removed.tolist(),
+            {i: (x, y) for i, x, y in killed.reshape(-1, 3).tolist()},
+            {i: (x, y, hp) for (i, x, y), hp in zip(actors.reshape(-1, 3).tolist(), hps.tolist())},
+        )
+
+    def restore(self, level, registry):
+        """
+        Fill a blank level with the contents of a FULL record.
+
+        Args:
+            level (Level): A level created with blank=True.
+            registry (Registry): Reference to the game's registry, used to create the entities.
+        """
+        from registry import Actors, Items
+
+        buffer = self._buffer
+        (width, height, up_x, up_y, down_x, down_y,
+         room_count, entity_count) = _FULL_LEVEL.unpack_from(buffer, self._offset)
+        if (width, height) != (level.width, level.height):
+            raise SaveFileError(f"Saved level is {width}x{height}, expected {level.width}x{level.height}.")
+        offset = self._offset + _FULL_LEVEL.size
+        for layer in (level.walkable, level.transparent, level.explored):
+            layer[:], offset = _unpack_layer(buffer, offset, width, height)
+        rooms, offset = _read_array(buffer, offset, np.int16, room_count * 4)
+        level.rooms = [Room(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in rooms.reshape(-1, 4).tolist()]
+        level.up_stairs.place(level, Vector(up_x, up_y))
+        level.down_stairs.place(level, Vector(down_x, down_y))
+
+        columns = {}
+        for name, dtype in _ENTITY_COLUMNS:
+            columns[name], offset = _read_array(buffer, offset, dtype, entity_count)
+        rows = zip(*(columns[name].tolist() for name, _ in _ENTITY_COLUMNS))
+        for spawn_id, kind, key, flags, x, y, spawn_x, spawn_y, hp in rows:
+            if kind == ACTOR:
+                entity = registry.get_actor(Actors(key))
+            else:
+                entity = registry.get_item(Items(key))
+            if spawn_id != -1:
+                level.spawned.append(entity)
+                level.spawn_positions.append(Vector(spawn_x, spawn_y))
+            if not flags & IN_LEVEL:
+                continue
+            entity.place(level, Vector(x, y))
+            if kind == ACTOR:
+                entity.hp = 0 if flags & DEAD else hp
+
+
+def load_dungeon(path):
+    """
+    Memory-map a save file and read its header and level directory.
+
+    Args:
+        path (str): Path of the save file.
+
+    Returns:
+        dict: The saved dungeon seed, current level index, player stats and position, the seed of every level and
+            a SavedLevel per level.
+
+    Raises:
+        SaveFileError: If the file is not a save file or was written by an unsupported version.
+    """
+    buffer = np.memmap(path, np.uint8, mode='r')
+    if len(buffer) < _HEADER.size or bytes(buffer[:4]) != SAVE_MAGIC:
+        raise SaveFileError(f"'{path}' is not a save file.")
+    _, version, level_count, current, seed = _HEADER.unpack_from(buffer, 0)
+    if version != SAVE_VERSION:
+        raise SaveFileError(f"Unsupported save file version {version}, expected {SAVE_VERSION}.")
+    offset = _HEADER.size
+    player_level, exp, hp, x, y = _PLAYER.unpack_from(buffer, offset)
+    offset += _PLAYER.size
+    directory = [_DIRECTORY_ENTRY.unpack_from(buffer, offset + i * _DIRECTORY_ENTRY.size) for i in range(level_count)]
+    seeds = [level_seed for _, level_seed, _ in directory]
+    ends = [level_offset for _, _, level_offset in directory[1:]] + [len(buffer)]
+    levels = [SavedLevel(buffer, kind, level_offset, end) for (kind, _, level_offset), end in zip(directory, ends)]
+    return {
+        'seed': seed,
+        'current': current,
+        'player': {'level': player_level, 'exp': exp, 'hp': hp, 'pos': Vector(x, y)},
+        'seeds': seeds,
+        'levels': levels,
+    }
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+
+# Energy spent by a standard action, e.g. moving one tile or attacking
+ACTION_COST = 100
+# Speed of an average actor, which spends one unit of time per standard action
+NORMAL_SPEED = 100
+
+
+class Scheduler:
+    """
+    Energy-based turn scheduler for the actors of a level.
+
+    Actors with a behavior are kept in a priority queue ordered by the time of their next action. When an actor acts,
+    it spends the energy cost of its action, and its next action comes cost / speed units of time later, so faster
+    actors act more often. Actors that act at the same time do so in the order they were scheduled.
+
+    Only the actors whose turn has come are looked at, so running a turn costs O(k log n) for k acting actors, no
+    matter how many other entities there are in the level. Actors that lose their behavior (e.g. because they died) or
+    are removed from the scheduler drop out of the queue the next time their turn comes.
+    """
+
+    def __init__(self):
+        self.time = 0
+        # (time, order, actor) entries, ordered by time and then by the order in which they were pushed
+        self._queue = []
+        # Actor -> order of its current entry, entries with another order are outdated
+        self._entries = {}
+        self._pushed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, actor):
+        return actor in self._entries
+
+    def _push(self, actor, time):
+        self._entries[actor] = self._pushed
+        heapq.heappush(self._queue, (time, self._pushed, actor))
+        self._pushed += 1
+
+    def add(self, actor, delay=0):
+        """
+        Schedule an actor, replacing its current entry if it already has one.
+
+        Args:
+            actor (Actor): Actor to schedule. Actors without a behavior are ignored.
+            delay (float): Time until the actor's first action, counting from now.
+        """
+        if actor.behavior is not None:
+            self._push(actor, self.time + delay)
+
+    def remove(self, actor):
+        """
+        Unschedule an actor, if it's scheduled.
+
+        Args:
+            actor (Actor): Actor to unschedule.
+        """
+        self._entries.pop(actor, None)
+
+    def next_time(self):
+        """
+        Get the time of the next action.
+
+        Returns:
+            float: The time at which the next scheduled actor acts, None if there are no actors.
+        """
+        while self._queue:
+            _, order, actor = self._queue[0]
+            if self._entries.get(actor) == order and actor.behavior is not None:
+                return self._queue[0][0]
+            # Outdated entry, or an actor that can't act anymore
+            heapq.heappop(self._queue)
+            if self._entries.get(actor) == order:
+                del self._entries[actor]
+        return None
+
+    def run(self, duration, target, keep=None):
+        """
+        Advance the clock, letting every actor whose turn comes before the new time take it.
+
+        Args:
+            duration (float): Time to advance the clock, usually the time the player's action took.
+            target (Entity): Target passed to the behaviors of the actors.
+            keep (callable): Optional function called with every actor whose turn comes. If it returns False, the
+                actor doesn't act and is unscheduled, see ActivityZones.keep_awake.
+
+        Returns:
+            int: Amount of turns taken.
+        """
+        end = self.time + duration
+        turns = 0
+        while True:
+            time = self.next_time()
+            if time is None or time >= end:
+                break
+            _, order, actor = heapq.heappop(self._queue)
+            self.time = time
+            if keep is not None and not keep(actor):
+                del self._entries[actor]
+                continue
+            self._reschedule(actor, order, time, actor.take_turn(target))
+            turns += 1
+        self.time = end
+        return turns
+
+    def _reschedule(self, actor, order, time, cost):
+        """Schedule the next action of an actor that acted at the given time, spending the given energy."""
+        # The actor might have been unscheduled or rescheduled during its turn
+        if self._entries.get(actor) == order:
+            if actor.behavior is None:
+                del self._entries[actor]
+            else:
+                self._push(actor, time + (ACTION_COST if cost is None else cost) / actor.speed)
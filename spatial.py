@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+from misc import Vector
+
+
+class SpatialIndex:
+    """
+    A spatial hash of the entities in a level, keyed by the tile they are standing on.
+
+    It answers "what is on this tile" and "is this tile blocked by an entity" in constant time, regardless of the amount
+    of entities in the level. The index doesn't watch the entities by itself, so whoever changes the position or the
+    blocking state of an indexed entity is responsible for notifying it (see Entity.move, Entity.place and Actor._die).
+    """
+
+    def __init__(self):
+        # Tile -> list of entities on that tile, tiles are Vectors
+        self._cells = {}
+        # Tile -> blocking entity on that tile, there can only be one per tile
+        self._blockers = {}
+
+    def add(self, entity):
+        """
+        Index an entity at its current position.
+
+        Args:
+            entity (Entity): Entity to be indexed.
+        """
+        key = entity.pos
+        self._cells.setdefault(key, []).append(entity)
+        if entity.blocks:
+            self._blockers[key] = entity
+
+    def remove(self, entity, pos=None):
+        """
+        Remove an entity from the index.
+
+        Args:
+            entity (Entity): Entity to be removed.
+            pos (Vector): Position at which the entity was indexed, defaults to its current position.
+        """
+        key = entity.pos if pos is None else pos
+        cell = self._cells[key]
+        cell.remove(entity)
+        if not cell:
+            del self._cells[key]
+        if self._blockers.get(key) is entity:
+            del self._blockers[key]
+
+    def move(self, entity, old_pos):
+        """
+        Update the index after an entity moved from old_pos to its current position.
+
+        Args:
+            entity (Entity): Entity that moved.
+            old_pos (Vector): Position of the entity before moving.
+        """
+        self.remove(entity, old_pos)
+        self.add(entity)
+
+    def update_blocking(self, entity):
+        """
+        Update the index after the blocking state of an entity changed.
+
+        Args:
+            entity (Entity): Entity whose blocks attribute changed.
+        """
+        key = entity.pos
+        if entity.blocks:
+            self._blockers[key] = entity
+        elif self._blockers.get(key) is entity:
+            del self._blockers[key]
+
+    def at(self, pos):
+        """
+        Get the entities at the given position.
+
+        Args:
+            pos (Vector): Position to look up.
+
+        Returns:
+            list(Entity): The entities at the position, in the order they were placed there.
+        """
+        return list(self._cells.get(pos, ()))
+
+    def blocking_at(self, pos):
+        """
+        Get the blocking entity at the given position.
+
+        Args:
+            pos (Vector): Position to look up.
+
+        Returns:
+            Entity: The blocking entity if any, None otherwise.
+        """
+        return self._blockers.get(pos)
+
+    def is_blocked(self, pos):
+        """Return whether there's a blocking entity at the given position."""
+        return pos in self._blockers
+
+    def is_occupied(self, pos):
+        """Return whether there's any entity at the given position."""
+        return pos in self._cells
+
+
+class FreeCells:
+    """
+    A bag of free tiles that can be drawn at random without replacement in constant time.
+
+    Drawn tiles are swapped with the last one in the bag and popped, so drawing is O(1).
+
+    Args:
+        cells (iterable): (x, y) tuples of the tiles initially in the bag.
+        rng (Random): Random number generator to draw the tiles with, defaults to the random module itself.
+    """
+
+    def __init__(self, cells, rng=random):
+        self._cells = list(cells)
+        self._rng = rng
+
+    def __len__(self):
+        return len(self._cells)
+
+    def _remove_at(self, i):
+        cell = self._cells[i]
+        last = self._cells.pop()
+        if last != cell:
+            self._cells[i] = last
+        return cell
+
+    def pop(self):
+        """
+        Draw a random tile from the bag and remove it.
+
+        Returns:
+            Vector: The position of the drawn tile.
+
+        Raises:
+            IndexError: If the bag is empty.
+        """
+        if not self._cells:
+            raise IndexError("pop from empty FreeCells")
+        return Vector(*self._remove_at(self._rng.randrange(len(self._cells))))
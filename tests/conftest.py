@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Fixtures shared by the tests."""
+
+import pytest
+
+
+@pytest.fixture
+def registry():
+    from registry import Registry
+    return Registry()
+
+
+@pytest.fixture
+def log():
+    return []
+
+
+@pytest.fixture
+def make_actor(registry, log):
+    """Factory of actors that append their name to the log when they take a turn."""
+    from entities import Actor
+    from registry import Actors
+    from scheduler import NORMAL_SPEED
+
+    def behavior(caller, target):
+        log.append(caller.name)
+
+    def make_actor(name, pos=None, speed=NORMAL_SPEED):
+        actor = Actor(Actors.ORC, name, 'o', (0, 255, 0), behavior, speed=speed)
+        if pos is not None:
+            actor.pos = pos
+        return actor
+
+    return make_actor
+
+
+@pytest.fixture
+def make_orc(registry):
+    """Factory of orcs taken from the registry, placed at the given position of the level if there's one."""
+    from registry import Actors
+
+    def make_orc(pos, level=None):
+        orc = registry.get_actor(Actors.ORC)
+        if level is not None:
+            orc.place(level, pos)
+        else:
+            orc.pos = pos
+        return orc
+
+    return make_orc
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from activity import ActivityZones
+from misc import Vector
+from scheduler import Scheduler
+
+
+@pytest.fixture
+def zones():
+    return ActivityZones(Scheduler(), wake_radius=5, sleep_radius=10)
+
+
+class TestActivityZones(object):
+
+    def test_far_actors_fall_asleep(self, zones, make_actor, log):
+        near, far = make_actor('near', Vector(3, 0)), make_actor('far', Vector(30, 0))
+        zones.scheduler.add(near)
+        zones.scheduler.add(far)
+        zones.update(Vector(0, 0))
+        zones.scheduler.run(1, None, zones.keep_awake)
+        zones.scheduler.run(1, None, zones.keep_awake)
+        assert log == ['near', 'near']
+        assert zones.is_asleep(far)
+        assert far not in zones.scheduler
+
+    def test_wake_on_proximity(self, zones, make_actor, log):
+        actor = make_actor('a', Vector(30, 0))
+        zones.sleep(actor)
+        zones.update(Vector(20, 0))
+        assert zones.is_asleep(actor)
+        assert zones.update(Vector(26, 0)) == 1
+        assert not zones.is_asleep(actor)
+        assert actor in zones.scheduler
+
+    def test_wake_on_noise(self, zones, make_actor):
+        close, distant = make_actor('close', Vector(30, 0)), make_actor('distant', Vector(55, 0))
+        zones.sleep(close)
+        zones.sleep(distant)
+        assert zones.noise(Vector(40, 0), 10) == 1
+        assert not zones.is_asleep(close) and zones.is_asleep(distant)
+
+    def test_forget(self, zones, make_actor):
+        actor = make_actor('a', Vector(30, 0))
+        zones.sleep(actor)
+        zones.forget(actor)
+        assert len(zones) == 0
+        assert zones.update(Vector(30, 0)) == 0
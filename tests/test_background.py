@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from background import simulate_level
+
+
+@pytest.fixture
+def level():
+    from level import Level
+    from registry import Registry
+    return Level(80, 44, 30, 6, 10, 3, None, Registry(), seed=42)
+
+
+def monsters(level):
+    return [entity for entity in level.entities if getattr(entity, 'behavior', None) is not None]
+
+
+class TestSimulateLevel(object):
+
+    def test_monsters_wander_onto_free_tiles(self, level):
+        before = {monster: monster.pos for monster in monsters(level)}
+        for _ in range(10):
+            simulate_level(level, 10, np.random.RandomState(0))
+        moved = [monster for monster, pos in before.items() if monster.pos != pos]
+        assert moved
+        positions = [monster.pos for monster in monsters(level)]
+        assert len(set(positions)) == len(positions)
+        terrain = level.terrain_walkable()
+        assert all(terrain[pos.x, pos.y] and not level.walkable[pos] for pos in positions)
+        store = level.store
+        assert all(store.x[monster._row] == monster.pos.x and store.y[monster._row] == monster.pos.y
+                   for monster in moved)
+
+    def test_regeneration(self, level):
+        monster = monsters(level)[0]
+        monster.hp = 1
+        simulate_level(level, 10, np.random.RandomState(0))
+        assert monster.hp == pytest.approx(2)
+        simulate_level(level, 10000, np.random.RandomState(0))
+        assert monster.hp == monster.max_hp
+        assert level.store.hp[monster._row] == monster.max_hp
+
+    def test_respawn(self, level, monkeypatch):
+        import background
+        from registry import Registry
+        monkeypatch.setattr(background, 'RESPAWN_CHANCE', 1)
+        assert simulate_level(level, 10, np.random.RandomState(0), Registry()) is None
+        monsters(level)[0].hp = 0
+        respawned = simulate_level(level, 10, np.random.RandomState(0), Registry())
+        assert respawned is not None and respawned.game_map is level
+        assert len(level.index.at(respawned.pos)) == 1
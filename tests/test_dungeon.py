@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def dungeon():
+    from dungeon import Dungeon
+    from entities import Actor
+    from registry import Registry, Actors
+    registry = Registry()
+    player = Actor(Actors.HERO, 'Player', '@', (255, 255, 255), behavior=None, registry=registry)
+    dungeon = Dungeon()
+    dungeon.clear()
+    dungeon.initialize(player, registry, seed=1234)
+    yield dungeon
+    dungeon.clear()
+
+
+class TestDungeon(object):
+
+    def test_pregenerated_level_is_handed_over(self, dungeon):
+        future = dungeon._pending[1]
+        level = future.result()
+        dungeon.go_to_next_level()
+        assert dungeon.current_level is level
+        assert dungeon.player.game_map is level
+        # The level below is being generated now
+        assert 2 in dungeon._pending
+
+    def test_clear_waits_for_pregeneration(self, dungeon, monkeypatch):
+        dungeon._pending[1].result()
+        started, release = threading.Event(), threading.Event()
+        seeds = []
+        generate = dungeon._generate_level
+
+        def slow_generate(seed, blank=False):
+            seeds.append(seed)
+            started.set()
+            release.wait()
+            return generate(seed, blank)
+
+        monkeypatch.setattr(dungeon, '_generate_level', slow_generate)
+        dungeon.go_to_next_level()
+        assert started.wait(5)
+        future = dungeon._pending[2]
+        seed = dungeon._seeds[2]
+        threading.Timer(0.1, release.set).start()
+        dungeon.clear()
+        assert future.done() and not future.cancelled()
+        assert seeds == [seed]
+
+    def test_distant_levels_are_dropped(self, dungeon):
+        for _ in range(4):
+            dungeon.go_to_next_level()
+        loaded = [i for i, level in enumerate(dungeon.levels) if level is not None]
+        assert loaded == [3, 4]
+
+    def test_dropped_level_is_rebuilt(self, dungeon):
+        first = dungeon.current_level
+        walkable = first.walkable.array.copy()
+        spawned = [(e.name, e.pos) for e in first.spawned]
+        for _ in range(3):
+            dungeon.go_to_next_level()
+        assert dungeon.levels[0] is None
+        for _ in range(3):
+            dungeon.go_to_previous_level()
+        rebuilt = dungeon.current_level
+        assert rebuilt is not first
+        assert [(e.name, e.pos) for e in rebuilt.spawned] == spawned
+        # Only the tiles of the player at the up stairs and at the down stairs differ
+        assert (rebuilt.walkable.array != walkable).sum() == 2
+
+    def test_save_and_load(self, dungeon, tmpdir):
+        for _ in range(4):
+            dungeon.go_to_next_level()
+        dungeon.go_to_previous_level()
+        level = dungeon.current_level
+        level.explored[level.rooms[0]] = True
+        actor = next(e for e in level.spawned if e.type == 'actor')
+        actor.hp = 0
+        player = dungeon.player
+        walkable = level.walkable.array.copy()
+        entities = sorted((e.name, e.pos.x, e.pos.y) for e in level.entities if e is not player)
+        path = str(tmpdir.join('save.bin'))
+        dungeon.save(path)
+
+        registry = dungeon.registry
+        dungeon.clear()
+        dungeon.load(path, player, registry)
+        loaded = dungeon.current_level
+        assert loaded is not level
+        assert dungeon.current_level_number == 4
+        assert (loaded.walkable.array == walkable).all()
+        assert (loaded.explored.array == level.explored.array).all()
+        assert sorted((e.name, e.pos.x, e.pos.y) for e in loaded.entities if e is not player) == entities
+        # Dropped levels are rebuilt from their seed
+        dungeon.go_to_previous_level()
+        dungeon.go_to_previous_level()
+        assert dungeon.current_level_number == 2
+
+    def test_save_and_load_negative_seed(self, dungeon, tmpdir):
+        player, registry = dungeon.player, dungeon.registry
+        dungeon.clear()
+        dungeon.initialize(player, registry, seed=-1234)
+        seed = dungeon.seed
+        walkable = dungeon.current_level.walkable.array.copy()
+        path = str(tmpdir.join('save.bin'))
+        dungeon.save(path)
+
+        dungeon.clear()
+        dungeon.load(path, player, registry)
+        assert dungeon.seed == seed == 2 ** 64 - 1234
+        assert (dungeon.current_level.walkable.array == walkable).all()
+
+    def test_save_loaded_game_to_same_path(self, dungeon, tmpdir, monkeypatch):
+        for _ in range(4):
+            dungeon.go_to_next_level()
+        dungeon.go_to_previous_level()
+        player = dungeon.player
+        below = dungeon.levels[4]
+        walkable = below.walkable.array.copy()
+        entities = sorted((e.name, e.pos.x, e.pos.y) for e in below.entities if e is not player)
+        path = str(tmpdir.join('save.bin'))
+        dungeon.save(path)
+
+        registry = dungeon.registry
+        dungeon.clear()
+        # Keep the level below from being restored in the background before the game is saved again
+        monkeypatch.setattr(dungeon, 'PREGENERATE_LEVELS', False)
+        dungeon.load(path, player, registry)
+        assert 4 in dungeon._saved
+        # Drop an item so that the records after the current level move, the level below is still read from the
+        # mapped file when it's saved over
+        from registry import Items
+        registry.get_item(Items.CANDY).place(dungeon.current_level, player.pos)
+        dungeon.save(path)
+        dungeon.go_to_next_level()
+        restored = dungeon.current_level
+        # Only the tile the player now stands on differs
+        restored_walkable = restored.walkable.array.copy()
+        restored_walkable[player.pos.x, player.pos.y] = walkable[player.pos.x, player.pos.y]
+        assert (restored_walkable == walkable).all()
+        assert sorted((e.name, e.pos.x, e.pos.y) for e in restored.entities if e is not player) == entities
+
+    def test_background_tick(self, dungeon, monkeypatch):
+        monkeypatch.setattr(dungeon, 'BACKGROUND_THREAD', False)
+        dungeon.go_to_next_level()
+        previous = dungeon.levels[0]
+        monster = next(entity for entity in previous.entities if getattr(entity, 'behavior', None) is not None)
+        monster.hp = 1
+        for _ in range(dungeon.BACKGROUND_INTERVAL * 10):
+            dungeon.tick()
+        assert monster.hp > 1
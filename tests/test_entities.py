@@ -63,6 +63,33 @@ class TestEntity(object):
         player.strength += 1
         assert player.physical_dmg == 3.96
 
+    def test_stats_are_computed_lazily(self, player, monkeypatch):
+        from entities import Actor
+        calls = []
+        recompute = Actor._recompute_stats
+        monkeypatch.setattr(Actor, '_recompute_stats', lambda self: calls.append(self) or recompute(self))
+        player.exp += 166
+        player.strength += 1
+        player.luck += 1
+        assert calls == []
+        assert player.physical_dmg == 6 * 3 * 0.66
+        assert player.crit_rate == 6 * 3 / 500
+        assert len(calls) == 1
+
+    def test_update_stats(self, player):
+        player.hp -= 50
+        player.update_stats(strength=7, constitution=3)
+        assert (player.strength, player.constitution) == (7, 3)
+        # Recomputing the stats refills the hp
+        assert player.hp == player.max_hp == 7 * 0.25 + 3 * 0.25 + 100
+        with pytest.raises(ValueError):
+            player.update_stats(gold=5)
+
+    def test_overridden_stat_is_kept(self, player):
+        player.strength += 1
+        player.physical_dmg = 1
+        assert player.physical_dmg == 1
+
     def test_actor_death(self, player):
         player.hp -= 200
         assert player.hp == 0
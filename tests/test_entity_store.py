@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from entity_store import EntityStore
+from misc import RenderPriority, Vector
+
+
+@pytest.fixture
+def store():
+    return EntityStore(capacity=2)
+
+
+class TestEntityStore(object):
+
+    def test_add_and_grow(self, store, make_orc):
+        orcs = [make_orc(Vector(i, 2 * i)) for i in range(5)]
+        for orc in orcs:
+            store.add(orc)
+        assert len(store) == 5
+        assert store.capacity == 8
+        assert store.x[:5].tolist() == [0, 1, 2, 3, 4]
+        assert store.y[:5].tolist() == [0, 2, 4, 6, 8]
+        assert store.select(store.used) == orcs
+
+    def test_fields_are_written_through(self, store, make_orc):
+        orc = make_orc(Vector(1, 1))
+        store.add(orc)
+        orc.pos = Vector(3, 4)
+        orc.hp -= 10
+        assert (store.x[orc._row], store.y[orc._row]) == (3, 4)
+        assert store.hp[orc._row] == orc.hp
+        orc.hp = 0
+        assert not store.blocks[orc._row]
+        assert store.render_priority[orc._row] == RenderPriority.CORPSE.value
+        assert store.behavior[orc._row] == -1
+
+    def test_fields_live_in_the_row(self, store, make_orc):
+        orc = make_orc(Vector(1, 1))
+        assert not hasattr(orc, '__dict__')
+        store.add(orc)
+        store.x[orc._row] = 7
+        store.blocks[orc._row] = False
+        assert orc.pos == Vector(7, 1) and not orc.blocks
+        assert orc.render_priority is RenderPriority.ACTOR
+        # The fields are kept by the entity again once it leaves the store
+        store.remove(orc)
+        assert orc.pos == Vector(7, 1) and not orc.blocks
+        assert orc.render_priority is RenderPriority.ACTOR
+
+    def test_stale_rows(self, store, make_orc):
+        orc = make_orc(Vector(1, 1))
+        store.add(orc)
+        # Adding an actor doesn't compute its stats
+        assert orc._stats_dirty and store.stale[orc._row]
+        assert store.select(store.living_actors()) == [orc]
+        assert not orc._stats_dirty and not store.stale[orc._row]
+        assert store.hp[orc._row] == store.max_hp[orc._row] == orc.max_hp
+        orc.strength += 5
+        assert store.stale[orc._row]
+        assert store.select(store.living_actors()) == [orc]
+        assert store.max_hp[orc._row] == orc.max_hp == 10 * 0.25 + 5 * 0.25 + 100
+
+    def test_remove_frees_row(self, store, make_orc):
+        first, second = make_orc(Vector(0, 0)), make_orc(Vector(1, 0))
+        store.add(first)
+        store.add(second)
+        row = first._row
+        store.remove(first)
+        assert first._row is None
+        assert not store.used[row]
+        # Changes made while out of the store are not written anywhere
+        first.pos = Vector(5, 5)
+        store.add(first)
+        assert first._row == row
+        assert store.x[row] == 5
+
+    def test_select_in_added_order(self, store, make_orc):
+        first, second, third = (make_orc(Vector(i, 0)) for i in range(3))
+        store.add(first)
+        store.add(second)
+        store.remove(first)
+        store.add(third)
+        # The third orc takes the row freed by the first one
+        assert third._row < second._row
+        assert store.select(store.used) == [second, third]
+
+    def test_draw_order(self, store, make_orc, registry):
+        from registry import Items
+        first, second = make_orc(Vector(0, 0)), make_orc(Vector(1, 0))
+        candy = registry.get_item(Items.CANDY)
+        candy.pos = Vector(2, 0)
+        for entity in (first, candy, second):
+            store.add(entity)
+        store.remove(first)
+        third = make_orc(Vector(3, 0))
+        store.add(third)
+        # Items are drawn below actors, and actors of the same layer in the order they were added
+        assert store.select(store.used, order=store.render_priority) == [candy, second, third]
+
+    def test_queries(self, store, make_orc):
+        orcs = [make_orc(Vector(i, 0)) for i in range(4)]
+        for orc in orcs:
+            store.add(orc)
+        orcs[1].hp = 0
+        fov = np.zeros((5, 5), dtype=bool)
+        fov[:3, 0] = True
+        assert store.select(store.living_actors() & store.on_tiles(fov)) == [orcs[0], orcs[2]]
+        assert store.select(store.within_radius(Vector(3, 0), 1)) == [orcs[2], orcs[3]]
+
+    def test_damage(self, store, make_orc):
+        orcs = [make_orc(Vector(i, 0)) for i in range(3)]
+        for orc in orcs:
+            store.add(orc)
+        damaged = store.damage(store.within_radius(Vector(0, 0), 1), orcs[0].max_hp)
+        assert damaged == orcs[:2]
+        assert orcs[0].dead and orcs[1].dead and not orcs[2].dead
+        assert orcs[0].char == '%'
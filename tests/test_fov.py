@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from fov import compute_fov, compute_fov_batch, line, line_of_sight, line_of_sight_batch
+from misc import Vector
+
+
+@pytest.fixture
+def transparent():
+    """A 20x10 room with walls around it and a wall splitting it at x = 10."""
+    transparent = np.zeros((20, 10), dtype=bool)
+    transparent[1:19, 1:9] = True
+    transparent[10, :] = False
+    return transparent
+
+
+class TestFov(object):
+
+    def test_room_is_visible(self, transparent):
+        fov = compute_fov(transparent, Vector(5, 5), 0)
+        # The whole left half, walls included, is visible
+        assert fov[0:11, :].all()
+        # Nothing behind the splitting wall is
+        assert not fov[11:, :].any()
+
+    def test_no_light_walls(self, transparent):
+        fov = compute_fov(transparent, Vector(5, 5), 0, light_walls=False)
+        assert fov[1:10, 1:9].all()
+        assert not (fov & ~transparent).any()
+
+    def test_radius(self, transparent):
+        fov = compute_fov(transparent, Vector(2, 2), 3)
+        assert fov[5, 2]
+        assert not fov[6, 2]
+        assert not fov[5, 5]
+
+    def test_viewer_sees_own_tile(self, transparent):
+        assert compute_fov(transparent, Vector(10, 5), 5)[10, 5]
+
+    def test_batch_matches_single(self, transparent):
+        origins = [(1, 1), (5, 5), (15, 3), (18, 8)]
+        batch = compute_fov_batch(transparent, origins, 6)
+        assert batch.shape == (4, 20, 10)
+        for (x, y), fov in zip(origins, batch):
+            assert (fov == compute_fov(transparent, Vector(x, y), 6)).all()
+
+
+class TestLineOfSight(object):
+
+    def test_line(self):
+        assert line(3, 1).tolist() == [[1, 0], [2, 1], [3, 1]]
+        assert line(3, 1) is line(3, 1)
+        assert len(line(0, 0)) == 0
+
+    def test_line_of_sight(self, transparent):
+        assert line_of_sight(transparent, Vector(1, 1), Vector(9, 8))
+        # Walls can be seen, but not what's behind them
+        assert line_of_sight(transparent, Vector(5, 5), Vector(10, 5))
+        assert not line_of_sight(transparent, Vector(5, 5), Vector(15, 5))
+        assert line_of_sight(transparent, Vector(5, 5), Vector(5, 5))
+
+    def test_batch_matches_single(self, transparent):
+        origins = [(1, 1), (5, 5), (5, 5), (15, 3), (18, 8)]
+        targets = [(9, 8), (10, 5), (15, 5), (18, 1), (2, 2)]
+        batch = line_of_sight_batch(transparent, origins, targets)
+        assert batch.tolist() == [line_of_sight(transparent, Vector(*origin), Vector(*target))
+                                  for origin, target in zip(origins, targets)]
+        assert batch.tolist() == [True, True, False, True, False]
+
+
+class TestFovCache(object):
+
+    def test_hit_and_invalidation(self, transparent):
+        from fov import FovCache
+        from level import Tilemap
+        tilemap = Tilemap(transparent)
+        cache = FovCache()
+        first = cache.get(tilemap, Vector(5, 5), 6)
+        assert cache.get(tilemap, Vector(5, 5), 6) is first
+        assert (cache.hits, cache.misses) == (1, 1)
+        # Opening the splitting wall makes the cached field stale
+        tilemap[Vector(10, 5)] = True
+        second = cache.get(tilemap, Vector(5, 5), 6)
+        assert cache.misses == 2
+        assert second[11, 5] and not first[11, 5]
+
+    def test_lru_eviction(self, transparent):
+        from fov import FovCache
+        from level import Tilemap
+        tilemap = Tilemap(transparent)
+        cache = FovCache(maxsize=2)
+        for x in range(1, 5):
+            cache.get(tilemap, Vector(x, 1), 4)
+        assert len(cache) == 2
+        cache.get(tilemap, Vector(1, 1), 4)
+        assert cache.misses == 5
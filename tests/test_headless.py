@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import headless
+from headless import KeyEvent
+
+
+@pytest.fixture
+def game():
+    player, dungeon, action_manager = headless.new_game(seed=1234)
+    yield player, dungeon, action_manager
+    dungeon.clear()
+
+
+class TestHeadless(object):
+
+    def test_key_presses_take_turns(self, game):
+        player, dungeon, action_manager = game
+        direction = next(direction for direction in headless.DIRECTION_KEYS
+                         if not dungeon.current_level.is_blocked(player.pos + direction))
+        start = player.pos
+        key = KeyEvent.char_key(headless.DIRECTION_KEYS[direction])
+        assert headless.play_turn(player, dungeon, action_manager, key)
+        assert player.pos == start + direction
+        # Keys without an action don't take a turn
+        assert not headless.play_turn(player, dungeon, action_manager, KeyEvent.char_key('z'))
+        assert player.pos == start + direction
+
+    def test_arrow_keys(self, game):
+        player, dungeon, action_manager = game
+        name, direction = next((name, direction) for name, direction in action_manager.ARROW_KEYS.items()
+                               if not dungeon.current_level.is_blocked(player.pos + direction))
+        start = player.pos
+        assert headless.play_turn(player, dungeon, action_manager, KeyEvent(name))
+        assert player.pos == start + direction
+
+    def test_go_to_stairs(self, game):
+        player, dungeon, action_manager = game
+        rng = headless.Random(0)
+        level = dungeon.current_level
+        player.hp = 10 ** 6
+        for _ in range(500):
+            headless.play_turn(player, dungeon, action_manager, headless.go_to_stairs(player, dungeon, rng))
+            if dungeon.current_level is not level:
+                break
+        assert dungeon.current_level_number == 2
+
+    @pytest.mark.parametrize('policy', sorted(headless.POLICIES))
+    def test_runs_are_reproducible(self, policy):
+        first = headless.run(headless.POLICIES[policy], 30, seed=7)
+        second = headless.run(headless.POLICIES[policy], 30, seed=7)
+        assert 0 < first.turns <= 30
+        assert (first.turns, first.depth, first.died) == (second.turns, second.depth, second.died)
+        assert first.turns_per_second > 0
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from intents import IntentKind
+from misc import Vector
+
+
+@pytest.fixture
+def level(registry):
+    from level import Level
+    level = Level(20, 10, 0, 6, 10, 0, None, registry, blank=True)
+    level.walkable[1:19, 1:9] = True
+    level.transparent[1:19, 1:9] = True
+    level.fov[:, :] = True
+    return level
+
+
+@pytest.fixture
+def player(registry, level):
+    from entities import Actor
+    from registry import Actors
+    player = Actor(Actors.HERO, 'Player', '@', (255, 255, 255), behavior=None, registry=registry)
+    player.place(level, Vector(10, 5))
+    return player
+
+
+class TestIntents(object):
+
+    def test_planned_behavior_acts_right_away(self, make_orc, level, player):
+        orc = make_orc(Vector(5, 5), level)
+        orc.take_turn(player)
+        assert orc.pos == Vector(6, 5)
+        assert orc.behavior.plan(orc, player, level).kind is IntentKind.MOVE
+
+    def test_plans_leave_the_level_alone(self, make_orc, level, player):
+        orc = make_orc(Vector(9, 5), level)
+        intent = orc.behavior.plan(orc, player, level)
+        assert intent.kind is IntentKind.ATTACK and intent.target is player
+        assert player.hp == player.max_hp
+        intent.perform(orc)
+        assert player.hp < player.max_hp
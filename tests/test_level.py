@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from level import Room, Tilemap
+from misc import Vector
+
+
+@pytest.fixture
+def orc():
+    from registry import Actors, Registry
+    registry = Registry()
+    return registry.get_actor(Actors.ORC)
+
+
+@pytest.fixture
+def candy():
+    from registry import Items, Registry
+    registry = Registry()
+    return registry.get_item(Items.CANDY)
+
+
+@pytest.fixture
+def tilemap():
+    return Tilemap(np.zeros((10, 8), dtype=bool))
+
+
+class TestTilemap(object):
+
+    def test_vector_access(self, tilemap):
+        tilemap[Vector(3, 2)] = True
+        assert tilemap[Vector(3, 2)]
+        assert tilemap.array.sum() == 1
+
+    def test_list_is_converted(self):
+        tilemap = Tilemap([[False, True], [False, False]])
+        assert isinstance(tilemap.array, np.ndarray)
+        assert tilemap[Vector(0, 1)]
+
+    def test_room_region(self, tilemap):
+        room = Room(1, 1, 4, 3)
+        tilemap[room] = True
+        # Walls are left untouched
+        assert tilemap.array.sum() == 3 * 2
+        assert not tilemap[Vector(1, 1)]
+        assert tilemap[Vector(2, 2)]
+        assert tilemap[room].all()
+
+    def test_slice_region(self, tilemap):
+        tilemap[2:5, 3] = True
+        assert tilemap.array.sum() == 3
+        assert tilemap[Vector(4, 3)]
+
+    def test_mask(self, tilemap):
+        mask = np.zeros(tilemap.shape, dtype=bool)
+        mask[0, :] = True
+        tilemap[mask] = True
+        assert tilemap.array[0].all()
+        assert tilemap.array.sum() == tilemap.shape[1]
+
+    def test_coordinate_array(self, tilemap):
+        coords = np.array([[0, 0], [9, 7], [5, 5]])
+        tilemap[coords] = True
+        assert list(tilemap[coords]) == [True, True, True]
+        assert tilemap.array.sum() == 3
+
+    def test_vector_list(self, tilemap):
+        tilemap[[Vector(1, 1), Vector(2, 2)]] = True
+        assert list(tilemap[[Vector(1, 1), Vector(2, 3)]]) == [True, False]
+
+    def test_fill(self, tilemap):
+        tilemap.fill(True)
+        assert tilemap.array.all()
+
+    def test_version(self, tilemap):
+        tilemap[Vector(1, 1)] = True
+        tilemap[1:3, 2] = True
+        tilemap.fill(False)
+        assert tilemap.version == 3
+
+
+class TestSpatialIndex(object):
+
+    @pytest.fixture
+    def index(self):
+        from spatial import SpatialIndex
+        return SpatialIndex()
+
+    def test_add_and_lookup(self, index, orc, candy):
+        orc.pos = candy.pos = Vector(2, 3)
+        index.add(candy)
+        index.add(orc)
+        assert index.at(Vector(2, 3)) == [candy, orc]
+        assert index.blocking_at(Vector(2, 3)) is orc
+        assert index.is_blocked(Vector(2, 3))
+        assert not index.is_occupied(Vector(3, 2))
+
+    def test_move(self, index, orc):
+        orc.pos = Vector(0, 0)
+        index.add(orc)
+        orc.pos = Vector(1, 0)
+        index.move(orc, Vector(0, 0))
+        assert not index.is_occupied(Vector(0, 0))
+        assert index.blocking_at(Vector(1, 0)) is orc
+
+    def test_remove(self, index, orc):
+        orc.pos = Vector(4, 4)
+        index.add(orc)
+        index.remove(orc)
+        assert index.at(Vector(4, 4)) == []
+        assert not index.is_blocked(Vector(4, 4))
+
+    def test_update_blocking(self, index, orc):
+        orc.pos = Vector(1, 1)
+        index.add(orc)
+        orc.blocks = False
+        index.update_blocking(orc)
+        assert not index.is_blocked(Vector(1, 1))
+        assert index.at(Vector(1, 1)) == [orc]
+
+
+class TestSplitSpace(object):
+
+    @pytest.mark.parametrize("width, height, count", [
+        (80, 44, 1),
+        (80, 44, 30),
+        (400, 200, 500),
+    ])
+    def test_leaf_count_and_size(self, width, height, count):
+        from level import split_space
+        leaves = split_space(width, height, count, 7)
+        assert len(leaves) == count
+        covered = np.zeros((width, height), dtype=int)
+        for x, y, w, h in leaves:
+            assert w >= 7 and h >= 7
+            covered[x:x + w, y:y + h] += 1
+        # Leaves partition the whole area
+        assert (covered == 1).all()
+
+    def test_too_many_leaves(self):
+        from level import split_space, LevelException
+        with pytest.raises(LevelException):
+            split_space(20, 20, 5, 7)
+
+
+class TestFreeCells(object):
+
+    @pytest.fixture
+    def cells(self):
+        from spatial import FreeCells
+        return FreeCells((x, y) for x in range(3) for y in range(2))
+
+    def test_pop_without_replacement(self, cells):
+        drawn = [cells.pop() for _ in range(6)]
+        assert len(cells) == 0
+        assert len({(pos.x, pos.y) for pos in drawn}) == 6
+        with pytest.raises(IndexError):
+            cells.pop()
+
+
+def make_level(seed):
+    from level import Level
+    from registry import Registry
+    return Level(80, 44, 30, 6, 10, 3, None, Registry(), seed=seed)
+
+
+class TestSeededLevel(object):
+
+    def test_same_seed_same_level(self):
+        level1 = make_level(1234)
+        level2 = make_level(1234)
+        assert (level1.walkable.array == level2.walkable.array).all()
+        assert [(e.name, e.pos) for e in level1.spawned] == [(e.name, e.pos) for e in level2.spawned]
+
+    def test_delta_roundtrip(self):
+        level = make_level(42)
+        level.explored[level.rooms[0]] = True
+        actors = [e for e in level.spawned if e.type == 'actor']
+        items = [e for e in level.spawned if e.type == 'item']
+        actors[0].hp = 0
+        actors[1].hp -= 10
+        items[0].use(actors[1])
+        delta = level.record_delta()
+
+        rebuilt = make_level(42)
+        rebuilt.apply_delta(delta)
+        assert (rebuilt.explored.array == level.explored.array).all()
+        assert (rebuilt.walkable.array == level.walkable.array).all()
+        for old, new in zip(level.spawned, rebuilt.spawned):
+            assert (old.game_map is level) == (new.game_map is rebuilt)
+            assert old.pos == new.pos
+            if old.type == 'actor':
+                assert old.hp == new.hp
+                assert old.dead == new.dead
+
+    def test_fov_marks_explored(self):
+        level = make_level(7)
+        room = level.rooms[0]
+        assert not level.explored.array.any()
+        level.compute_fov(room.center(), 0, True)
+        assert (level.explored.array == level.fov.array).all()
+        level.compute_fov(level.rooms[1].center(), 0, True)
+        # Tiles that get out of sight stay explored
+        assert level.explored[room.center()]
+        assert np.unpackbits(level.record_delta().explored).any()
+
+    def test_tile_queries(self):
+        level = make_level(7)
+        room = level.rooms[0]
+        level.compute_fov(room.center(), 0, True)
+        assert level.tiles_visible(room).all()
+        path = [room.center(), Vector(-1, 0), Vector(level.width, 0)]
+        assert level.tiles_walkable(path).tolist() == [True, False, False]
+        coordinates = np.array([[room.x1 + 1, room.y1 + 1], [room.x1, room.y1]])
+        assert level.tiles_walkable(coordinates).tolist() == [True, False]
+        assert level.can_see(room.center(), Vector(room.x1, room.y1))
+        assert level.can_see_many([room.center()], [Vector(room.x1, room.y1)]).tolist() == [True]
+
+    def test_batched_fovs(self):
+        level = make_level(7)
+        viewers = [room.center() for room in level.rooms[:3]]
+        level.compute_fov(viewers[0], 10, True)
+        fov = level.fov.array.copy()
+        fovs = level.compute_fovs(viewers, 10, True)
+        assert fovs.shape == (3, level.width, level.height)
+        # The level's own FOV is left alone
+        assert (level.fov.array == fov).all()
+        for viewer, field in zip(viewers, fovs):
+            assert field[viewer.x, viewer.y]
+            level.compute_fov(viewer, 10, True)
+            assert (field == level.fov.array).all()
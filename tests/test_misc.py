@@ -6,7 +6,7 @@ import os
 import pytest
 
 from math import sqrt
-from misc import Singleton, Vector, Colors, RenderPriority, message, get_abs_path
+from misc import Singleton, Vector, Directions, Colors, RenderPriority, message, get_abs_path
 
 
 class TestSingleton(object):
@@ -53,6 +53,30 @@ class TestVector(object):
     def test_vector_repr(self):
         assert repr(Vector(-0.5, 2)) == "(-0.5, 2)"
 
+    def test_vector_hashable(self):
+        assert {Vector(1, 2): 'a'}[Vector(1, 2)] == 'a'
+        assert len({Vector(1, 2), Vector(1, 2), Vector(2, 1)}) == 2
+        # Vectors hash like tuples, so they can look up tuple-keyed dicts
+        assert {(1, 2): 'a'}[Vector(1, 2)] == 'a'
+
+    def test_vector_immutable(self):
+        v = Vector(1, 2)
+        with pytest.raises(AttributeError):
+            v.x = 3
+        with pytest.raises(TypeError):
+            v * 2
+
+    @pytest.mark.parametrize("vector,direction", [
+        (Vector(5, 0), Directions.RIGHT),
+        (Vector(3, 4), Directions.DOWN_RIGHT),
+        (Vector(0, -2), Directions.UP),
+        (Vector(-7, 1), Directions.LEFT),
+        (Vector(-3, -3), Directions.UP_LEFT),
+    ])
+    def test_snap_to_grid(self, vector, direction):
+        # The shared direction constants are returned, not new vectors
+        assert vector.snap_to_grid() is direction
+
 
 class TestColors(object):
 
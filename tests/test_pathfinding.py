@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+import pathfinding
+from misc import Vector
+from pathfinding import FlowField, RoomGraph, UNREACHABLE, distance_map, find_path, find_paths
+
+
+@pytest.fixture
+def walkable():
+    """Two 5x5 rooms joined by a corridor at y = 2, and a closed 2x2 room."""
+    walkable = np.zeros((20, 10), dtype=bool)
+    walkable[0:5, 0:5] = True
+    walkable[10:15, 0:5] = True
+    walkable[5:10, 2] = True
+    walkable[17:19, 7:9] = True
+    return walkable
+
+
+class TestDistanceMap(object):
+
+    def test_distances(self, walkable):
+        distances = distance_map(walkable, [Vector(0, 0)])
+        assert distances[0, 0] == 0
+        # Diagonal moves cost the same as straight ones
+        assert distances[4, 4] == 4
+        assert distances[5, 2] == 5
+        assert distances[14, 2] == 14
+        assert distances[17, 7] == UNREACHABLE
+        assert distances[7, 0] == UNREACHABLE
+
+    def test_max_distance(self, walkable):
+        distances = distance_map(walkable, [Vector(0, 0)], max_distance=3)
+        assert distances[3, 3] == 3
+        assert distances[4, 4] == UNREACHABLE
+
+    def test_unwalkable_source(self, walkable):
+        distances = distance_map(walkable, [Vector(5, 0)])
+        assert distances[4, 0] == 1
+
+
+class TestFindPath(object):
+
+    def test_path(self, walkable):
+        path = find_path(walkable, Vector(0, 2), Vector(14, 2))
+        assert len(path) == 14
+        assert path[-1] == Vector(14, 2)
+        assert all(walkable[tile.x, tile.y] for tile in path)
+
+    def test_unreachable(self, walkable):
+        assert find_path(walkable, Vector(0, 0), Vector(17, 7)) == []
+
+    def test_endpoints_are_walkable(self, walkable):
+        # Neither the start nor the goal tile need to be walkable, and the map is left untouched
+        walkable[0, 0] = walkable[14, 4] = False
+        before = walkable.copy()
+        assert find_path(walkable, Vector(0, 0), Vector(14, 4))[-1] == Vector(14, 4)
+        assert (walkable == before).all()
+
+    def test_blocked(self, walkable):
+        blocked = np.zeros_like(walkable)
+        blocked[7, 2] = True
+        assert find_path(walkable, Vector(0, 2), Vector(14, 2), blocked=blocked) == []
+
+    def test_cost(self, walkable):
+        # Make the straight line expensive so that the path goes around it
+        cost = np.ones(walkable.shape)
+        cost[1:4, 2] = 10
+        path = find_path(walkable, Vector(0, 2), Vector(4, 2), cost=cost)
+        assert Vector(2, 2) not in path
+        assert len(path) == 4
+
+    def test_batch(self, walkable, monkeypatch):
+        pairs = [(Vector(0, 0), Vector(14, 4)), (Vector(0, 0), Vector(17, 7)), (Vector(4, 4), Vector(0, 0))]
+        expected = [find_path(walkable, start, goal) for start, goal in pairs]
+        assert find_paths(walkable, pairs) == expected
+        # The maps are prepared once for the whole batch
+        calls = []
+        prepare = pathfinding._prepare
+
+        def counting_prepare(*args):
+            calls.append(args)
+            return prepare(*args)
+
+        monkeypatch.setattr(pathfinding, '_prepare', counting_prepare)
+        assert find_paths(walkable, pairs, cost=np.ones(walkable.shape)) == expected
+        assert len(calls) == 1
+
+
+class TestRoomGraph(object):
+
+    @pytest.fixture
+    def graph(self):
+        """Two rooms joined by a corridor through their walls at y = 3, and a third room without entrances."""
+        from level import Room
+        rooms = [Room(0, 0, 6, 6), Room(20, 0, 6, 6), Room(10, 8, 4, 4)]
+        walkable = np.zeros((30, 14), dtype=bool)
+        for room in rooms:
+            walkable[room.inner] = True
+        walkable[6:21, 3] = True
+        return RoomGraph(walkable, rooms), walkable
+
+    def test_entrances(self, graph):
+        graph, _ = graph
+        assert [(entrance.room, entrance.tile) for entrance in graph.entrances] == [(0, (6, 3)), (1, (20, 3))]
+        assert graph.edges[0] == {1: 14}
+
+    def test_plan(self, graph):
+        graph, _ = graph
+        assert graph.plan(Vector(2, 3), Vector(23, 1)) == [Vector(6, 3), Vector(20, 3)]
+        # No entrance is needed within a room or a corridor
+        assert graph.plan(Vector(1, 1), Vector(4, 4)) == []
+        assert graph.plan(Vector(8, 3), Vector(15, 3)) == []
+        assert graph.plan(Vector(2, 3), Vector(11, 9)) is None
+
+    def test_find_path(self, graph):
+        graph, walkable = graph
+        path = graph.find_path(walkable, Vector(2, 3), Vector(23, 1), min_distance=0)
+        assert len(path) == len(find_path(walkable, Vector(2, 3), Vector(23, 1)))
+        assert path[-1] == Vector(23, 1)
+        assert graph.find_path(walkable, Vector(2, 3), Vector(11, 9), min_distance=0) == []
+
+    def test_blocked_entrance(self, graph):
+        graph, walkable = graph
+        walkable[20, 3] = False
+        assert graph.find_path(walkable, Vector(2, 3), Vector(23, 1), min_distance=0) == []
+
+    def test_map_changes(self, graph):
+        graph, walkable = graph
+        walkable = walkable.copy()
+        assert graph.find_path(walkable, Vector(2, 3), Vector(23, 1), min_distance=0, version=1)
+        passable = graph._passable
+        # The map is assumed not to change while its version doesn't
+        walkable[20, 3] = False
+        assert graph.find_path(walkable, Vector(8, 3), Vector(15, 3), version=1)
+        assert graph._passable is passable and passable[20][3]
+        # The tiles that changed are updated when it does
+        assert graph.find_path(walkable, Vector(2, 3), Vector(23, 1), min_distance=0, version=2) == []
+        assert graph._passable is passable and not passable[20][3]
+
+
+class TestFlowField(object):
+
+    def test_path(self, walkable):
+        field = FlowField(walkable, Vector(14, 2))
+        path = field.path_from(Vector(0, 2))
+        assert len(path) == 14
+        assert path[-1] == Vector(14, 2)
+        for previous, tile in zip([Vector(0, 2)] + path, path):
+            assert walkable[tile.x, tile.y]
+            assert (tile - previous).norm < 2
+
+    def test_unreachable(self, walkable):
+        field = FlowField(walkable, Vector(14, 2))
+        assert field.path_from(Vector(17, 7)) == []
+        assert field.next_step(Vector(17, 7)) is None
+
+    def test_blocked_neighbour(self, walkable):
+        field = FlowField(walkable, Vector(4, 2))
+        assert field.next_step(Vector(2, 2)) == Vector(3, 2)
+        # Go around the blocked tile
+        step = field.next_step(Vector(2, 2), lambda pos: pos == Vector(3, 2))
+        assert step in (Vector(3, 1), Vector(3, 3))
+
+    def test_max_distance(self, walkable):
+        field = FlowField(walkable, Vector(14, 2), max_distance=6)
+        assert field.reaches(Vector(8, 2))
+        assert field.next_step(Vector(8, 2)) == Vector(9, 2)
+        assert not field.reaches(Vector(7, 2))
+        assert field.path_from(Vector(7, 2)) == []
+
+    def test_in_view(self, walkable):
+        visible = np.zeros_like(walkable)
+        visible[10:15, 0:5] = True
+        # The straight path along y = 2 is hidden, the one going through y = 1 is not
+        visible[12, 2] = False
+        field = FlowField(walkable, Vector(14, 2), visible=visible)
+        assert field.in_view(Vector(11, 2))
+        path = field.path_from(Vector(11, 2))
+        assert len(path) == 3 and all(visible[tile.x, tile.y] for tile in path)
+        assert not field.in_view(Vector(8, 2))
+        assert field.reaches(Vector(8, 2))
+
+
+class TestPathCache(object):
+
+    @pytest.fixture
+    def tilemap(self, walkable):
+        from level import Tilemap
+        return Tilemap(walkable)
+
+    @pytest.fixture
+    def cache(self, tilemap):
+        from pathfinding import PathCache
+        searches = []
+
+        def search(start, goal):
+            searches.append((start, goal))
+            return FlowField(tilemap.array, goal).path_from(start)
+
+        cache = PathCache(search)
+        cache.searches = searches
+        return cache
+
+    def test_hit(self, cache, tilemap):
+        path = cache.get(tilemap, Vector(0, 2), Vector(14, 2))
+        assert cache.get(tilemap, Vector(0, 2), Vector(14, 2)) == path
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_step_along_path(self, cache, tilemap):
+        path = cache.get(tilemap, Vector(0, 2), Vector(14, 2))
+        assert cache.get(tilemap, path[0], Vector(14, 2)) == path[1:]
+        assert len(cache.searches) == 1
+
+    def test_unrelated_change(self, cache, tilemap):
+        path = cache.get(tilemap, Vector(0, 2), Vector(14, 2))
+        tilemap[Vector(0, 4)] = False
+        assert cache.get(tilemap, Vector(0, 2), Vector(14, 2)) == path
+        assert cache.hits == 1 and cache.repairs == 0
+
+    def test_repair(self, cache, tilemap):
+        path = cache.get(tilemap, Vector(0, 2), Vector(14, 2))
+        obstacle = path[8]
+        tilemap[obstacle] = False
+        repaired = cache.get(tilemap, Vector(0, 2), Vector(14, 2))
+        assert cache.repairs == 1
+        # The corridor is blocked, so there's no way around
+        assert repaired == []
+        tilemap[obstacle] = True
+        assert cache.get(tilemap, Vector(0, 2), Vector(14, 2)) != []
+
+    def test_repair_detour(self, cache, tilemap):
+        path = cache.get(tilemap, Vector(0, 0), Vector(14, 2))
+        obstacle = path[1]
+        tilemap[obstacle] = False
+        repaired = cache.get(tilemap, Vector(0, 0), Vector(14, 2))
+        assert cache.repairs == 1
+        assert repaired[0] == path[0]
+        assert obstacle not in repaired
+        assert repaired[-1] == Vector(14, 2)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from game import KeyEvent, new_game, play_turn
+from profiler import Profiler, RingBuffer, profiled
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler()
+    profiler.clear()
+    yield profiler
+    profiler.disable()
+    profiler.clear()
+
+
+@profiled('double')
+def double(x):
+    return 2 * x
+
+
+class TestRingBuffer(object):
+
+    def test_keeps_the_latest_values(self):
+        buffer = RingBuffer(3)
+        buffer.add(1)
+        buffer.add(2)
+        assert list(buffer.values()) == [1, 2]
+        for value in (3, 4, 5):
+            buffer.add(value)
+        assert list(buffer.values()) == [3, 4, 5]
+        assert len(buffer) == 3
+        assert buffer.total == 5
+
+
+class TestProfiler(object):
+
+    def test_disabled_by_default(self, profiler):
+        with profiler.phase('phase'):
+            pass
+        assert double(2) == 4
+        assert profiler.summary() == {}
+
+    def test_phases_and_calls(self, profiler):
+        profiler.enable()
+        for _ in range(3):
+            with profiler.phase('phase'):
+                double(1)
+        summary = profiler.summary()
+        assert summary['phase']['count'] == summary['double']['count'] == 3
+        assert summary['phase']['p50'] >= summary['double']['p50']
+
+    def test_percentiles(self, profiler):
+        for value in range(1, 101):
+            profiler.record('phase', value)
+        stats = profiler.summary()['phase']
+        assert stats['p50'] == pytest.approx(50.5)
+        assert stats['p99'] == pytest.approx(99.01)
+        assert stats['max'] == 100
+
+    def test_only_the_latest_timings_are_kept(self, profiler, monkeypatch):
+        monkeypatch.setattr(Profiler, 'CAPACITY', 10)
+        for value in range(100):
+            profiler.record('phase', value)
+        stats = profiler.summary()['phase']
+        assert stats['count'] == 100
+        assert stats['mean'] == pytest.approx(94.5)
+
+    def test_dump(self, profiler, tmpdir):
+        path = str(tmpdir.join('profile.txt'))
+        profiler.enable(path)
+        profiler.record('phase', 0.002)
+        profiler.dump()
+        header, line = tmpdir.join('profile.txt').read().splitlines()
+        assert header.split() == ['phase', 'count', 'mean', 'p50', 'p95', 'p99', 'max']
+        assert line.split() == ['phase', '1'] + ['2.000'] * 5
+
+    def test_idle_frames_are_not_timed(self, profiler):
+        player, dungeon, action_manager = new_game(1234)
+        try:
+            profiler.enable()
+            for _ in range(10):
+                assert not play_turn(player, dungeon, action_manager, None)
+            assert profiler.summary() == {}
+            # Keys are timed even if they don't take a turn
+            assert not play_turn(player, dungeon, action_manager, KeyEvent.char_key('z'))
+            assert profiler.summary()['action']['count'] == 1
+        finally:
+            dungeon.clear()
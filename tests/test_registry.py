@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import registry
+from registry import compile_tables
+
+ACTORS = "key;name;char;color;behavior\n1;Orc;o;[0,255,0];basic_monster\n3;Poopy;p;[0,0,0];\n"
+ITEMS = "key;name;char;color;blocks;weight;effect;effect_args\n1;Candy;d;[0, 0, 255];False;1;heal;[50]\n"
+
+
+@pytest.fixture
+def tables(tmpdir):
+    actors, items = tmpdir.join('actors.csv'), tmpdir.join('items.csv')
+    actors.write(ACTORS)
+    items.write(ITEMS)
+    return str(actors), str(items), str(tmpdir.join('registry.cache'))
+
+
+def fail(text):
+    raise AssertionError("The table was parsed again.")
+
+
+class TestCompileTables(object):
+
+    def test_parse(self, tables):
+        actors, items = compile_tables(*tables)
+        assert actors[1] == {'key': 1, 'name': 'Orc', 'char': 'o', 'color': [0, 255, 0], 'behavior': 'basic_monster'}
+        assert actors[3]['behavior'] is None
+        assert items[1]['effect'] == ('heal', (50,))
+        assert items[1]['blocks'] is False and items[1]['weight'] == 1
+
+    def test_cache_is_used(self, tables, monkeypatch):
+        compiled = compile_tables(*tables)
+        monkeypatch.setattr(registry, '_parse_actors', fail)
+        monkeypatch.setattr(registry, '_parse_items', fail)
+        assert compile_tables(*tables) == compiled
+
+    def test_cache_is_rebuilt_when_a_table_changes(self, tables):
+        compile_tables(*tables)
+        with open(tables[1], 'a') as f:
+            f.write("2;Air;~;[230, 230, 230];False;0;;\n")
+        _, items = compile_tables(*tables)
+        assert items[2]['effect'] is None
+
+    def test_corrupt_cache(self, tables):
+        with open(tables[2], 'wb') as f:
+            f.write(b'garbage')
+        actors, _ = compile_tables(*tables)
+        assert actors[1]['name'] == 'Orc'
+
+    @pytest.mark.parametrize('data', [b'\x80\x09.', b'cno_such_module\nTable\n.'])
+    def test_unreadable_cache(self, tables, data):
+        # A cache from a newer pickle protocol, and one pickled against classes that are gone
+        with open(tables[2], 'wb') as f:
+            f.write(data)
+        actors, _ = compile_tables(*tables)
+        assert actors[1]['name'] == 'Orc'
+
+    def test_unwritable_cache(self, tables, tmpdir):
+        actors, _ = compile_tables(tables[0], tables[1], str(tmpdir.join('missing', 'registry.cache')))
+        assert actors[1]['name'] == 'Orc'
+
+
+class TestRegistry(object):
+
+    def test_factories(self):
+        from registry import Actors, ActorNotFoundError, Items, Registry
+        reg = Registry()
+        orc = reg.get_actor(Actors.ORC)
+        assert orc.key is Actors.ORC and orc.behavior is reg.behaviors['basic_monster']
+        assert reg.get_actor(Actors.ORC) is not orc
+        assert reg.get_item(Items.CANDY).effect.func is reg.effect['heal']
+        with pytest.raises(ActorNotFoundError):
+            reg.get_actor(Actors.HERO)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from random import Random
+
+import pytest
+
+import headless
+from game import KeyEvent, new_game, play_turn
+from replay import Recorder, RecordingError, dungeon_settings, load_recording, replay
+
+
+def snapshot(dungeon):
+    """Get the state of the current level, to compare games."""
+    level = dungeon.current_level
+    return (dungeon.current_level_number, level.explored.array.sum(),
+            sorted((entity.name, entity.pos, getattr(entity, 'hp', None)) for entity in level.entities))
+
+
+@pytest.fixture
+def dungeon():
+    from dungeon import Dungeon
+    yield Dungeon()
+    Dungeon().clear()
+
+
+class TestReplay(object):
+
+    def test_save_and_load(self, tmpdir):
+        recorder = Recorder(1234)
+        keys = [KeyEvent.char_key('k'), KeyEvent('UP'), KeyEvent('ENTER', alt=True), KeyEvent.char_key('e')]
+        for key in keys:
+            recorder.record(key)
+        path = str(tmpdir.join('session.rec'))
+        recorder.save(path)
+        loaded = load_recording(path)
+        assert loaded.seed == 1234
+        assert loaded.keys == keys
+
+    def test_chars_beyond_latin_1(self, tmpdir):
+        recorder = Recorder(1234)
+        keys = [KeyEvent.char_key('\u0436'), KeyEvent.char_key('\u4e2d'), KeyEvent.char_key('\U0001f600')]
+        for key in keys:
+            recorder.record(key)
+        path = str(tmpdir.join('session.rec'))
+        recorder.save(path)
+        assert load_recording(path).keys == keys
+
+    def test_settings_are_saved(self, tmpdir):
+        path = str(tmpdir.join('session.rec'))
+        Recorder(1, (0, False)).save(path)
+        assert load_recording(path).settings == (0, False)
+        Recorder(1).save(path)
+        assert load_recording(path).settings == dungeon_settings()
+
+    def test_replay_checks_the_settings(self, monkeypatch):
+        from dungeon import Dungeon
+        recorder = Recorder(99)
+        recorder.record(KeyEvent.char_key('k'))
+        monkeypatch.setattr(Dungeon, 'BACKGROUND_INTERVAL', Dungeon.BACKGROUND_INTERVAL + 1)
+        with pytest.raises(RecordingError):
+            replay(recorder)
+
+    def test_empty_recording(self, tmpdir):
+        path = str(tmpdir.join('session.rec'))
+        Recorder(1).save(path)
+        assert load_recording(path).keys == []
+
+    def test_not_a_recording(self, tmpdir):
+        path = tmpdir.join('session.rec')
+        path.write_binary(b'nope')
+        with pytest.raises(RecordingError):
+            load_recording(str(path))
+
+    def test_replay_reproduces_the_session(self, dungeon, tmpdir):
+        player, _, action_manager = new_game(99)
+        recorder = Recorder(dungeon.seed)
+        rng = Random(0)
+        while len(recorder) < 60 and not player.dead:
+            key = headless.fight(player, dungeon, rng)
+            if play_turn(player, dungeon, action_manager, key):
+                recorder.record(key)
+        recorded = snapshot(dungeon)
+        path = str(tmpdir.join('session.rec'))
+        recorder.save(path)
+
+        stats = replay(load_recording(path))
+        assert stats.turns == len(recorder)
+        assert stats.died == player.dead
+        assert snapshot(dungeon) == recorded
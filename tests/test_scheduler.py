@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from scheduler import ACTION_COST, NORMAL_SPEED, Scheduler
+
+
+class TestScheduler(object):
+
+    def test_one_turn_per_action(self, make_actor, log):
+        scheduler = Scheduler()
+        for name in 'abc':
+            scheduler.add(make_actor(name))
+        assert scheduler.run(1, None) == 3
+        assert scheduler.run(1, None) == 3
+        assert log == list('abcabc')
+
+    def test_speed(self, make_actor, log):
+        scheduler = Scheduler()
+        scheduler.add(make_actor('fast', speed=2 * NORMAL_SPEED))
+        scheduler.add(make_actor('slow', speed=NORMAL_SPEED // 2))
+        scheduler.run(4, None)
+        assert log.count('fast') == 8
+        assert log.count('slow') == 2
+
+    def test_action_cost(self, make_actor, log):
+        scheduler = Scheduler()
+        actor = make_actor('a')
+        actor.behavior = lambda caller, target: log.append(caller.name) or 2 * ACTION_COST
+        scheduler.add(actor)
+        scheduler.run(4, None)
+        assert log == ['a', 'a']
+
+    def test_dead_and_removed_actors_drop_out(self, make_actor, log):
+        scheduler = Scheduler()
+        dead, removed, alive = make_actor('dead'), make_actor('removed'), make_actor('alive')
+        for actor in (dead, removed, alive):
+            scheduler.add(actor)
+        scheduler.run(1, None)
+        dead.hp = 0
+        scheduler.remove(removed)
+        scheduler.run(1, None)
+        assert log == ['dead', 'removed', 'alive', 'alive']
+        assert len(scheduler) == 1
+
+    def test_no_behavior(self, make_actor):
+        scheduler = Scheduler()
+        actor = make_actor('a')
+        actor.behavior = None
+        scheduler.add(actor)
+        assert actor not in scheduler
+        assert scheduler.next_time() is None